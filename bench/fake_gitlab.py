@@ -0,0 +1,808 @@
+"""Stand-in for GitLab REST and GraphQL API, implementing endpoints used by gitlab-config.
+
+Run standalone with `python3 bench/fake_gitlab.py --projects 1000 --port 8080`,
+or embed through `FakeGitlabServer(FakeGitlabState.seed(...)).start()`.
+"""
+from argparse import ArgumentParser
+from collections import Counter
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlencode, urlparse
+
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+
+DEFAULT_PER_PAGE = 20
+MAX_PER_PAGE = 100
+BRANCH_DATE = "2020-01-01T00:00:00+06:00"
+TOKEN_USER_ID = 1
+# group approval settings by project approval settings they restrict, with project value enforced when group's is false
+GROUP_APPROVAL_RESTRICTIONS = {"allow_author_approval": ("merge_requests_author_approval", False),
+                               "allow_committer_approval": ("merge_requests_disable_committers_approval", True),
+                               "allow_overrides_to_approver_list_during_merge_request":
+                                   ("disable_overriding_approvers_per_merge_request", True),
+                               "retain_approvals_on_push": ("reset_approvals_on_push", True)}
+
+
+class FakeGitlabState:
+    """In-memory state of fake GitLab instance.
+
+    Attributes:
+        groups (dict): Group objects by group ids.
+        projects (dict): Project objects by project ids, including their branches, protection and approval settings.
+        members (dict): Lists of member objects by group ids.
+        group_settings (dict): Push rule and merge request approval setting by group ids. Projects without their own
+            push rule inherit the nearest group's one, and restrictive approval settings of groups override projects'.
+        audit_events (list): Audit events of projects, recorded for every successful write.
+        requests: Counter of served requests by `METHOD handler` keys, e.g. `GET list_branches`.
+        statuses: Counter of served response status codes.
+        lock: Guards all attributes above, since requests are served by concurrent threads.
+    """
+
+    def __init__(self):
+        self.groups = {}
+        self.projects = {}
+        self.members = {}
+        self.group_settings = {}
+        self.audit_events = []
+        self.requests = Counter()
+        self.statuses = Counter()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def seed(cls, projects=10, groups=1, branches=3, members=10, namespace="bench"):
+        """Creates state with {:projects} spread evenly over {:groups} subgroups of the {:namespace} group.
+        :projects  Number of projects.
+        :groups    Number of subgroups.
+        :branches  Number of stale feature branches of every project, besides `main` and `dev`.
+        :members   Number of members of every group.
+        :namespace Path of the top-level group.
+        :return    FakeGitlabState object.
+        """
+        state = cls()
+        state.groups[1] = {"id": 1, "name": namespace, "path": namespace, "full_path": namespace, "parent_id": None}
+        for group_id in range(2, groups + 2):
+            path = f'group-{group_id - 1}'
+            state.groups[group_id] = {"id": group_id, "name": path, "path": path,
+                                      "full_path": f'{namespace}/{path}', "parent_id": 1}
+
+        for group_id in state.groups:
+            state.group_settings[group_id] = {"push_rule": None,
+                                              "approval_setting": {key: True for key in GROUP_APPROVAL_RESTRICTIONS}}
+            state.members[group_id] = [{"id": user_id, "username": f'user{user_id}', "access_level": 30,
+                                        "state": "active"} for user_id in range(1, members + 1)]
+
+        subgroups = [group for group in state.groups.values() if group["parent_id"]] or [state.groups[1]]
+        for project_id in range(1, projects + 1):
+            group = subgroups[(project_id - 1) % len(subgroups)]
+            path = f'project-{project_id}'
+            state.projects[project_id] = {
+                "id": project_id, "path": path, "name": path, "description": "",
+                "path_with_namespace": f'{group["full_path"]}/{path}', "namespace_id": group["id"],
+                "default_branch": "main", "archived": False,
+                "last_activity_at": BRANCH_DATE,
+                "settings": {"merge_method": "merge", "squash_option": "default_off",
+                             "allow_merge_on_skipped_pipeline": False,
+                             "only_allow_merge_if_pipeline_succeeds": False,
+                             "only_allow_merge_if_all_discussions_are_resolved": False,
+                             "remove_source_branch_after_merge": False},
+                "approvals": {"reset_approvals_on_push": True, "selective_code_owner_removals": False,
+                              "disable_overriding_approvers_per_merge_request": False,
+                              "merge_requests_author_approval": True,
+                              "merge_requests_disable_committers_approval": False},
+                "approval_rules": [],
+                "push_rule": None,
+                "branches": {name: {"name": name, "protected": False, "default": name == "main",
+                                    "commit": {"id": hashlib.sha1(f'{project_id}/{name}'.encode()).hexdigest(),
+                                               "created_at": BRANCH_DATE}}
+                             for name in ["main", "dev"] + [f'feature/task-{i}' for i in range(branches)]},
+                "protected_branches": {},
+            }
+
+        return state
+
+    def audit(self, project, action, author_id=TOKEN_USER_ID):
+        """Records audit event of the {:project}, must be called under `lock`.
+        :project   Project object.
+        :action    Description of the change.
+        :author_id Id of the user made the change, user of any token by default.
+        """
+        self.audit_events.append({"id": len(self.audit_events) + 1, "author_id": author_id, "entity_id": project["id"],
+                                  "entity_type": "Project", "created_at": datetime.now(timezone.utc).isoformat(),
+                                  "details": {"custom_message": action, "entity_path": project["path_with_namespace"]}})
+
+    def drift(self, count):
+        """Changes settings of {:count} projects evenly spread over all projects, like changes made in GitLab UI.
+        Every other project changes through a push, which updates its `last_activity_at` instead of audit events.
+        :count  Number of projects to change.
+        :return List of ids of changed projects.
+        """
+        with self.lock:
+            project_ids = sorted(self.projects)[::max(1, len(self.projects) // max(count, 1))][:count]
+            for index, project_id in enumerate(project_ids):
+                project = self.projects[project_id]
+                project["settings"]["merge_method"] = "merge"
+                if index % 2:
+                    project["last_activity_at"] = datetime.now(timezone.utc).isoformat()
+                else:
+                    self.audit(project, "Changed merge method", author_id=TOKEN_USER_ID + 1)
+            return project_ids
+
+    def record(self, endpoint, status):
+        with self.lock:
+            self.requests[endpoint] += 1
+            self.statuses[status] += 1
+
+    def summary(self):
+        """Summarizes served requests.
+        :return Map with total number of requests, numbers by HTTP method, by endpoint and by status code.
+        """
+        with self.lock:
+            methods = Counter()
+            for endpoint, count in self.requests.items():
+                methods[endpoint.split(" ", 1)[0]] += count
+            return {"requests": sum(self.requests.values()), "methods": dict(methods),
+                    "endpoints": dict(self.requests), "statuses": dict(self.statuses)}
+
+
+class FakeGitlabHandler(BaseHTTPRequestHandler):
+    """Serves single request of fake GitLab API, routing it by `ROUTES` table."""
+
+    protocol_version = "HTTP/1.1"
+    # headers and body are written separately, which stalls keep-alive connections on delayed ACKs otherwise
+    disable_nagle_algorithm = True
+
+    ROUTES = [
+        ("POST", r"/api/graphql", "graphql"),
+        ("GET", r"/api/v4/projects", "list_projects"),
+        ("GET", r"/api/v4/groups", "list_groups"),
+        ("GET", r"/api/v4/audit_events", "list_audit_events"),
+        ("GET", r"/api/v4/user", "get_user"),
+        ("GET", r"/api/v4/groups/(?P<group>[^/]+)", "get_group"),
+        ("GET", r"/api/v4/groups/(?P<group>[^/]+)/projects", "list_group_projects"),
+        ("GET", r"/api/v4/groups/(?P<group>[^/]+)/push_rule", "get_group_push_rule"),
+        ("POST", r"/api/v4/groups/(?P<group>[^/]+)/push_rule", "post_group_push_rule"),
+        ("PUT", r"/api/v4/groups/(?P<group>[^/]+)/push_rule", "put_group_push_rule"),
+        ("GET", r"/api/v4/groups/(?P<group>[^/]+)/merge_request_approval_setting", "get_group_approval_setting"),
+        ("PUT", r"/api/v4/groups/(?P<group>[^/]+)/merge_request_approval_setting", "put_group_approval_setting"),
+        ("GET", r"/api/v4/groups/(?P<group>[^/]+)/(?P<collection>members/all|members|pending_members)",
+         "list_members"),
+        ("GET", r"/api/v4/projects/(?P<project>[^/]+)", "get_project"),
+        ("PUT", r"/api/v4/projects/(?P<project>[^/]+)", "put_project"),
+        ("GET", r"/api/v4/projects/(?P<project>[^/]+)/approvals", "get_approvals"),
+        ("POST", r"/api/v4/projects/(?P<project>[^/]+)/approvals", "post_approvals"),
+        ("GET", r"/api/v4/projects/(?P<project>[^/]+)/approval_rules", "list_approval_rules"),
+        ("POST", r"/api/v4/projects/(?P<project>[^/]+)/approval_rules", "post_approval_rule"),
+        ("PUT", r"/api/v4/projects/(?P<project>[^/]+)/approval_rules/(?P<rule>\d+)", "put_approval_rule"),
+        ("GET", r"/api/v4/projects/(?P<project>[^/]+)/push_rule", "get_push_rule"),
+        ("POST", r"/api/v4/projects/(?P<project>[^/]+)/push_rule", "post_push_rule"),
+        ("PUT", r"/api/v4/projects/(?P<project>[^/]+)/push_rule", "put_push_rule"),
+        ("GET", r"/api/v4/projects/(?P<project>[^/]+)/repository/branches", "list_branches"),
+        ("POST", r"/api/v4/projects/(?P<project>[^/]+)/repository/branches", "post_branch"),
+        ("GET", r"/api/v4/projects/(?P<project>[^/]+)/repository/branches/(?P<name>.+)", "get_branch"),
+        ("DELETE", r"/api/v4/projects/(?P<project>[^/]+)/repository/branches/(?P<name>.+)", "delete_branch"),
+        ("DELETE", r"/api/v4/projects/(?P<project>[^/]+)/repository/merged_branches", "delete_merged_branches"),
+        ("GET", r"/api/v4/projects/(?P<project>[^/]+)/repository/commits", "list_commits"),
+        ("GET", r"/api/v4/projects/(?P<project>[^/]+)/protected_branches", "list_protected_branches"),
+        ("POST", r"/api/v4/projects/(?P<project>[^/]+)/protected_branches", "post_protected_branch"),
+        ("GET", r"/api/v4/projects/(?P<project>[^/]+)/protected_branches/(?P<name>.+)", "get_protected_branch"),
+        ("PATCH", r"/api/v4/projects/(?P<project>[^/]+)/protected_branches/(?P<name>.+)", "patch_protected_branch"),
+        ("DELETE", r"/api/v4/projects/(?P<project>[^/]+)/protected_branches/(?P<name>.+)",
+         "delete_protected_branch"),
+    ]
+    COMPILED_ROUTES = [(method, re.compile(pattern + "$"), handler) for method, pattern, handler in ROUTES]
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        self.__serve()
+
+    def do_POST(self):
+        self.__serve()
+
+    def do_PUT(self):
+        self.__serve()
+
+    def do_PATCH(self):
+        self.__serve()
+
+    def do_DELETE(self):
+        self.__serve()
+
+    def __serve(self):
+        """Routes request, applying latency, rate limit and error injection of the server first.
+        Handlers only prepare response under state lock, response is written after the lock is released.
+        """
+        url = urlparse(self.path)
+        self.query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        self.body = self.__read_body()
+        self.extra_headers = {}
+        self.endpoint = f'{self.command} not_found'
+
+        route = None
+        for method, pattern, handler in self.COMPILED_ROUTES:
+            match = pattern.match(url.path)
+            if match and method == self.command:
+                route = handler, {key: unquote(value) for key, value in match.groupdict().items()}
+                self.endpoint = f'{self.command} {handler}'
+                break
+
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        self.extra_headers, retry_after = self.server.take_rate_limit_token()
+        if retry_after is not None:
+            self.send_json(429, {"message": "429 Too Many Requests"}, {"Retry-After": str(retry_after)})
+        elif self.server.should_fail():
+            self.send_json(503, {"message": "503 Service Unavailable"})
+        elif route is None:
+            self.send_json(404, {"message": "404 Not Found"})
+        else:
+            handler, kwargs = route
+            with self.server.state.lock:
+                getattr(self, handler)(**kwargs)
+                project = self.find_project(kwargs["project"]) if "project" in kwargs else None
+                if self.command != "GET" and self.response[0] < 400 and project is not None:
+                    self.server.state.audit(project, self.endpoint)
+
+        self.__write(*self.response)
+
+    def __read_body(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        raw = self.rfile.read(length) if length else b""
+        return json.loads(raw) if raw else {}
+
+    def send_json(self, status, body=None, headers=None):
+        """Prepares JSON response, serializing {:body} immediately, since it may refer to mutable state.
+        :status  HTTP status code.
+        :body    JSON-object of the response, empty body if `None`.
+        :headers Additional headers.
+        """
+        raw = b"" if body is None else json.dumps(body).encode()
+        self.response = (status, raw, dict(self.extra_headers, **(headers or {})))
+
+    def __write(self, status, raw, headers):
+        """Writes response, answering `304 Not Modified` if `If-None-Match` header matches ETag of the body.
+        :status  HTTP status code.
+        :raw     Serialized body.
+        :headers Response headers.
+        """
+        if status == 200 and self.command == "GET":
+            etag = f'W/"{hashlib.md5(raw).hexdigest()}"'
+            headers["ETag"] = etag
+            if self.headers.get("If-None-Match") == etag:
+                status, raw = 304, b""
+
+        self.server.state.record(self.endpoint, status)
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        for key, value in headers.items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(raw)
+
+    def send_page(self, items):
+        """Sends page of {:items} selected by offset (`page`) or keyset (`id_after`) pagination query parameters.
+        :items List of JSON-objects, ordered by id for keyset pagination.
+        """
+        per_page = min(int(self.query.get("per_page", DEFAULT_PER_PAGE)), MAX_PER_PAGE)
+        base_url = f'http://{self.headers.get("Host")}{urlparse(self.path).path}'
+        headers = {}
+
+        if self.query.get("pagination") == "keyset":
+            id_after = int(self.query.get("id_after", 0))
+            items = [item for item in items if item["id"] > id_after]
+            page_items = items[:per_page]
+            if len(items) > per_page:
+                query = dict(self.query, id_after=page_items[-1]["id"])
+                headers["Link"] = f'<{base_url}?{urlencode(query)}>; rel="next"'
+            return self.send_json(200, page_items, headers)
+
+        page = int(self.query.get("page", 1))
+        page_items = items[(page - 1) * per_page: page * per_page]
+        headers.update({"X-Page": str(page), "X-Per-Page": str(per_page), "X-Total": str(len(items))})
+        if page * per_page < len(items):
+            headers["X-Next-Page"] = str(page + 1)
+            query = dict(self.query, page=page + 1)
+            headers["Link"] = f'<{base_url}?{urlencode(query)}>; rel="next"'
+        self.send_json(200, page_items, headers)
+
+    def find_project(self, project):
+        """Finds project by id or url-decoded full path.
+        :return Project object, `None` if project does not exist.
+        """
+        projects = self.server.state.projects
+        if project.isdigit():
+            return projects.get(int(project))
+        return next((entry for entry in projects.values() if entry["path_with_namespace"] == project), None)
+
+    def find_group(self, group):
+        """Finds group by id or url-decoded full path.
+        :return Group object, `None` if group does not exist.
+        """
+        groups = self.server.state.groups
+        if group.isdigit():
+            return groups.get(int(group))
+        return next((entry for entry in groups.values() if entry["full_path"] == group), None)
+
+    def with_group(self, group, respond):
+        """Calls {:respond} with group object, or responds with 404 if group does not exist."""
+        entry = self.find_group(group)
+        if entry is None:
+            return self.send_json(404, {"message": "404 Group Not Found"})
+        return respond(entry)
+
+    def ancestor_settings(self, project):
+        """Lists settings of the project's group and its parent groups, nearest first.
+        :project Project object.
+        :return  List of group settings objects, see `FakeGitlabState.group_settings`.
+        """
+        settings = []
+        group = self.server.state.groups.get(project["namespace_id"])
+        while group is not None:
+            settings.append(self.server.state.group_settings[group["id"]])
+            group = self.server.state.groups.get(group["parent_id"])
+        return settings
+
+    def with_project(self, project, respond):
+        """Calls {:respond} with project object, or responds with 404 if project does not exist."""
+        entry = self.find_project(project)
+        if entry is None:
+            return self.send_json(404, {"message": "404 Project Not Found"})
+        return respond(entry)
+
+    @staticmethod
+    def project_json(project):
+        return dict({key: value for key, value in project.items()
+                     if key not in ("settings", "approvals", "approval_rules", "push_rule", "branches",
+                                    "protected_branches")}, **project["settings"])
+
+    def list_projects(self):
+        projects = sorted(self.server.state.projects.values(), key=lambda entry: entry["id"])
+        self.send_page([self.project_json(project) for project in projects])
+
+    def list_groups(self):
+        self.send_page(list(self.server.state.groups.values()))
+
+    def get_group(self, group):
+        self.with_group(group, lambda entry: self.send_json(200, entry))
+
+    def get_group_push_rule(self, group):
+        def respond(entry):
+            push_rule = self.server.state.group_settings[entry["id"]]["push_rule"]
+            if push_rule is None:
+                return self.send_json(404, {"message": "404 Push Rule Not Found"})
+            self.send_json(200, push_rule)
+
+        self.with_group(group, respond)
+
+    def post_group_push_rule(self, group):
+        def respond(entry):
+            settings = self.server.state.group_settings[entry["id"]]
+            if settings["push_rule"] is not None:
+                return self.send_json(422, {"message": "Group push rule exists"})
+            settings["push_rule"] = dict(self.body, id=entry["id"])
+            self.send_json(201, settings["push_rule"])
+
+        self.with_group(group, respond)
+
+    def put_group_push_rule(self, group):
+        def respond(entry):
+            settings = self.server.state.group_settings[entry["id"]]
+            if settings["push_rule"] is None:
+                return self.send_json(404, {"message": "404 Push Rule Not Found"})
+            settings["push_rule"].update(self.body)
+            self.send_json(200, settings["push_rule"])
+
+        self.with_group(group, respond)
+
+    def get_group_approval_setting(self, group):
+        def respond(entry):
+            setting = self.server.state.group_settings[entry["id"]]["approval_setting"]
+            self.send_json(200, {key: {"value": value, "locked": False, "inherited_from": None}
+                                 for key, value in setting.items()})
+
+        self.with_group(group, respond)
+
+    def put_group_approval_setting(self, group):
+        def respond(entry):
+            setting = self.server.state.group_settings[entry["id"]]["approval_setting"]
+            setting.update({key: value for key, value in self.body.items() if key in setting})
+            self.send_json(200, {key: {"value": value, "locked": False, "inherited_from": None}
+                                 for key, value in setting.items()})
+
+        self.with_group(group, respond)
+
+    def list_group_projects(self, group):
+        entry = self.find_group(group)
+        if entry is None:
+            return self.send_json(404, {"message": "404 Group Not Found"})
+
+        prefix = f'{entry["full_path"]}/'
+        projects = [project for project in self.server.state.projects.values()
+                    if project["path_with_namespace"].startswith(prefix)
+                    and (self.query.get("include_subgroups") == "true"
+                         or "/" not in project["path_with_namespace"][len(prefix):])]
+        if self.query.get("order_by") == "last_activity_at":
+            projects.sort(key=lambda project: datetime.fromisoformat(project["last_activity_at"]),
+                          reverse=self.query.get("sort", "desc") == "desc")
+        if self.query.get("simple") == "true":
+            projects = [{key: project[key] for key in ("id", "name", "path", "path_with_namespace", "description",
+                                                       "last_activity_at")}
+                        for project in projects]
+        else:
+            projects = [self.project_json(project) for project in projects]
+        self.send_page(projects)
+
+    def get_user(self):
+        self.send_json(200, {"id": TOKEN_USER_ID, "username": "gitlab-config", "is_admin": True})
+
+    def list_audit_events(self):
+        events = [event for event in reversed(self.server.state.audit_events)
+                  if event["entity_type"] == self.query.get("entity_type", event["entity_type"])]
+        if "created_after" in self.query:
+            created_after = datetime.fromisoformat(self.query["created_after"])
+            events = [event for event in events if datetime.fromisoformat(event["created_at"]) > created_after]
+        self.send_page(events)
+
+    def list_members(self, group, collection):
+        entry = self.find_group(group)
+        if entry is None:
+            return self.send_json(404, {"message": "404 Group Not Found"})
+        self.send_page(self.server.state.members.get(entry["id"], []))
+
+    def get_project(self, project):
+        self.with_project(project, lambda entry: self.send_json(200, self.project_json(entry)))
+
+    def put_project(self, project):
+        def respond(entry):
+            entry["settings"].update(self.body)
+            self.send_json(200, self.project_json(entry))
+
+        self.with_project(project, respond)
+
+    def get_approvals(self, project):
+        def respond(entry):
+            approvals = dict(entry["approvals"])
+            for settings in self.ancestor_settings(entry):
+                for group_key, (key, enforced) in GROUP_APPROVAL_RESTRICTIONS.items():
+                    if not settings["approval_setting"][group_key]:
+                        approvals[key] = enforced
+            self.send_json(200, approvals)
+
+        self.with_project(project, respond)
+
+    def post_approvals(self, project):
+        def respond(entry):
+            entry["approvals"].update(self.body)
+            self.send_json(201, entry["approvals"])
+
+        self.with_project(project, respond)
+
+    def list_approval_rules(self, project):
+        self.with_project(project, lambda entry: self.send_page(entry["approval_rules"]))
+
+    def post_approval_rule(self, project):
+        def respond(entry):
+            rule = dict(self.body, id=len(entry["approval_rules"]) + 1)
+            entry["approval_rules"].append(rule)
+            self.send_json(201, rule)
+
+        self.with_project(project, respond)
+
+    def put_approval_rule(self, project, rule):
+        def respond(entry):
+            rules = [candidate for candidate in entry["approval_rules"] if candidate["id"] == int(rule)]
+            if not rules:
+                return self.send_json(404, {"message": "404 Not Found"})
+            rules[0].update(self.body, id=int(rule))
+            self.send_json(200, rules[0])
+
+        self.with_project(project, respond)
+
+    def get_push_rule(self, project):
+        def respond(entry):
+            inherited = [settings["push_rule"] for settings in self.ancestor_settings(entry) if settings["push_rule"]]
+            push_rule = entry["push_rule"] or (inherited[0] if inherited else None)
+            if push_rule is None:
+                return self.send_json(404, {"message": "404 Push Rule Not Found"})
+            self.send_json(200, push_rule)
+
+        self.with_project(project, respond)
+
+    def post_push_rule(self, project):
+        def respond(entry):
+            if entry["push_rule"] is not None:
+                return self.send_json(422, {"message": "Project push rule exists"})
+            entry["push_rule"] = dict(self.body, id=entry["id"])
+            self.send_json(201, entry["push_rule"])
+
+        self.with_project(project, respond)
+
+    def put_push_rule(self, project):
+        def respond(entry):
+            inherited = [settings["push_rule"] for settings in self.ancestor_settings(entry) if settings["push_rule"]]
+            if entry["push_rule"] is None and not inherited:
+                return self.send_json(404, {"message": "404 Push Rule Not Found"})
+            # project overriding inherited push rule gets its own copy
+            entry["push_rule"] = entry["push_rule"] or dict(inherited[0], id=entry["id"])
+            entry["push_rule"].update(self.body)
+            self.send_json(200, entry["push_rule"])
+
+        self.with_project(project, respond)
+
+    def list_branches(self, project):
+        def respond(entry):
+            branches = list(entry["branches"].values())
+            if "search" in self.query:
+                branches = [branch for branch in branches if self.query["search"] in branch["name"]]
+            self.send_page(branches)
+
+        self.with_project(project, respond)
+
+    def post_branch(self, project):
+        def respond(entry):
+            name, ref = self.query.get("branch"), self.query.get("ref")
+            if ref not in entry["branches"]:
+                return self.send_json(400, {"message": "Invalid reference name"})
+            if name in entry["branches"]:
+                return self.send_json(400, {"message": "Branch already exists"})
+            entry["branches"][name] = dict(entry["branches"][ref], name=name, protected=False, default=False)
+            entry["last_activity_at"] = datetime.now(timezone.utc).isoformat()
+            self.send_json(201, entry["branches"][name])
+
+        self.with_project(project, respond)
+
+    def get_branch(self, project, name):
+        def respond(entry):
+            if name not in entry["branches"]:
+                return self.send_json(404, {"message": "404 Branch Not Found"})
+            self.send_json(200, entry["branches"][name])
+
+        self.with_project(project, respond)
+
+    def delete_branch(self, project, name):
+        def respond(entry):
+            branch = entry["branches"].get(name)
+            if branch is None:
+                return self.send_json(404, {"message": "404 Branch Not Found"})
+            if branch["protected"] or branch["default"]:
+                return self.send_json(403, {"message": "403 Forbidden"})
+            del entry["branches"][name]
+            entry["last_activity_at"] = datetime.now(timezone.utc).isoformat()
+            self.send_json(204)
+
+        self.with_project(project, respond)
+
+    def delete_merged_branches(self, project):
+        self.with_project(project, lambda entry: self.send_json(202, {"message": "202 Accepted"}))
+
+    def list_commits(self, project):
+        def respond(entry):
+            ref_name = self.query.get("ref_name", entry["default_branch"])
+            if ref_name not in entry["branches"]:
+                return self.send_json(404, {"message": "404 Reference Not Found"})
+            commit = entry["branches"][ref_name]["commit"]
+            self.send_page([{"id": commit["id"], "message": "Initial commit", "created_at": commit["created_at"],
+                             "committed_date": commit["created_at"]}])
+
+        self.with_project(project, respond)
+
+    def list_protected_branches(self, project):
+        self.with_project(project, lambda entry: self.send_page(list(entry["protected_branches"].values())))
+
+    def post_protected_branch(self, project):
+        def respond(entry):
+            params = dict(self.query, **self.body)
+            name = params.get("name")
+            if name in entry["protected_branches"]:
+                return self.send_json(409, {"message": "Protected branch already exists"})
+
+            protected_branch = {"id": len(entry["protected_branches"]) + 1, "name": name,
+                                "allow_force_push": str(params.get("allow_force_push")).lower() == "true",
+                                "code_owner_approval_required":
+                                    str(params.get("code_owner_approval_required")).lower() == "true",
+                                "push_access_levels": [], "merge_access_levels": [], "unprotect_access_levels": []}
+            for key, levels_key in (("push_access_level", "push_access_levels"),
+                                    ("merge_access_level", "merge_access_levels"),
+                                    ("unprotect_access_level", "unprotect_access_levels")):
+                if key in params:
+                    protected_branch[levels_key].append(self.access_level(params[key]))
+            entry["protected_branches"][name] = protected_branch
+            if name in entry["branches"]:
+                entry["branches"][name]["protected"] = True
+            self.send_json(201, protected_branch)
+
+        self.with_project(project, respond)
+
+    def get_protected_branch(self, project, name):
+        def respond(entry):
+            if name not in entry["protected_branches"]:
+                return self.send_json(404, {"message": "404 Not found"})
+            self.send_json(200, entry["protected_branches"][name])
+
+        self.with_project(project, respond)
+
+    def patch_protected_branch(self, project, name):
+        def respond(entry):
+            protected_branch = entry["protected_branches"].get(name)
+            if protected_branch is None:
+                return self.send_json(404, {"message": "404 Not found"})
+
+            for key, levels_key in (("allowed_to_push", "push_access_levels"),
+                                    ("allowed_to_merge", "merge_access_levels"),
+                                    ("allowed_to_unprotect", "unprotect_access_levels")):
+                for level in self.body.get(key, []):
+                    if level.get("_destroy"):
+                        protected_branch[levels_key] = [candidate for candidate in protected_branch[levels_key]
+                                                        if candidate["id"] != level["id"]]
+                    elif "id" in level:
+                        for candidate in protected_branch[levels_key]:
+                            if candidate["id"] == level["id"]:
+                                candidate.update(self.access_level(level["access_level"]), id=level["id"])
+                    else:
+                        protected_branch[levels_key].append(self.access_level(level.get("access_level")))
+            for key in ("allow_force_push", "code_owner_approval_required"):
+                if key in self.body:
+                    protected_branch[key] = bool(self.body[key])
+            self.send_json(200, protected_branch)
+
+        self.with_project(project, respond)
+
+    def delete_protected_branch(self, project, name):
+        def respond(entry):
+            if entry["protected_branches"].pop(name, None) is None:
+                return self.send_json(404, {"message": "404 Not found"})
+            if name in entry["branches"]:
+                entry["branches"][name]["protected"] = False
+            self.send_json(204)
+
+        self.with_project(project, respond)
+
+    def access_level(self, access_level):
+        """Creates access level object with unique id.
+        :access_level GitLab access level, e.g. 40 for maintainers.
+        :return       Access level object.
+        """
+        self.server.access_level_id += 1
+        return {"id": self.server.access_level_id, "access_level": int(access_level),
+                "access_level_description": str(access_level), "user_id": None, "group_id": None}
+
+    def graphql(self):
+        """Serves `projects(ids:)` query of GraphQL reader, ignoring requested fields."""
+        ids = [int(gid.rsplit("/", 1)[-1]) for gid in self.body.get("variables", {}).get("ids") or []]
+        nodes = []
+        for project_id in ids:
+            project = self.server.state.projects.get(project_id)
+            if project is None:
+                continue
+
+            settings = project["settings"]
+            nodes.append({
+                "id": f'gid://gitlab/Project/{project_id}', "path": project["path"],
+                "fullPath": project["path_with_namespace"], "description": project["description"],
+                "allowMergeOnSkippedPipeline": settings.get("allow_merge_on_skipped_pipeline"),
+                "onlyAllowMergeIfPipelineSucceeds": settings.get("only_allow_merge_if_pipeline_succeeds"),
+                "onlyAllowMergeIfAllDiscussionsAreResolved":
+                    settings.get("only_allow_merge_if_all_discussions_are_resolved"),
+                "removeSourceBranchAfterMerge": settings.get("remove_source_branch_after_merge"),
+                "mergeRequestsFfOnlyEnabled": settings.get("merge_method") == "ff",
+                "branchRules": {"pageInfo": {"hasNextPage": False}, "nodes": [
+                    {"name": name, "branchProtection": {
+                        "allowForcePush": protected_branch["allow_force_push"],
+                        "codeOwnerApprovalRequired": protected_branch["code_owner_approval_required"],
+                        "pushAccessLevels": {"nodes": [self.graphql_access_level(level)
+                                                       for level in protected_branch["push_access_levels"]]},
+                        "mergeAccessLevels": {"nodes": [self.graphql_access_level(level)
+                                                        for level in protected_branch["merge_access_levels"]]}}}
+                    for name, protected_branch in project["protected_branches"].items()]}})
+
+        self.send_json(200, {"data": {"projects": {"pageInfo": {"hasNextPage": False, "endCursor": None},
+                                                   "nodes": nodes}}})
+
+    @staticmethod
+    def graphql_access_level(level):
+        return {"accessLevel": level["access_level"], "accessLevelDescription": level["access_level_description"],
+                "user": None, "group": None}
+
+
+class FakeGitlabServer(ThreadingHTTPServer):
+    """HTTP server of fake GitLab instance with configurable latency, error injection and rate limit.
+
+    Attributes:
+        state: FakeGitlabState object.
+        latency (float): Delay of every response in seconds.
+        error_rate (float): Probability of responding with `503 Service Unavailable`.
+        rate_limit (int): Number of requests allowed per second, unlimited if 0. Exceeding requests get 429.
+        random: Seeded random generator, so that injected errors are reproducible.
+        access_level_id (int): Id of the last created access level.
+        lock: Guards rate limit window and random generator.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, state, port=0, latency=0.0, error_rate=0.0, rate_limit=0, seed=0):
+        super().__init__(("127.0.0.1", port), FakeGitlabHandler)
+        self.state = state
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.random = random.Random(seed)
+        self.access_level_id = 0
+        self.lock = threading.Lock()
+        self.window = int(time.time())
+        self.window_requests = 0
+        self.thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_port}'
+
+    def start(self):
+        """Serves requests in background thread.
+        :return FakeGitlabServer object itself.
+        """
+        self.thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def take_rate_limit_token(self):
+        """Counts request within current one-second window.
+        :return Pair of `RateLimit-*` headers and number of seconds to retry after, `None` if request is allowed.
+        """
+        if not self.rate_limit:
+            return {}, None
+
+        with self.lock:
+            now = int(time.time())
+            if now != self.window:
+                self.window, self.window_requests = now, 0
+            self.window_requests += 1
+            remaining = max(self.rate_limit - self.window_requests, 0)
+
+        headers = {"RateLimit-Limit": str(self.rate_limit), "RateLimit-Remaining": str(remaining),
+                   "RateLimit-Reset": str(self.window + 1)}
+        return headers, (1 if self.window_requests > self.rate_limit else None)
+
+    def should_fail(self):
+        if not self.error_rate:
+            return False
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+
+def main():
+    arg_parser = ArgumentParser(description="Serves fake GitLab API for local load testing of gitlab-config.")
+    arg_parser.add_argument("--port", default=8080, type=int, help="Port to listen on")
+    arg_parser.add_argument("--projects", default=100, type=int, help="Number of projects")
+    arg_parser.add_argument("--groups", default=1, type=int, help="Number of subgroups of the `bench` group")
+    arg_parser.add_argument("--branches", default=3, type=int, help="Number of feature branches of every project")
+    arg_parser.add_argument("--latency", default=0.0, type=float, help="Delay of every response in seconds")
+    arg_parser.add_argument("--error_rate", default=0.0, type=float, help="Probability of 503 responses")
+    arg_parser.add_argument("--rate_limit", default=0, type=int, help="Requests allowed per second, 0 to disable")
+    args = arg_parser.parse_args()
+
+    state = FakeGitlabState.seed(args.projects, args.groups, args.branches)
+    server = FakeGitlabServer(state, args.port, args.latency, args.error_rate, args.rate_limit)
+    print(f'Fake GitLab with {args.projects} projects in `bench` group is listening on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(state.summary(), indent=2))
+
+
+if __name__ == "__main__":
+    main()
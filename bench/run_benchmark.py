@@ -0,0 +1,134 @@
+"""End-to-end benchmark of gitlab-config flows against fake GitLab server.
+
+Every flow runs `src/main.py` in a subprocess against a freshly seeded fake instance, and reports its wall time,
+number of GitLab API requests and peak RSS, e.g.
+`python3 bench/run_benchmark.py --sizes 10,100,1000 --latency 0.02 --output bench_output.json`.
+"""
+from argparse import ArgumentParser
+from fake_gitlab import FakeGitlabServer, FakeGitlabState
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+MAIN_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src", "main.py")
+
+# every flow is a list of runs against the same instance, so that later runs observe changes of the earlier ones,
+# `{workdir}` is replaced by temporary directory of the flow
+FLOWS = {"apply": [["--mode", "apply"]],
+         "reapply": [["--mode", "apply"], ["--mode", "apply"]],
+         "plan": [["--mode", "plan"]],
+         "force": [["--mode", "force"]],
+         "reforce": [["--mode", "apply"], ["--mode", "force"]],
+         "graphql": [["--mode", "apply"], ["--mode", "apply", "--graphql"]],
+         "async": [["--mode", "apply", "--async"], ["--mode", "apply", "--async"]],
+         "pipeline": [["--mode", "apply", "--pipeline_depth", "16"], ["--mode", "apply", "--pipeline_depth", "16"]],
+         "incremental": [["--mode", "apply", "--incremental", "{workdir}/checkpoint.json"],
+                         ["--mode", "apply", "--incremental", "{workdir}/checkpoint.json"]]}
+
+
+def run_tool(server, tool_args, timeout):
+    """Runs gitlab-config against {:server} in a subprocess.
+    :server    FakeGitlabServer object.
+    :tool_args Optional CL-arguments of gitlab-config.
+    :timeout   Number of seconds after which the run is killed.
+    :return    Map with exit code, wall time in seconds, number of requests and peak RSS in megabytes.
+    """
+    requests_before = server.state.summary()["requests"]
+    command = [sys.executable, MAIN_PATH, server.url, "benchmark-token", "false", "--namespace_paths", "bench",
+               "--no-cache"] + tool_args
+
+    with tempfile.TemporaryFile() as stderr:
+        started_at = time.monotonic()
+        process = subprocess.Popen(command, stdout=subprocess.DEVNULL, stderr=stderr)
+        timer = threading.Timer(timeout, process.kill)
+        timer.start()
+        try:
+            # unlike `Popen.wait`, `wait4` reports resource usage of the finished process
+            _, status, rusage = os.wait4(process.pid, 0)
+        finally:
+            timer.cancel()
+        wall_time = time.monotonic() - started_at
+        process.returncode = os.waitstatus_to_exitcode(status)
+
+        stderr.seek(0)
+        error_lines = stderr.read().decode(errors="replace").strip().splitlines()
+
+    # `ru_maxrss` is in kilobytes on Linux and in bytes on macOS
+    peak_rss = rusage.ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    return {"args": tool_args, "exit_code": process.returncode, "wall_time": round(wall_time, 3),
+            "requests": server.state.summary()["requests"] - requests_before, "peak_rss_mb": round(peak_rss, 1),
+            "error": error_lines[-1] if process.returncode and error_lines else None}
+
+
+def run_flow(flow, size, args):
+    """Runs every step of the {:flow} against fake instance with {:size} projects.
+    :flow   Name of the flow within `FLOWS`.
+    :size   Number of projects.
+    :args   Parsed arguments of the benchmark.
+    :return List of results of the runs.
+    """
+    state = FakeGitlabState.seed(size, groups=max(1, size // args.projects_per_group))
+    server = FakeGitlabServer(state, latency=args.latency, error_rate=args.error_rate,
+                              rate_limit=args.rate_limit).start()
+    results = []
+    try:
+        with tempfile.TemporaryDirectory() as workdir:
+            for run, tool_args in enumerate(FLOWS[flow]):
+                if run > 0 and args.drift:
+                    state.drift(args.drift)
+                tool_args = [arg.replace("{workdir}", workdir) for arg in tool_args + args.tool_args.split()]
+                results.append(run_tool(server, tool_args, args.timeout))
+        return results
+    finally:
+        server.stop()
+
+
+def main():
+    arg_parser = ArgumentParser(description="Benchmarks gitlab-config flows against fake GitLab server.")
+    arg_parser.add_argument("--sizes", default="10,100,1000,10000", type=str,
+                            help="Numbers of projects (comma separated)")
+    arg_parser.add_argument("--flows", default="reapply", type=str,
+                            help=f'Flows to run (comma separated), some of {", ".join(FLOWS)}')
+    arg_parser.add_argument("--projects_per_group", default=100, type=int, help="Number of projects per subgroup")
+    arg_parser.add_argument("--latency", default=0.0, type=float, help="Delay of every response in seconds")
+    arg_parser.add_argument("--error_rate", default=0.0, type=float, help="Probability of 503 responses")
+    arg_parser.add_argument("--rate_limit", default=0, type=int, help="Requests allowed per second, 0 to disable")
+    arg_parser.add_argument("--drift", default=0, type=int,
+                            help="Number of projects changed out of band before every run of a flow but the first")
+    arg_parser.add_argument("--tool_args", default="", type=str,
+                            help="Additional CL-arguments of gitlab-config, e.g. `--concurrency 16`")
+    arg_parser.add_argument("--timeout", default=3600, type=int, help="Number of seconds after which run is killed")
+    arg_parser.add_argument("--output", default="", type=str, help="Path to JSON report")
+    args = arg_parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size]
+    flows = [flow for flow in args.flows.split(",") if flow]
+    unknown_flows = set(flows) - FLOWS.keys()
+    if unknown_flows:
+        arg_parser.error(f'Unknown flows {sorted(unknown_flows)}, expected some of {list(FLOWS)}')
+
+    report = []
+    print(f'{"flow":<10}{"projects":>10}{"run":>5}{"exit":>6}{"seconds":>10}{"requests":>10}{"req/s":>9}'
+          f'{"rss MB":>9}')
+    for flow in flows:
+        for size in sizes:
+            for run, result in enumerate(run_flow(flow, size, args), start=1):
+                report.append(dict(result, flow=flow, projects=size, run=run))
+                rate = result["requests"] / result["wall_time"] if result["wall_time"] else 0
+                print(f'{flow:<10}{size:>10}{run:>5}{result["exit_code"]:>6}{result["wall_time"]:>10.2f}'
+                      f'{result["requests"]:>10}{rate:>9.0f}{result["peak_rss_mb"]:>9.1f}')
+                if result["error"]:
+                    print(f'  {result["error"]}')
+
+    if args.output:
+        with open(args.output, mode="w") as file:
+            json.dump(report, file, indent=2)
+
+
+if __name__ == "__main__":
+    main()
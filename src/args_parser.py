@@ -2,7 +2,16 @@ from argparse import ArgumentParser
 from const import Optionals, Positionals
 from custom_argparse import CustomArgparseFormatter
 
+import audit_table
+import desired_state
+import ipaddress
 import json
+import os
+import re
+import stat
+
+# address of HTTP server, e.g. `127.0.0.1:8080` or `:8080`, any other address is a path of Unix socket
+TCP_ADDRESS_PATTERN = re.compile(r"(?P<host>[^/:]*):(?P<port>\d+)")
 
 
 def parse_args():
@@ -22,6 +31,39 @@ def parse_args():
     arg_parser.add_argument(Optionals.PROTECTED_BRANCHES["name"], default=Optionals.PROTECTED_BRANCHES["default"], type=str, help=Optionals.PROTECTED_BRANCHES["help"])
     arg_parser.add_argument(Optionals.PROJECT_SETTINGS["name"], default=Optionals.PROJECT_SETTINGS["default"], type=str, help=Optionals.PROJECT_SETTINGS["help"])
     arg_parser.add_argument(Optionals.PUSH_RULES["name"], default=Optionals.PUSH_RULES["default"], type=str, help=Optionals.PUSH_RULES["help"])
+    arg_parser.add_argument(Optionals.DESIRED_STATE["name"], default=Optionals.DESIRED_STATE["default"], type=str, help=Optionals.DESIRED_STATE["help"])
+    arg_parser.add_argument(Optionals.MODE["name"], default=Optionals.MODE["default"], choices=Optionals.MODE["choices"], type=str, help=Optionals.MODE["help"])
+    arg_parser.add_argument(Optionals.GRAPHQL["name"], default=Optionals.GRAPHQL["default"], action="store_true", help=Optionals.GRAPHQL["help"])
+    arg_parser.add_argument(Optionals.GRAPHQL_BATCH_SIZE["name"], default=Optionals.GRAPHQL_BATCH_SIZE["default"], type=int, help=Optionals.GRAPHQL_BATCH_SIZE["help"])
+    arg_parser.add_argument(Optionals.CACHE_DIR["name"], default=Optionals.CACHE_DIR["default"], type=str, help=Optionals.CACHE_DIR["help"])
+    arg_parser.add_argument(Optionals.NO_CACHE["name"], default=Optionals.NO_CACHE["default"], action="store_true", help=Optionals.NO_CACHE["help"])
+    arg_parser.add_argument(Optionals.CACHE_TTL["name"], default=Optionals.CACHE_TTL["default"], type=int, help=Optionals.CACHE_TTL["help"])
+    arg_parser.add_argument(Optionals.CACHE_MAX_SIZE["name"], default=Optionals.CACHE_MAX_SIZE["default"], type=int, help=Optionals.CACHE_MAX_SIZE["help"])
+    arg_parser.add_argument(Optionals.RATE_LIMIT["name"], default=Optionals.RATE_LIMIT["default"], type=float, help=Optionals.RATE_LIMIT["help"])
+    arg_parser.add_argument(Optionals.RATE_BURST["name"], default=Optionals.RATE_BURST["default"], type=int, help=Optionals.RATE_BURST["help"])
+    arg_parser.add_argument(Optionals.METRICS_JSON["name"], default=Optionals.METRICS_JSON["default"], type=str, help=Optionals.METRICS_JSON["help"])
+    arg_parser.add_argument(Optionals.METRICS_PROM["name"], default=Optionals.METRICS_PROM["default"], type=str, help=Optionals.METRICS_PROM["help"])
+    arg_parser.add_argument(Optionals.COMMITS_CHECKPOINT["name"], default=Optionals.COMMITS_CHECKPOINT["default"], type=str, help=Optionals.COMMITS_CHECKPOINT["help"])
+    arg_parser.add_argument(Optionals.JOURNAL["name"], default=Optionals.JOURNAL["default"], type=str, help=Optionals.JOURNAL["help"])
+    arg_parser.add_argument(Optionals.RESUME["name"], default=Optionals.RESUME["default"], action="store_true", help=Optionals.RESUME["help"])
+    arg_parser.add_argument(Optionals.ON_FAILURE["name"], default=Optionals.ON_FAILURE["default"], choices=Optionals.ON_FAILURE["choices"], type=str, help=Optionals.ON_FAILURE["help"])
+    arg_parser.add_argument(Optionals.MAX_FAILURES["name"], default=Optionals.MAX_FAILURES["default"], type=int, help=Optionals.MAX_FAILURES["help"])
+    arg_parser.add_argument(Optionals.INCREMENTAL["name"], default=Optionals.INCREMENTAL["default"], type=str, help=Optionals.INCREMENTAL["help"])
+    arg_parser.add_argument(Optionals.TARGETS["name"], default=Optionals.TARGETS["default"], type=str, help=Optionals.TARGETS["help"])
+    arg_parser.add_argument(Optionals.FAN_OUT_WORKERS["name"], default=Optionals.FAN_OUT_WORKERS["default"], type=int, help=Optionals.FAN_OUT_WORKERS["help"])
+    arg_parser.add_argument(Optionals.ASYNC["name"], dest="async_mode", default=Optionals.ASYNC["default"], action="store_true", help=Optionals.ASYNC["help"])
+    arg_parser.add_argument(Optionals.AUDIT["name"], default=Optionals.AUDIT["default"], nargs="*", type=str, help=Optionals.AUDIT["help"])
+    arg_parser.add_argument(Optionals.AUDIT_SNAPSHOT["name"], default=Optionals.AUDIT_SNAPSHOT["default"], type=str, help=Optionals.AUDIT_SNAPSHOT["help"])
+    arg_parser.add_argument(Optionals.AUDIT_MAX_AGE["name"], default=Optionals.AUDIT_MAX_AGE["default"], type=int, help=Optionals.AUDIT_MAX_AGE["help"])
+    arg_parser.add_argument(Optionals.GROUP_FIRST["name"], default=Optionals.GROUP_FIRST["default"], action="store_true", help=Optionals.GROUP_FIRST["help"])
+    arg_parser.add_argument(Optionals.PIPELINE_DEPTH["name"], default=Optionals.PIPELINE_DEPTH["default"], type=int, help=Optionals.PIPELINE_DEPTH["help"])
+    arg_parser.add_argument(Optionals.SERVE["name"], default=Optionals.SERVE["default"], type=str, help=Optionals.SERVE["help"])
+    arg_parser.add_argument(Optionals.CONCURRENCY["name"], default=Optionals.CONCURRENCY["default"], type=int, help=Optionals.CONCURRENCY["help"])
+    arg_parser.add_argument(Optionals.POOL_SIZE["name"], default=Optionals.POOL_SIZE["default"], type=int, help=Optionals.POOL_SIZE["help"])
+    arg_parser.add_argument(Optionals.MAX_RETRIES["name"], default=Optionals.MAX_RETRIES["default"], type=int, help=Optionals.MAX_RETRIES["help"])
+    arg_parser.add_argument(Optionals.BACKOFF_FACTOR["name"], default=Optionals.BACKOFF_FACTOR["default"], type=float, help=Optionals.BACKOFF_FACTOR["help"])
+    arg_parser.add_argument(Optionals.CONNECT_TIMEOUT["name"], default=Optionals.CONNECT_TIMEOUT["default"], type=float, help=Optionals.CONNECT_TIMEOUT["help"])
+    arg_parser.add_argument(Optionals.READ_TIMEOUT["name"], default=Optionals.READ_TIMEOUT["default"], type=float, help=Optionals.READ_TIMEOUT["help"])
 
     parsed_args = arg_parser.parse_args()
 
@@ -35,7 +77,42 @@ def parse_args():
             "approval_rules": json.loads(parsed_args.approval_rules),
             "protected_branches": json.loads(parsed_args.protected_branches),
             "project_settings": json.loads(parsed_args.project_settings),
-            "push_rule_regex": parsed_args.push_rule_regex}
+            "push_rule_regex": parsed_args.push_rule_regex,
+            "desired_state": {},
+            "mode": parsed_args.mode,
+            "graphql": parsed_args.graphql,
+            "graphql_batch_size": parsed_args.graphql_batch_size,
+            "cache_dir": parsed_args.cache_dir,
+            "no_cache": parsed_args.no_cache,
+            "cache_ttl": parsed_args.cache_ttl,
+            "cache_max_size": parsed_args.cache_max_size,
+            "metrics_json": parsed_args.metrics_json,
+            "metrics_prom": parsed_args.metrics_prom,
+            "commits_checkpoint": parsed_args.commits_checkpoint,
+            "rate_limit": parsed_args.rate_limit,
+            "rate_burst": parsed_args.rate_burst,
+            "journal": parsed_args.journal,
+            "resume": parsed_args.resume,
+            "on_failure": parsed_args.on_failure,
+            "max_failures": parsed_args.max_failures,
+            "incremental": parsed_args.incremental,
+            "targets": [],
+            "fan_out_workers": parsed_args.fan_out_workers,
+            "shard_index": 0,
+            "shard_count": 1,
+            "async_mode": parsed_args.async_mode,
+            "audit": parsed_args.audit,
+            "audit_snapshot": parsed_args.audit_snapshot,
+            "audit_max_age": parsed_args.audit_max_age,
+            "group_first": parsed_args.group_first,
+            "pipeline_depth": parsed_args.pipeline_depth,
+            "serve": parsed_args.serve,
+            "concurrency": parsed_args.concurrency,
+            "pool_size": parsed_args.pool_size,
+            "max_retries": parsed_args.max_retries,
+            "backoff_factor": parsed_args.backoff_factor,
+            "connect_timeout": parsed_args.connect_timeout,
+            "read_timeout": parsed_args.read_timeout}
 
     if all(len(entries) > 0 for entries in (args["namespace_paths"], args["project_ids"])):
         arg_parser.error("Arguments `namespace_paths`, `project_ids` and `project_slugs` are mutually exclusive.")
@@ -43,9 +120,113 @@ def parse_args():
     if args["project_slugs"] and not args["namespace_paths"]:
         arg_parser.error("Argument `project_slugs` should be specified with `namespace_paths` argument.")
 
+    if args["concurrency"] < 1:
+        arg_parser.error("Argument `concurrency` should be a positive number.")
+
+    if args["pool_size"] < 1:
+        arg_parser.error("Argument `pool_size` should be a positive number.")
+
+    if args["connect_timeout"] <= 0 or args["read_timeout"] <= 0:
+        arg_parser.error("Arguments `connect_timeout` and `read_timeout` should be positive numbers.")
+
+    if args["rate_limit"] < 0 or args["rate_burst"] < 1:
+        arg_parser.error("Arguments `rate_limit` and `rate_burst` should be positive numbers.")
+
+    if parsed_args.desired_state:
+        try:
+            args["desired_state"] = desired_state.load(parsed_args.desired_state)
+        except Exception as e:
+            arg_parser.error(f'Argument `desired_state` is invalid. Reason: {e}')
+
+    if args["resume"] and not args["journal"]:
+        arg_parser.error("Argument `resume` should be specified with `journal` argument.")
+
+    if args["max_failures"] < 1:
+        arg_parser.error("Argument `max_failures` should be a positive number.")
+
+    if parsed_args.targets:
+        # imported on demand, since it imports modules accessing GitLab API (e.g. `requests`)
+        import fan_out
+        try:
+            args["targets"] = fan_out.load_targets(parsed_args.targets, parsed_args.base_url, parsed_args.token)
+        except Exception as e:
+            arg_parser.error(f'Argument `targets` is invalid. Reason: {e}')
+
+    if args["targets"] and args["debug"]:
+        arg_parser.error("Argument `targets` cannot be specified in debug mode.")
+
+    if args["fan_out_workers"] < 0:
+        arg_parser.error("Argument `fan_out_workers` should be a positive number or 0.")
+
+    if args["async_mode"] and args["graphql"]:
+        arg_parser.error("Arguments `async` and `graphql` are mutually exclusive.")
+
+    if args["async_mode"]:
+        import async_gitlab_client
+        try:
+            async_gitlab_client.import_backend()
+        except ImportError as e:
+            arg_parser.error(str(e))
+
+    if args["audit"] is not None and (args["targets"] or args["incremental"] or args["debug"]):
+        arg_parser.error("Argument `audit` cannot be specified with `targets` or `incremental` arguments or in debug "
+                         "mode.")
+
+    for expression in args["audit"] or []:
+        try:
+            audit_table.parse_filter(expression)
+        except (ValueError, re.error) as e:
+            arg_parser.error(f'Argument `audit` is invalid. Reason: {e}')
+
+    if args["audit_snapshot"] and args["audit"] is None:
+        arg_parser.error("Argument `audit_snapshot` should be specified with `audit` argument.")
+
+    if args["group_first"] and not (args["namespace_paths"] or args["targets"]):
+        arg_parser.error("Argument `group_first` should be specified with `namespace_paths` or `targets` argument.")
+
+    if args["group_first"] and args["mode"] == "force":
+        arg_parser.error("Argument `group_first` cannot be specified in `force` mode, since inheritance by projects is "
+                         "verified by reading their settings.")
+
+    if args["pipeline_depth"] < 0:
+        arg_parser.error("Argument `pipeline_depth` should be a positive number or 0.")
+
+    if args["pipeline_depth"] and args["async_mode"]:
+        arg_parser.error("Arguments `pipeline_depth` and `async` are mutually exclusive, since asynchronous updates "
+                         "already overlap reads and writes of all projects.")
+
+    if args["serve"] and (args["targets"] or args["audit"] is not None or args["incremental"] or args["journal"] or
+                          args["async_mode"] or args["group_first"] or args["debug"]):
+        arg_parser.error("Argument `serve` cannot be specified with `targets`, `audit`, `incremental`, `journal`, "
+                         "`async` or `group_first` arguments or in debug mode.")
+
+    if args["serve"] and (args["namespace_paths"] or args["project_ids"] or args["project_slugs"]):
+        arg_parser.error("Argument `serve` cannot be specified with `namespace_paths`, `project_ids` or "
+                         "`project_slugs` arguments, since projects are selected by every request.")
+
+    if args["serve"]:
+        match = TCP_ADDRESS_PATTERN.fullmatch(args["serve"])
+        if match and not is_loopback(match["host"]):
+            arg_parser.error("Argument `serve` should listen on loopback host, since requests are not authenticated.")
+        if not match and os.path.lexists(args["serve"]) and not stat.S_ISSOCK(os.lstat(args["serve"]).st_mode):
+            arg_parser.error(f'Argument `serve` is a path of existing file `{args["serve"]}`, which is not a socket.')
+
     return args
 
 
+def is_loopback(host):
+    """Checks whether {:host} of `serve` address is reachable only from local machine.
+    :host   Host name or IP address, empty for default `127.0.0.1`.
+    :return Boolean denoting, whether host is loopback.
+    """
+    if host in ("", "localhost"):
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
 def description():
     return "Updates configuration of all projects in specified groups within GitLab. \
         \nYou can specify which GitLab settings to configure using appropriate optional arguments. \
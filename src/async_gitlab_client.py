@@ -0,0 +1,212 @@
+from gitlab_client import (IDEMPOTENT_METHODS, backoff, build_response, cacheable_headers, conditional_headers,
+                           is_retriable, retry_delay)
+from rate_limiter import RateLimiter
+from response_cache import ResponseCache
+
+import asyncio
+import importlib
+import requests
+import time
+
+# preferred library goes first, only one of them has to be installed
+ASYNC_BACKENDS = ("aiohttp", "httpx")
+
+
+def import_backend():
+    """Imports the first installed asynchronous HTTP library from `ASYNC_BACKENDS`.
+    :return Pair of the library name and its module.
+    """
+    for name in ASYNC_BACKENDS:
+        try:
+            return name, importlib.import_module(name)
+        except ImportError:
+            continue
+
+    raise ImportError(f'Argument `async` requires one of {", ".join(ASYNC_BACKENDS)} libraries to be installed.')
+
+
+class AsyncGitlabClient:
+    """Asynchronous counterpart of GitlabClient, sending calls of all projects from a single thread.
+    Retries, backoff, `RateLimit-*` handling, caching and metrics follow GitlabClient, responses are Response objects
+    from requests, so that the same steps (see `call_steps`) are driven by both clients. Connections are opened in
+    `async with` block.
+
+    Attributes:
+        base_url (str): URL of GitLab API, e.g `https://github.kz/api/v4`.
+        headers (dict): Headers sent with every call, including token.
+        pool_size (int): Maximum number of connections to GitLab.
+        max_retries (int): Number of retries for a single call before giving up.
+        backoff_factor (float): Base delay (in seconds) of exponential backoff.
+        connect_timeout (float): Number of seconds to wait for connection.
+        read_timeout (float): Number of seconds to wait for response data.
+        backend (str): Name of the asynchronous HTTP library, e.g. `aiohttp`.
+        library: Module of the asynchronous HTTP library.
+        transport_errors (tuple): Exception types raised by the library when call fails without response.
+        session: Session object of the asynchronous HTTP library, `None` outside of `async with` block.
+        cache: ResponseCache object for GET-requests, `None` if caching is disabled.
+        limiter: RateLimiter object shared by all requests.
+        metrics: Metrics object from instrumentation, recording every call.
+    """
+
+    def __init__(self, args, metrics):
+        self.base_url = args["base_url"]
+        self.headers = args["headers"]
+        self.pool_size = args["pool_size"]
+        self.metrics = metrics
+        self.max_retries = args["max_retries"]
+        self.backoff_factor = args["backoff_factor"]
+        self.connect_timeout = args["connect_timeout"]
+        self.read_timeout = args["read_timeout"]
+        self.backend, self.library = import_backend()
+        library_error = self.library.ClientError if self.backend == "aiohttp" else self.library.TransportError
+        self.transport_errors = (OSError, asyncio.TimeoutError, library_error)
+        self.session = None
+        self.limiter = RateLimiter(args["rate_limit"], args["rate_burst"], args["pool_size"])
+
+        self.cache = None
+        if args["cache_dir"] and not args["no_cache"]:
+            self.cache = ResponseCache(args["cache_dir"], args["cache_ttl"], args["cache_max_size"] * 1024 * 1024)
+            # responses visible to one token may be hidden from another one
+            self.cache_namespace = args["headers"]["PRIVATE-TOKEN"]
+
+    async def __aenter__(self):
+        if self.backend == "aiohttp":
+            connector = self.library.TCPConnector(limit=self.pool_size)
+            # like GitlabClient, only connecting and waiting for data are limited in time, not whole calls
+            timeout = self.library.ClientTimeout(total=None, sock_connect=self.connect_timeout,
+                                                 sock_read=self.read_timeout)
+            self.session = self.library.ClientSession(headers=self.headers, connector=connector, timeout=timeout)
+        else:
+            limits = self.library.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size)
+            timeout = self.library.Timeout(self.read_timeout, connect=self.connect_timeout)
+            self.session = self.library.AsyncClient(headers=self.headers, limits=limits, timeout=timeout)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        if self.backend == "aiohttp":
+            await self.session.close()
+        else:
+            await self.session.aclose()
+        self.session = None
+
+    def url(self, path):
+        """Completes {:path} with GitLab API url, unless {:path} is already an absolute url.
+        :path Subdirectory (section) with which to complete url.
+        :return Absolute url.
+        """
+        if path.startswith(("http://", "https://")):
+            return path
+        return f'{self.base_url}/{path}'
+
+    async def request(self, method, path, **kwargs):
+        """Sends http-request, retrying it on throttling (429) and server-side (5xx) errors, see GitlabClient.
+        :method HTTP method name, e.g. `GET`.
+        :path Subdirectory (section) or absolute url to send request to.
+        :return Response object from requests.
+        """
+        method = method.upper()
+        url = self.url(path)
+
+        if method == "GET" and self.cache is not None:
+            return await self.__cached_get(url, **kwargs)
+
+        return await self.__send(method, url, **kwargs)
+
+    async def __send(self, method, url, params=None, data=None, headers=None):
+        """Sends http-request with retries, see `request` method.
+        :method HTTP method name in upper case.
+        :url Absolute url to send request to.
+        :params Query parameters.
+        :data Body of the request.
+        :headers Additional request headers.
+        :return Response object from requests.
+        """
+        started_at = time.monotonic()
+        response = None
+        attempt = 0
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                response = None
+                await self.limiter.acquire_async()
+                try:
+                    response = await self.__transmit(method, url, params, data, headers)
+                except requests.ConnectionError:
+                    if method not in IDEMPOTENT_METHODS or attempt == self.max_retries:
+                        raise
+                finally:
+                    self.limiter.release(response)
+
+                if response is None:
+                    await asyncio.sleep(backoff(attempt, self.backoff_factor))
+                    continue
+
+                if not is_retriable(method, response) or attempt == self.max_retries:
+                    return response
+
+                await asyncio.sleep(retry_delay(response, attempt, self.backoff_factor))
+        finally:
+            self.metrics.record_call(method, url, response.status_code if response is not None else 0,
+                                     time.monotonic() - started_at,
+                                     len(response.content) if response is not None else 0, attempt)
+
+    async def __transmit(self, method, url, params, data, headers):
+        """Sends a single http-request through the asynchronous HTTP library.
+        :method HTTP method name in upper case.
+        :url Absolute url to send request to.
+        :params Query parameters.
+        :data Body of the request.
+        :headers Additional request headers.
+        :return Response object from requests. Transport failures are raised as ConnectionError from requests,
+                so that callers handle them the same way in both modes.
+        """
+        try:
+            if self.backend == "aiohttp":
+                async with self.session.request(method, url, params=params, data=data, headers=headers) as response:
+                    body = await response.read()
+                    return build_response(str(response.url), response.status, response.headers.items(), body)
+
+            response = await self.session.request(method, url, params=params, content=data, headers=headers)
+            return build_response(str(response.url), response.status_code, response.headers.items(),
+                                  response.content)
+        except self.transport_errors as e:
+            raise requests.ConnectionError(f'{method} {url} failed. Reason: {e!r}') from e
+
+    async def __cached_get(self, url, params=None, headers=None, **kwargs):
+        """Sends conditional GET-request, answering it from `cache` if GitLab responds with `304 Not Modified`.
+        :url Absolute url to send request to.
+        :params Query parameters.
+        :headers Additional request headers.
+        :return Response object from requests.
+        """
+        url = requests.Request("GET", url, params=params).prepare().url
+        key = f'{self.cache_namespace}\n{url}'
+        # cache reads and writes files, which would block the event loop
+        entry = await asyncio.to_thread(self.cache.get, key)
+
+        response = await self.__send("GET", url, headers=conditional_headers(entry, headers), **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            await asyncio.to_thread(self.cache.touch, key)
+            return build_response(url, entry["status"], entry["headers"], entry["body"].encode("utf-8"))
+
+        cached_headers = cacheable_headers(response)
+        if cached_headers is not None:
+            await asyncio.to_thread(self.cache.put, key, response.status_code, cached_headers, response.text)
+
+        return response
+
+    async def get(self, path, **kwargs):
+        return await self.request("GET", path, **kwargs)
+
+    async def post(self, path, **kwargs):
+        return await self.request("POST", path, **kwargs)
+
+    async def put(self, path, **kwargs):
+        return await self.request("PUT", path, **kwargs)
+
+    async def patch(self, path, **kwargs):
+        return await self.request("PATCH", path, **kwargs)
+
+    async def delete(self, path, **kwargs):
+        return await self.request("DELETE", path, **kwargs)
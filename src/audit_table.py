@@ -0,0 +1,222 @@
+from collections import defaultdict
+from fnmatch import fnmatchcase
+from state_records import intern_value
+
+import gzip
+import json
+import operator
+import os
+import re
+import sys
+import time
+
+FILTER_PATTERN = re.compile(r"^\s*(?P<column>[^=!<>~\s]+)\s*(?P<operator>==|!=|<=|>=|<|>|!~|~)\s*(?P<value>.*?)\s*$")
+SECTION_NAMES = {"approval_settings": "Approval settings", "approval_rules": "Approval rules",
+                 "project_settings": "Project settings", "protected_branches": "Protected branches",
+                 "push_rule": "Push rules"}
+OPERATORS = {"==": operator.eq, "!=": operator.ne, "<": operator.lt, "<=": operator.le, ">": operator.gt,
+             ">=": operator.ge}
+
+
+def flatten_sections(sections):
+    """Flattens sections of a project into columns named by dotted paths, e.g. `project_settings.merge_method`.
+    Protected branches are keyed by branch name, e.g. `protected_branches.main.push_access_levels`, access levels are
+    reduced to sorted tuples of their `access_level` values. Only default (`any_approver`) approval rule is kept, since
+    only it is configured.
+    :sections Map of section names (see `desired_state.SECTIONS`) to JSON-objects of current or desired sections.
+    :return   Map of column names to scalar or tuple values.
+    """
+    columns = {}
+    for section, value in sections.items():
+        if section == "protected_branches":
+            for branch in value or []:
+                for key, branch_value in branch.items():
+                    if key.endswith("_access_levels"):
+                        branch_value = tuple(sorted(level.get("access_level") for level in branch_value or []))
+                    elif key in ("allow_force_push", "code_owner_approval_required"):
+                        branch_value = bool(branch_value)
+                    flatten_value(columns, f'{section}.{branch["name"]}.{key}', branch_value)
+        elif section == "approval_rules" and isinstance(value, list):
+            default_rules = [rule for rule in value if rule.get("rule_type") == "any_approver"]
+            flatten_value(columns, section, default_rules[0] if len(default_rules) == 1 else None)
+        else:
+            flatten_value(columns, section, value)
+
+    return columns
+
+
+def flatten_value(columns, name, value):
+    # names of columns and repeated values (e.g. `ff`, branch names) are stored once across all projects
+    if isinstance(value, dict):
+        for key, nested_value in value.items():
+            flatten_value(columns, f'{name}.{key}', nested_value)
+    elif isinstance(value, list):
+        columns[sys.intern(name)] = tuple(intern_value(json.dumps(entry, sort_keys=True))
+                                          if isinstance(entry, (dict, list)) else intern_value(entry)
+                                          for entry in value)
+    elif value is not None:
+        columns[sys.intern(name)] = intern_value(value)
+
+
+def parse_filter(expression):
+    """Parses filter expression, e.g. `project_settings.merge_method != ff` or `push_rule.* ~ ^dev`.
+    Value is parsed as JSON if possible (`true`, `2`, `[40]`), otherwise it is a string. Column may contain `*`
+    wildcards, then filter matches if any of the matching columns satisfies it.
+    :expression Filter expression, one of `==`, `!=`, `<`, `<=`, `>`, `>=`, `~` (regex search) and `!~` operators.
+    :return     Triple of column pattern, operator and value.
+    """
+    match = FILTER_PATTERN.match(expression)
+    if match is None:
+        raise ValueError(f'Invalid audit filter `{expression}`, expected `column operator value`, e.g. '
+                         f'`project_settings.merge_method != ff`')
+
+    column, operator_name, value = match.group("column", "operator", "value")
+    if operator_name in ("~", "!~"):
+        return column, operator_name, re.compile(value)
+    try:
+        value = json.loads(value)
+    except ValueError:
+        pass
+    return column, operator_name, tuple(value) if isinstance(value, list) else value
+
+
+class AuditTable:
+    """Columnar in-memory table of current state of projects, one row per project.
+    Every column is a list of values of a single flattened key (see `flatten_sections`), so that filters scan only
+    columns they refer to. Table can be saved as snapshot and queried again without GitLab API calls.
+
+    Attributes:
+        project_ids (list): Ids of projects by row.
+        paths (list): Full paths of projects by row.
+        columns (dict): Lists of values by column name, `None` where project lacks the key.
+        created_at (float): Time when state was loaded from GitLab.
+    """
+
+    def __init__(self, project_ids, paths, columns, created_at=None):
+        self.project_ids = project_ids
+        self.paths = paths
+        self.columns = columns
+        self.created_at = time.time() if created_at is None else created_at
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Builds table from flattened current state of projects.
+        :rows   List of (project_id, path, columns) triples, columns as returned by `flatten_sections`, so that
+                whole JSON-objects of projects are dropped as soon as every project is loaded.
+        :return AuditTable object.
+        """
+        rows = sorted(rows, key=lambda row: int(row[0]))
+        names = sorted({name for _, _, columns in rows for name in columns})
+        return cls([project_id for project_id, _, _ in rows], [path for _, path, _ in rows],
+                   {name: [columns.get(name) for _, _, columns in rows] for name in names})
+
+    def __len__(self):
+        return len(self.project_ids)
+
+    def column(self, name):
+        """Gets column by its name, column of `None` values if no project has the key.
+        :name   Name of the column.
+        :return List of values by row.
+        """
+        return self.columns.get(name) or [None] * len(self)
+
+    def select(self, expressions):
+        """Selects rows satisfying all filter expressions, see `parse_filter`.
+        :expressions List of filter expressions.
+        :return      List of row indices.
+        """
+        mask = [True] * len(self)
+        for expression in expressions:
+            mask = [selected and matched for selected, matched in zip(mask, self.__match(*parse_filter(expression)))]
+
+        return [row for row, selected in enumerate(mask) if selected]
+
+    def __match(self, pattern, operator_name, value):
+        """Evaluates single filter over whole columns.
+        :pattern       Name of the column, possibly with `*` wildcards.
+        :operator_name Filter operator.
+        :value         Parsed value of the filter.
+        :return        List of booleans by row.
+        """
+        names = [name for name in self.columns if fnmatchcase(name, pattern)] if "*" in pattern else [pattern]
+        mask = [False] * len(self)
+        for name in names:
+            column = self.column(name)
+            if operator_name == "~":
+                matched = [cell is not None and value.search(str(cell)) is not None for cell in column]
+            elif operator_name == "!~":
+                matched = [cell is None or value.search(str(cell)) is None for cell in column]
+            elif operator_name in ("==", "!="):
+                matched = [OPERATORS[operator_name](cell, value) for cell in column]
+            else:
+                matched = [cell is not None and self.__compare(operator_name, cell, value) for cell in column]
+            mask = [left or right for left, right in zip(mask, matched)]
+
+        return mask
+
+    @staticmethod
+    def __compare(operator_name, cell, value):
+        try:
+            return OPERATORS[operator_name](cell, value)
+        except TypeError:
+            return False
+
+    def differences(self, rows, desired):
+        """Compares rows with desired configuration column by column, only desired keys are compared (see
+        `state_diff.diff_settings`). Desired protected branch is compared only if the project protects it or it is the
+        project's default branch, since protection of branches missing from the project is not configured.
+        :rows    List of row indices sharing the same desired configuration.
+        :desired Map of column names to desired values, see `flatten_sections`.
+        :return  Map of row indices to maps of section names (see `SECTION_NAMES`) to maps of differing keys to pairs
+                 of their current and desired values.
+        """
+        differences = defaultdict(lambda: defaultdict(dict))
+        default_branches = self.column("project_settings.default_branch")
+        for name, desired_value in desired.items():
+            section, _, key = name.partition(".")
+            column = self.column(name)
+            branch_names = self.column(f'{section}.{key.rsplit(".", 1)[0]}.name') \
+                if section == "protected_branches" else None
+            for row in rows:
+                if column[row] == desired_value:
+                    continue
+                if branch_names is not None and branch_names[row] is None and \
+                        default_branches[row] != key.rsplit(".", 1)[0]:
+                    continue
+                differences[row][SECTION_NAMES[section]][key] = (column[row], desired_value)
+
+        return differences
+
+    def save(self, path, key):
+        """Saves table as compressed JSON snapshot.
+        :path Path to the snapshot file.
+        :key  Key of the selection the table was loaded for, see `load`.
+        """
+        tmp_path = f'{path}.tmp'
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+            json.dump({"key": key, "created_at": self.created_at, "project_ids": self.project_ids,
+                       "paths": self.paths, "columns": self.columns}, file)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, key, max_age):
+        """Loads table from snapshot, unless it is missing, outdated or loaded for another selection.
+        :path    Path to the snapshot file.
+        :key     Key of the current selection, e.g. digest of GitLab url and selected namespaces.
+        :max_age Number of seconds after which snapshot is outdated.
+        :return  AuditTable object, `None` if snapshot cannot be used.
+        """
+        try:
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                snapshot = json.load(file)
+        except (OSError, ValueError):
+            return None
+
+        if snapshot.get("key") != key or time.time() - snapshot["created_at"] > max_age:
+            return None
+
+        # JSON has no tuples, while list values are stored as tuples
+        columns = {sys.intern(name): [tuple(map(intern_value, cell)) if isinstance(cell, list) else intern_value(cell)
+                                      for cell in column]
+                   for name, column in snapshot["columns"].items()}
+        return cls(snapshot["project_ids"], snapshot["paths"], columns, snapshot["created_at"])
@@ -0,0 +1,59 @@
+from collections import namedtuple
+
+Call = namedtuple("Call", ["method", "path", "kwargs"])
+Call.__doc__ = """GitLab API call yielded by steps, which are generators describing a task without performing I/O.
+    The same steps are driven either by synchronous GitlabClient through `run` or by AsyncGitlabClient through
+    `run_async`, so that configuration logic is written once for both modes.
+
+    Attributes:
+        method (str): HTTP method name, e.g. `GET`.
+        path (str): Subdirectory (section) or absolute url to send request to.
+        kwargs (dict): Keyword arguments of the client's `request` method, e.g. `data` or `params`.
+    """
+
+
+def call(method, path, **kwargs):
+    """Creates call to yield from steps, e.g. `response = yield call("GET", f'projects/{project_id}')`.
+    :return Call object.
+    """
+    return Call(method, path, kwargs)
+
+
+def run(steps, client):
+    """Drives {:steps} by sending every yielded call through synchronous {:client}.
+    Exception raised by the call is thrown into {:steps}, so that steps may handle it.
+    :steps  Generator yielding Call objects and receiving responses.
+    :client GitlabClient object.
+    :return Value returned by {:steps}.
+    """
+    response, error = None, None
+    while True:
+        try:
+            pending_call = steps.throw(error) if error is not None else steps.send(response)
+        except StopIteration as stop:
+            return stop.value
+
+        try:
+            response, error = client.request(pending_call.method, pending_call.path, **pending_call.kwargs), None
+        except Exception as e:
+            response, error = None, e
+
+
+async def run_async(steps, client):
+    """Drives {:steps} by sending every yielded call through {:client} without blocking event loop, see `run`.
+    :steps  Generator yielding Call objects and receiving responses.
+    :client AsyncGitlabClient object.
+    :return Value returned by {:steps}.
+    """
+    response, error = None, None
+    while True:
+        try:
+            pending_call = steps.throw(error) if error is not None else steps.send(response)
+        except StopIteration as stop:
+            return stop.value
+
+        try:
+            response, error = await client.request(pending_call.method, pending_call.path,
+                                                   **pending_call.kwargs), None
+        except Exception as e:
+            response, error = None, e
@@ -0,0 +1,151 @@
+from datetime import datetime, timedelta, timezone
+from urllib.parse import quote_plus
+
+import const
+import global_utils
+import hashlib
+import json
+import os
+
+# arguments determining desired configuration of selected projects, every change of them requires full run
+CONFIG_ARGS = ("base_url", "namespace_paths", "project_ids", "project_slugs", "approval_settings", "approval_rules",
+               "protected_branches", "project_settings", "push_rule_regex", "desired_state", "shard_index",
+               "shard_count")
+# audit events are available only to administrators (instance) or on Premium tier
+UNAVAILABLE_AUDIT_STATUSES = {401, 403, 404}
+
+
+class ChangeFeed:
+    """Selects only projects possibly changed since previous run, if `incremental` CL-argument is set.
+    High-water mark (start of the previous run) is kept in checkpoint file together with digest of desired configuration
+    and ids of projects failed by previous run. Project is changed if its `last_activity_at` or an audit event of it
+    is newer than the mark. Full run is done if there is no checkpoint or desired configuration changed since.
+
+    Attributes:
+        args: Arguments object.
+        printer: Printer object from printer_utils.
+        path (str): Path to the checkpoint file, change feed is disabled if empty.
+        digest (str): Digest of arguments determining desired configuration of selected projects.
+        started_at: Timezone-aware datetime of the run start, becoming high-water mark of the next run.
+        since: Timezone-aware high-water mark of previous run, `None` if every selected project has to be configured.
+        pending (list): Ids of projects failed by previous run, configured regardless of their activity.
+    """
+
+    def __init__(self, args, printer):
+        self.args = args
+        self.printer = printer
+        self.path = args["incremental"]
+        self.digest = hashlib.sha256(json.dumps({key: args[key] for key in CONFIG_ARGS}, sort_keys=True,
+                                                default=str).encode()).hexdigest()
+        # changes made while previous run was reading may be missed by its reads
+        self.started_at = datetime.now(timezone.utc) - timedelta(seconds=const.CHANGE_FEED_OVERLAP_SECONDS)
+        self.since = None
+        self.pending = []
+
+        if self.path and os.path.exists(self.path):
+            with open(self.path) as file:
+                checkpoint = json.load(file)
+            if checkpoint.get("digest") == self.digest:
+                self.since = datetime.fromisoformat(checkpoint["high_water_mark"])
+                self.pending = checkpoint.get("pending", [])
+
+    def is_incremental(self):
+        """Checks whether only changed projects have to be selected.
+        :return Boolean, `False` for the first run and after desired configuration changed.
+        """
+        return self.since is not None
+
+    def changed_projects_steps(self):
+        """Steps selecting projects possibly changed since previous run among projects selected by CL-arguments.
+        :return List of pairs of project id and its full path (`None` if unknown), failed projects go first.
+        """
+        changed = {project_id: None for project_id in self.pending}
+
+        for project_id, path in (yield from self.__active_projects_steps()):
+            changed[project_id] = path
+
+        for event in (yield from self.__audit_events_steps()):
+            path = event.get("details", {}).get("entity_path")
+            if self.__is_selected(event["entity_id"], path):
+                # selection by ids keeps ids as specified
+                project_id = str(event["entity_id"]) if self.args["project_ids"] else event["entity_id"]
+                changed.setdefault(project_id, path)
+
+        return list(changed.items())
+
+    def __active_projects_steps(self):
+        """Steps selecting projects with activity (pushes, merge requests, creation, etc.) after high-water mark.
+        Projects of namespaces are listed newest activity first, so that listing stops at the first inactive one.
+        :return List of pairs of project id and its full path.
+        """
+        if self.args["namespace_paths"] and not self.args["project_slugs"]:
+            params = {"include_subgroups": "true", "simple": "true", "archived": "false",
+                      "order_by": "last_activity_at", "sort": "desc"}
+            active_projects = []
+            for namespace_path in self.args["namespace_paths"]:
+                path = f'groups/{quote_plus(namespace_path)}/projects'
+                projects = yield from self.printer.collection_steps(path, params,
+                                                                    stop=lambda entry: not self.__is_active(entry))
+                active_projects += [(entry["id"], entry["path_with_namespace"]) for entry in projects]
+            return active_projects
+
+        if self.args["project_slugs"]:
+            paths = [f'{self.args["namespace_paths"][0]}/{project_slug}' for project_slug in self.args["project_slugs"]]
+        else:
+            paths = self.args["project_ids"]
+
+        active_projects = []
+        for path in paths:
+            project = yield from self.printer.collection_steps(f'projects/{quote_plus(path)}')
+            if self.__is_active(project):
+                project_id = project["id"] if self.args["project_slugs"] else path
+                active_projects.append((project_id, project["path_with_namespace"]))
+        return active_projects
+
+    def __audit_events_steps(self):
+        """Steps selecting audit events of projects (e.g. changed settings or protected branches) after high-water mark.
+        Events authored by the token's user are skipped, since they are caused by previous runs themselves.
+        :return List of audit event objects, empty if audit events are not available to the token.
+        """
+        params = {"entity_type": "Project",
+                  "created_after": self.since.astimezone(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")}
+        try:
+            events = yield from self.printer.collection_steps("audit_events", params)
+        except global_utils.GitlabError as e:
+            if e.status_code in UNAVAILABLE_AUDIT_STATUSES:
+                return []
+            raise
+
+        user = yield from self.printer.collection_steps("user")
+        return [event for event in events if event.get("author_id") != user["id"]]
+
+    def __is_active(self, project):
+        return datetime.fromisoformat(project["last_activity_at"]) > self.since
+
+    def __is_selected(self, project_id, path):
+        """Checks whether project of audit event is selected by CL-arguments.
+        :project_id id of the project.
+        :path       Full path of the project, `None` if unknown.
+        :return     Boolean.
+        """
+        if self.args["project_slugs"]:
+            return path in {f'{self.args["namespace_paths"][0]}/{project_slug}'
+                            for project_slug in self.args["project_slugs"]}
+        if self.args["namespace_paths"]:
+            return path is not None and any(path.startswith(f'{namespace_path}/')
+                                            for namespace_path in self.args["namespace_paths"])
+        return str(project_id) in self.args["project_ids"]
+
+    def save(self, failed_ids):
+        """Advances high-water mark to the start of this run, unless run only planned changes.
+        :failed_ids Ids of projects failed by this run, configured again by the next run.
+        """
+        if not self.path or self.args["mode"] == "plan":
+            return
+
+        checkpoint = {"high_water_mark": self.started_at.isoformat(), "digest": self.digest,
+                      "pending": list(failed_ids)}
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, mode="w") as file:
+            json.dump(checkpoint, file)
+        os.replace(tmp_path, self.path)
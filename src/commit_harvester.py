@@ -0,0 +1,152 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+
+import global_utils
+import json
+import os
+
+
+class CommitHarvester:
+    """Harvests commits of project branches concurrently.
+    Commits shared by several branches of a project are stored once, branches refer to the same commit objects.
+
+    Attributes:
+        args: Arguments object.
+        printer: Printer object from printer_utils.
+        checkpoints (dict): Date of the latest harvested commit and ids of commits harvested with that date
+            (`{"committed_date": ..., "ids": [...]}`) by `project_id:branch_name` key, loaded from `commits_checkpoint`
+            CL-argument if it is set. Checkpoints written by previous versions hold the date only.
+    """
+
+    def __init__(self, args, printer):
+        self.args = args
+        self.printer = printer
+        self.checkpoints = {}
+
+        if self.args["commits_checkpoint"] and os.path.exists(self.args["commits_checkpoint"]):
+            with open(self.args["commits_checkpoint"]) as file:
+                self.checkpoints = json.load(file)
+
+    def harvest(self, branches_by_project, since=None, until=None, window=None):
+        """Selects commits of given branches. With `commits_checkpoint` CL-argument only commits newer than
+        the ones harvested by previous run are selected, and checkpoint is updated afterwards.
+        :branches_by_project Map of Project Ids to lists of branch names.
+        :since  Timezone-aware datetime of the oldest commit to select, all commits are selected if not set.
+        :until  Timezone-aware datetime of the newest commit to select, current datetime if not set.
+        :window Timedelta splitting [{:since}, {:until}] period into windows fetched concurrently.
+        :return Map of Project Ids to maps of branch names to lists of commit objects.
+        """
+        tasks = [(project_id, branch_name, window_since, window_until)
+                 for project_id, branch_names in branches_by_project.items()
+                 for branch_name in branch_names
+                 for window_since, window_until in self.__windows(self.__since(project_id, branch_name, since),
+                                                                  until, window)]
+
+        commits_by_sha = defaultdict(dict)
+        result = defaultdict(lambda: defaultdict(dict))
+        for project_id, branch_name, commits in global_utils.bounded_map(self.__select_commits, tasks,
+                                                                          self.args["concurrency"]):
+            project_commits = commits_by_sha[project_id]
+            branch_commits = result[project_id][branch_name]
+            # `since` is inclusive, so commits harvested by previous run at checkpoint date are selected again
+            known_ids = self.__checkpoint(project_id, branch_name)["ids"]
+            for commit in commits:
+                if commit["id"] in known_ids:
+                    continue
+                # adjacent windows share boundary commits
+                branch_commits[commit["id"]] = project_commits.setdefault(commit["id"], commit)
+
+        # windows of a branch complete in arbitrary order
+        result = {project_id: {branch_name: sorted(commits.values(), reverse=True,
+                                                   key=lambda commit: datetime.fromisoformat(commit["committed_date"]))
+                               for branch_name, commits in branches.items()}
+                  for project_id, branches in result.items()}
+
+        self.__save_checkpoints(result)
+
+        return result
+
+    def __select_commits(self, task):
+        """Selects all pages of commits of a single branch within a single window.
+        :task Tuple of Project Id, branch name, window start and window end.
+        :return Tuple of Project Id, branch name and list of commit objects.
+        """
+        project_id, branch_name, since, until = task
+        params = {"ref_name": branch_name}
+        if since:
+            params["since"] = since.isoformat()
+        if until:
+            params["until"] = until.isoformat()
+
+        commits = [{"id": entry["id"], "message": entry["message"], "created_at": entry["created_at"],
+                    "committed_date": entry.get("committed_date", entry["created_at"])}
+                   for entry in self.printer.iter_json(f'projects/{project_id}/repository/commits', params)]
+
+        return project_id, branch_name, commits
+
+    def __since(self, project_id, branch_name, since):
+        """Chooses the latest of {:since} and checkpoint of the branch.
+        :return Datetime of the oldest commit to select, `None` if all commits are selected.
+        """
+        checkpoint = self.__checkpoint(project_id, branch_name)
+        if checkpoint["committed_date"] is None:
+            return since
+
+        # commits sharing the second of the latest harvested commit may have been pushed after previous run, so that
+        # checkpoint date itself is selected again, see `harvest`
+        checkpoint_dt = datetime.fromisoformat(checkpoint["committed_date"])
+        return max(since, checkpoint_dt) if since else checkpoint_dt
+
+    def __checkpoint(self, project_id, branch_name):
+        """Selects checkpoint of the branch.
+        :return Map with `committed_date` of the latest harvested commit (`None` if branch was not harvested) and set
+                of `ids` of commits harvested with that date.
+        """
+        checkpoint = self.checkpoints.get(f'{project_id}:{branch_name}')
+        if checkpoint is None:
+            return {"committed_date": None, "ids": set()}
+        if isinstance(checkpoint, str):
+            return {"committed_date": checkpoint, "ids": set()}
+
+        return {"committed_date": checkpoint["committed_date"], "ids": set(checkpoint["ids"])}
+
+    @staticmethod
+    def __windows(since, until, window):
+        """Splits [{:since}, {:until}] period into windows of {:window} length.
+        :return List of (window start, window end) pairs, single pair if period is not split.
+        """
+        if not since or not window:
+            return [(since, until)]
+
+        until = until or datetime.now(timezone.utc)
+        windows = []
+        while since < until:
+            windows.append((since, min(since + window, until)))
+            since += window
+
+        return windows or [(since, until)]
+
+    def __save_checkpoints(self, result):
+        """Stores date of the latest harvested commit of every branch into `commits_checkpoint` file.
+        :result Map of Project Ids to maps of branch names to lists of commit objects, newest first.
+        """
+        if not self.args["commits_checkpoint"]:
+            return
+
+        for project_id, branches in result.items():
+            for branch_name, commits in branches.items():
+                if not commits:
+                    continue
+                latest_dt = datetime.fromisoformat(commits[0]["committed_date"])
+                ids = {commit["id"] for commit in commits
+                       if datetime.fromisoformat(commit["committed_date"]) == latest_dt}
+                previous = self.__checkpoint(project_id, branch_name)
+                if previous["committed_date"] and datetime.fromisoformat(previous["committed_date"]) == latest_dt:
+                    ids |= previous["ids"]
+                self.checkpoints[f'{project_id}:{branch_name}'] = {"committed_date": commits[0]["committed_date"],
+                                                                   "ids": sorted(ids)}
+
+        tmp_path = f'{self.args["commits_checkpoint"]}.tmp'
+        with open(tmp_path, mode="w") as file:
+            json.dump(self.checkpoints, file)
+        os.replace(tmp_path, self.args["commits_checkpoint"])
@@ -0,0 +1,190 @@
+from args_parser import TCP_ADDRESS_PATTERN
+from const import Optionals
+from gitlab_config import GitlabConfig
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from socketserver import ThreadingUnixStreamServer
+from urllib.parse import quote_plus
+
+import audit_table
+import global_utils
+import json
+import os
+import re
+import requests
+import stat
+import threading
+
+# modes from the least to the most permissive, request may only choose mode not more permissive than `mode` CL-argument
+MODE_PERMISSIVENESS = ("plan", "apply", "force")
+
+
+class ConfigServer:
+    """Serves requests enforcing desired configuration on projects or auditing them, if `serve` CL-argument is set.
+    Every request is a separate run configuring only projects selected by the request, while connection pool, metrics,
+    ids of projects resolved by their paths and compiled plans are kept warm between requests, so that a check of a
+    single project costs only its own GitLab API calls. Requests and responses are JSON-objects:
+    `POST /enforce` with `{"project_ids": [...], "project_paths": [...], "mode": "plan"}` (`mode` defaults to `mode`
+    CL-argument and may not be more permissive than it, see `MODE_PERMISSIVENESS`), `POST /audit` with `{"project_ids": [...], "project_paths": [...], "filters": [...]}`, see `--audit`.
+    Response holds `updated`, `planned`, `unchanged`, `failed` and `replanned` results of the run (see
+    `Printer.results`), `audited` outcome of audit and `error` stopped the run, if any.
+
+    Attributes:
+        args: Arguments object.
+        gconf: GitlabConfig object shared by all requests.
+        project_ids (dict): Ids of projects by their full paths, resolved by previous requests.
+        lock: Guards `project_ids` attribute, since requests are served by concurrent threads.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.gconf = GitlabConfig(args)
+        self.project_ids = {}
+        self.lock = threading.Lock()
+
+    def serve_forever(self):
+        """Serves requests on address from `serve` CL-argument until interrupted, then writes metrics of all requests.
+        """
+        address = self.args["serve"]
+        match = TCP_ADDRESS_PATTERN.fullmatch(address)
+        if match:
+            server = ThreadingHTTPServer((match["host"] or "127.0.0.1", int(match["port"])), ConfigRequestHandler)
+        else:
+            # socket left by previous server prevents binding, other files are rejected by `args_parser`
+            if is_socket(address):
+                os.remove(address)
+            # socket is accessible only by the owner, since requests are not authenticated
+            umask = os.umask(0o177)
+            try:
+                server = ThreadingUnixStreamServer(address, ConfigRequestHandler)
+            finally:
+                os.umask(umask)
+            os.chmod(address, 0o600)
+        server.daemon_threads = True
+        server.config_server = self
+
+        print(f'Serving enforce and audit requests on {address}', flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
+            if not match and is_socket(address):
+                os.remove(address)
+            self.gconf.write_metrics()
+
+    def handle(self, action, body):
+        """Runs single request.
+        :action Name of the request, `enforce` or `audit`.
+        :body   JSON-object of the request.
+        :return Pair of HTTP status code and JSON-object of the response.
+        """
+        if not isinstance(body, dict):
+            return 400, {"error": "Request body should be a JSON-object"}
+
+        mode = body.get("mode", self.args["mode"])
+        filters = body.get("filters", [])
+        if mode not in Optionals.MODE["choices"]:
+            return 400, {"error": f'Unknown mode `{mode}`, expected one of {Optionals.MODE["choices"]}'}
+        if MODE_PERMISSIVENESS.index(mode) > MODE_PERMISSIVENESS.index(self.args["mode"]):
+            return 403, {"error": f'Mode `{mode}` is not allowed by server started in `{self.args["mode"]}` mode'}
+        if not isinstance(filters, list):
+            return 400, {"error": "Audit `filters` should be a list"}
+        try:
+            for expression in filters:
+                audit_table.parse_filter(expression)
+        except (ValueError, re.error) as e:
+            return 400, {"error": str(e)}
+
+        try:
+            project_ids = self.select_project_ids(body)
+        except ValueError as e:
+            return 400, {"error": str(e)}
+        except (global_utils.GitlabError, requests.RequestException) as e:
+            return 404, {"error": str(e)}
+
+        args = dict(self.args, project_ids=project_ids, mode=mode, audit=filters if action == "audit" else None)
+        gconf = GitlabConfig(args, shared=self.gconf)
+        error = None
+        try:
+            if action == "audit":
+                gconf.audit_settings()
+            else:
+                gconf.update_selected_settings()
+        except Exception as e:
+            error = f'{type(e).__name__}: {e}'
+
+        return 200 if error is None else 502, dict(gconf.printer.results(), audited=gconf.printer.audited,
+                                                   error=error)
+
+    def select_project_ids(self, body):
+        """Selects ids of projects by `project_ids` and `project_paths` of the request. Path is resolved by a single
+        GitLab API call, the first time it is requested.
+        :body   JSON-object of the request.
+        :return List of project ids.
+        """
+        project_ids = body.get("project_ids", [])
+        project_paths = body.get("project_paths", [])
+        if not isinstance(project_ids, list) or not isinstance(project_paths, list) or \
+                not (project_ids or project_paths):
+            raise ValueError("Request should select projects by `project_ids` or `project_paths` lists")
+
+        selected_pids = [str(project_id) for project_id in project_ids]
+        for path in project_paths:
+            with self.lock:
+                project_id = self.project_ids.get(path)
+            if project_id is None:
+                project_id = str(self.gconf.printer.response_json(f'projects/{quote_plus(path)}')["id"])
+                with self.lock:
+                    self.project_ids[path] = project_id
+                self.gconf.project_paths[project_id] = path
+            selected_pids.append(project_id)
+
+        # project selected both by id and by path is configured once
+        return list(dict.fromkeys(selected_pids))
+
+
+def is_socket(path):
+    """Checks whether {:path} is an existing Unix socket.
+    :path   Path of the file.
+    :return Boolean denoting, whether file is a socket.
+    """
+    try:
+        return stat.S_ISSOCK(os.lstat(path).st_mode)
+    except OSError:
+        return False
+
+
+class ConfigRequestHandler(BaseHTTPRequestHandler):
+    """Routes requests of `serve` mode to ConfigServer, see its `handle` method. `GET /health` checks server is up."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.__write(200, {"status": "ok"})
+        else:
+            self.__write(404, {"error": f'Unknown request `GET {self.path}`'})
+
+    def do_POST(self):
+        action = self.path.strip("/")
+        if action not in ("enforce", "audit"):
+            return self.__write(404, {"error": f'Unknown request `POST {self.path}`'})
+
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            return self.__write(400, {"error": f'Request body is not JSON. Reason: {e}'})
+
+        self.__write(*self.server.config_server.handle(action, body))
+
+    def __write(self, status, body):
+        # e.g. tuples of changes are written as lists, other values (datetimes) as strings
+        raw = json.dumps(body, default=str).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(raw)))
+        self.end_headers()
+        self.wfile.write(raw)
@@ -31,13 +31,101 @@ class Optionals:
                          "default": '{"reset_approvals_on_push": false, "selective_code_owner_removals": false, "disable_overriding_approvers_per_merge_request": true, "merge_requests_author_approval": false, "merge_requests_disable_committers_approval": false}',
                          "help": "Project's approval settings"}
     PUSH_RULES = {"name": "--push-rule-regex",
-                  "default": "((feature|hotfix|bugfix|refactor)(\\\/)([A-Za-z]{3,5}-[0-9]{3,5})((_)(.*))*)|(dev|prod)",
+                  "default": "((feature|hotfix|bugfix|refactor)(\\/)([A-Za-z]{3,5}-[0-9]{3,5})((_)(.*))*)|(dev|prod)",
                   "help": "Regex to enforce branch name and commit message"}
     PROJECT_IDS = {"name": "--project_ids", "default": '', "help": "List of Project Ids (comma separated) e.g `1,2,3`"}
     NAMESPACE_PATHS = {"name": "--namespace_paths", "default": '',
                        "help": "List of Groups (comma separated) e.g `npd-gov,npd`"}
     PROJECT_SLUGS = {"name": "--project_slugs", "default": '',
                      "help": "List of Project slugs (comma separated) e.g. `mp-borealis,sso-auth`"}
+    DESIRED_STATE = {"name": "--desired_state", "default": "",
+                     "help": "Path to YAML or TOML file with desired configuration `defaults` and per-group and "
+                             "per-project overrides (`groups`, `projects`), applied on top of settings arguments"}
+    MODE = {"name": "--mode", "default": "apply", "choices": ["apply", "plan", "force"],
+            "help": "`apply` writes only sections differing from desired settings, `plan` only reports differences, "
+                    "`force` writes every section, reading only sections deciding how to write them (e.g. existing "
+                    "push rule)"}
+    GRAPHQL = {"name": "--graphql", "default": False,
+               "help": "Preload protected branches and project settings of projects in batches through GraphQL API, "
+                       "replacing their per-project REST calls. Project settings without GraphQL counterpart "
+                       "(`squash_option`, `merge_method` other than `ff`) are still read through REST API, so with "
+                       "default settings only protected branches are saved"}
+    GRAPHQL_BATCH_SIZE = {"name": "--graphql_batch_size", "default": 25,
+                          "help": "Number of projects preloaded by a single GraphQL query"}
+    CACHE_DIR = {"name": "--cache-dir", "default": "",
+                 "help": "Directory of persistent cache for GitLab API responses, revalidated through ETags"}
+    NO_CACHE = {"name": "--no-cache", "default": False, "help": "Disable cache even if `--cache-dir` is set"}
+    CACHE_TTL = {"name": "--cache-ttl", "default": 86400,
+                 "help": "Number of seconds after which cached response, not revalidated since, is evicted"}
+    CACHE_MAX_SIZE = {"name": "--cache-max-size", "default": 256,
+                      "help": "Maximum size of cache in megabytes, oldest responses are evicted when exceeded"}
+    RATE_LIMIT = {"name": "--rate_limit", "default": 0.0,
+                  "help": "Maximum number of GitLab API calls per second, 0 to follow only GitLab `RateLimit-*` headers"}
+    RATE_BURST = {"name": "--rate_burst", "default": 10,
+                  "help": "Maximum number of GitLab API calls sent at once after idle period"}
+    METRICS_JSON = {"name": "--metrics_json", "default": "",
+                    "help": "Path to JSON report with per-endpoint latencies (p50/p95/p99) and slowest projects"}
+    METRICS_PROM = {"name": "--metrics_prom", "default": "",
+                    "help": "Path to the same report in Prometheus text format (node_exporter textfile collector)"}
+    COMMITS_CHECKPOINT = {"name": "--commits_checkpoint", "default": "",
+                          "help": "Path to checkpoint file, so that commit harvesting selects only commits not selected "
+                                  "by previous run"}
+    JOURNAL = {"name": "--journal", "default": "",
+               "help": "Path to JSON Lines journal recording outcome of every configured section of every project"}
+    RESUME = {"name": "--resume", "default": False,
+              "help": "Skip sections completed by previous runs recorded in `--journal` with the same configuration"}
+    ON_FAILURE = {"name": "--on_failure", "default": "abort", "choices": ["abort", "continue", "threshold"],
+                  "help": "Failure policy: `abort` stops the run on first failed project, `continue` skips failed "
+                          "projects, `threshold` skips them until `--max_failures` projects failed"}
+    MAX_FAILURES = {"name": "--max_failures", "default": 10,
+                    "help": "Number of failed projects after which `threshold` failure policy stops the run"}
+    INCREMENTAL = {"name": "--incremental", "default": "",
+                   "help": "Path to checkpoint file, so that only projects with activity or audit events since previous "
+                           "run (and projects failed by it) are configured, unless desired configuration changed"}
+    TARGETS = {"name": "--targets", "default": "",
+               "help": "Path to YAML or TOML file with GitLab instances (`base_url`), their `tokens` and project "
+                       "selectors, projects of every target are sharded across its tokens and configured in parallel "
+                       "processes, missing `base_url` and `tokens` default to positional arguments"}
+    FAN_OUT_WORKERS = {"name": "--fan_out_workers", "default": 0,
+                       "help": "Maximum number of worker processes configuring shards of `--targets`, 0 for one "
+                               "process per shard"}
+    ASYNC = {"name": "--async", "default": False,
+             "help": "Update projects on a single thread through asynchronous client (requires `aiohttp` or `httpx`), "
+                     "so that `--concurrency` may reach thousands of projects"}
+    AUDIT = {"name": "--audit", "default": None,
+             "help": "Audit instead of updating: load state of all selected projects once into in-memory table, print "
+                     "projects matching filters (e.g. `project_settings.merge_method != ff`, `push_rule.* ~ ^dev`, "
+                     "operators `== != < <= > >= ~ !~`) and their differences from desired configuration"}
+    AUDIT_SNAPSHOT = {"name": "--audit_snapshot", "default": "",
+                      "help": "Path to snapshot of the table loaded by `--audit`, so that next audits with other "
+                              "filters cost no GitLab API calls"}
+    AUDIT_MAX_AGE = {"name": "--audit_max_age", "default": 3600,
+                     "help": "Number of seconds after which `--audit_snapshot` is outdated and loaded again"}
+    GROUP_FIRST = {"name": "--group_first", "default": False,
+                   "help": "Write push rule and merge request approval setting once to every group of "
+                           "`--namespace_paths`, then write approval settings only to projects which do not inherit "
+                           "them. Group push rule only applies to projects created afterwards, group approval setting "
+                           "is not written if projects of the group override it"}
+    PIPELINE_DEPTH = {"name": "--pipeline_depth", "default": 0,
+                      "help": "Read sections and compile plans of up to this number of upcoming projects in separate "
+                              "stages while current projects are written, 0 to read and write every project in turn"}
+    SERVE = {"name": "--serve", "default": "",
+             "help": "Serve requests enforcing desired configuration on projects or auditing them (`POST /enforce`, "
+                     "`POST /audit`) over HTTP on loopback `host:port` or on Unix socket at given path (accessible "
+                     "only by its owner), keeping connections, plans and resolved projects warm between requests"}
+    CONCURRENCY = {"name": "--concurrency", "default": 8,
+                   "help": "Maximum number of projects configured at the same time"}
+    POOL_SIZE = {"name": "--pool_size", "default": 16,
+                 "help": "Maximum number of keep-alive connections to GitLab"}
+    MAX_RETRIES = {"name": "--max_retries", "default": 5,
+                   "help": "Number of retries for throttled (429) or failed (5xx) GitLab API calls"}
+    BACKOFF_FACTOR = {"name": "--backoff_factor", "default": 0.5,
+                      "help": "Base delay (in seconds) of exponential backoff between retries"}
+    CONNECT_TIMEOUT = {"name": "--connect_timeout", "default": 10.0,
+                       "help": "Number of seconds to wait for connection to GitLab before retrying the call"}
+    READ_TIMEOUT = {"name": "--read_timeout", "default": 60.0,
+                    "help": "Number of seconds to wait for GitLab response before retrying the call, only idempotent "
+                            "calls are retried"}
 
 
 class Positionals:
@@ -47,5 +135,6 @@ class Positionals:
 
 
 ACT_AFTER_TIMEDELTA = 999
-PER_PAGE_COUNT = 999
+PER_PAGE_COUNT = 100
 STALE_BRANCH_DELTA = 90
+CHANGE_FEED_OVERLAP_SECONDS = 300
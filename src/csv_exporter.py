@@ -1,36 +1,190 @@
-from collections import defaultdict
-from printer_utils import Printer
 from const import Roles
+from gitlab_client import GitlabClient
+from instrumentation import Metrics
+from printer_utils import Printer
 
 import csv
+import global_utils
+import json
+
+EXPORT_BUFFER_SIZE = 1000
 
 
-class CsvExporter: 
+class CsvExporter:
     """Utilities for exporting to csv.
+    Rows are streamed from concurrently paged GitLab collections straight into output file, so that memory
+    consumption does not depend on the number of exported rows.
 
-    Attributes: 
-        printer: Printer object from printer_utils.
-        roles (dict): GitLab user roles.
+    Attributes:
+        args: Arguments object, `None` until given to `csv_group_members` by exporter created without it.
+        printer: Printer object from printer_utils, created from `args` if exporter was created without it.
     """
 
-    def __init__(self):
-        self.printer = Printer()
-        self.roles = defaultdict(str)
+    def __init__(self, args=None, printer=None):
+        self.args = args
+        self.printer = printer
+
+    def csv_group_members(self, args, selected_group_ids, out_path="Members.csv"):
+        """Exports members of specified groups into csv.
+        :args Command Line arguments, includes defaults of optional arguments. Used only by exporter created without
+              them.
+        :selected_group_ids List of Ids for selected Gitlab Groups.
+        :out_path Path to the output file in `csv` format.
+        """
+        if self.args is None:
+            self.args = args
+        self.export_group_members(selected_group_ids, out_path)
 
-    def csv_group_members(self, args, selected_group_ids, out_path="Members.csv"): 
-        """Exports members of specified groups into csv. 
-        :args Command Line arguments, includes defaults of optional arguments. 
+    def export_group_members(self, selected_group_ids, out_path="Members.csv", out_format="csv",
+                             members_path="pending_members"):
+        """Exports members of specified groups, paging through groups concurrently.
         :selected_group_ids List of Ids for selected Gitlab Groups.
-        :out_path Path to the output file in `csv` format.  
+        :out_path Path to the output file.
+        :out_format Format of the output file: `csv`, `jsonl` or `parquet`.
+        :members_path Collection of group members: `pending_members`, `members` or `members/all` (including
+                      inherited members).
+        """
+        def select_members(group_id):
+            for member in self.printer.iter_json(f'groups/{group_id}/{members_path}'):
+                yield {"username": member["username"],
+                       "role": Roles.TABLE.get(int(member["access_level"]), str(member["access_level"])),
+                       "group_id": group_id}
+
+        self.__export(select_members, selected_group_ids, out_path, out_format, ("username", "role", "group_id"))
+
+    def export_project_settings(self, selected_pids, out_path="ProjectSettings.csv", out_format="csv"):
+        """Exports current values of settings specified in `project_settings` CL-argument for every project.
+        :selected_pids List of GitLab Ids of projects.
+        :out_path Path to the output file.
+        :out_format Format of the output file: `csv`, `jsonl` or `parquet`.
+        """
+        setting_names = list(self.args["project_settings"].keys())
+
+        def select_settings(project_id):
+            project = self.printer.response_json(f'projects/{project_id}')
+            yield {"project_id": project["id"],
+                   "path_with_namespace": project["path_with_namespace"],
+                   **{name: project.get(name) for name in setting_names}}
+
+        self.__export(select_settings, selected_pids, out_path, out_format,
+                      ["project_id", "path_with_namespace"] + setting_names)
+
+    def export_protected_branches(self, selected_pids, out_path="ProtectedBranches.csv", out_format="csv"):
+        """Exports protection settings of every protected branch of every project.
+        :selected_pids List of GitLab Ids of projects.
+        :out_path Path to the output file.
+        :out_format Format of the output file: `csv`, `jsonl` or `parquet`.
+        """
+        def select_protected_branches(project_id):
+            for branch in self.printer.iter_json(f'projects/{project_id}/protected_branches'):
+                yield {"project_id": project_id,
+                       "name": branch["name"],
+                       "push_access_levels": ",".join(str(level["access_level"])
+                                                      for level in branch.get("push_access_levels") or []),
+                       "merge_access_levels": ",".join(str(level["access_level"])
+                                                       for level in branch.get("merge_access_levels") or []),
+                       "allow_force_push": branch.get("allow_force_push"),
+                       "code_owner_approval_required": branch.get("code_owner_approval_required")}
+
+        self.__export(select_protected_branches, selected_pids, out_path, out_format,
+                      ("project_id", "name", "push_access_levels", "merge_access_levels", "allow_force_push",
+                       "code_owner_approval_required"))
+
+    def __export(self, select_rows, ids, out_path, out_format, columns):
+        """Streams rows selected concurrently for every id into output file.
+        :select_rows Function returning generator of rows (maps of column names to values) for a single id.
+        :ids List of GitLab Ids of groups or projects.
+        :out_path Path to the output file.
+        :out_format Format of the output file: `csv`, `jsonl` or `parquet`.
+        :columns Names of the columns in output order.
         """
-        file = open(out_path, mode="w")
-        writer = csv.writer(file, delimiter=";")
-        for group_id in selected_group_ids: 
-            members = self.printer.response_json(args, f'groups/{group_id}/pending_members')
-            
-            print(len(members))
-            for member in members: 
-                writer.writerow([member["username"], Roles.TABLE[int(member["access_level"])]])
+        # exporter created without printer, like by previous versions, reads through its own client
+        if self.printer is None:
+            self.printer = Printer(GitlabClient(self.args, Metrics()))
+
+        rows = global_utils.concurrent_chain(select_rows, ids, self.args["concurrency"], EXPORT_BUFFER_SIZE)
+        with ROW_WRITERS[out_format](out_path, columns) as writer:
+            for row in rows:
+                writer.write(row)
+
+
+class CsvRowWriter:
+    """Writes rows into `csv` file with `;` delimiter and without header."""
+
+    def __init__(self, out_path, columns):
+        self.columns = columns
+        self.file = open(out_path, mode="w", newline="")
+        self.writer = csv.writer(self.file, delimiter=";")
+
+    def write(self, row):
+        self.writer.writerow([row[column] for column in self.columns])
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.file.close()
+
+
+class JsonLinesRowWriter:
+    """Writes rows into JSON Lines file, one JSON-object per row."""
+
+    def __init__(self, out_path, columns):
+        self.columns = columns
+        self.file = open(out_path, mode="w")
+
+    def write(self, row):
+        self.file.write(json.dumps({column: row[column] for column in self.columns}) + "\n")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.file.close()
+
+
+class ParquetRowWriter:
+    """Writes rows into Parquet file, buffering at most `EXPORT_BUFFER_SIZE` rows per row group.
+    Requires optional `pyarrow` package.
+    """
+
+    def __init__(self, out_path, columns):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            raise Exception("Parquet output requires `pyarrow` package, install it with `pip install pyarrow`")
+
+        self.pyarrow = pyarrow
+        self.columns = columns
+        self.out_path = out_path
+        self.buffer = []
+        self.writer = None
+
+    def write(self, row):
+        self.buffer.append(row)
+        if len(self.buffer) >= EXPORT_BUFFER_SIZE:
+            self.__flush()
+
+    def __flush(self):
+        if not self.buffer:
+            return
+
+        # values are stringified, so that schema of every row group is the same
+        table = self.pyarrow.table({column: [None if row[column] is None else str(row[column]) for row in self.buffer]
+                                    for column in self.columns})
+        if self.writer is None:
+            self.writer = self.pyarrow.parquet.ParquetWriter(self.out_path, table.schema)
+        self.writer.write_table(table)
+        self.buffer = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.__flush()
+        if self.writer is not None:
+            self.writer.close()
 
-        file.close()
 
+ROW_WRITERS = {"csv": CsvRowWriter, "jsonl": JsonLinesRowWriter, "parquet": ParquetRowWriter}
@@ -0,0 +1,193 @@
+from collections import namedtuple
+from types import MappingProxyType
+
+import hashlib
+import json
+import threading
+
+SECTIONS = ("approval_settings", "approval_rules", "project_settings", "protected_branches", "push_rule")
+
+ProjectPlan = namedtuple("ProjectPlan", ["digest", "sections", "payloads"])
+ProjectPlan.__doc__ = """Effective desired configuration of a project, shared by all projects with the same digest.
+    Sections must not be mutated, since the same plan object is used by concurrently configured projects.
+
+    Attributes:
+        digest (str): Hash of the effective configuration.
+        sections: Read-only map of section names to desired JSON-objects.
+        payloads: Read-only map of section names to desired JSON-objects serialized once for request bodies.
+    """
+
+
+def load(path):
+    """Loads desired-state file in YAML (`.yml`, `.yaml`) or TOML (`.toml`) format.
+    File contains `defaults` sections, and `groups` and `projects` overrides by full path (or id of project), e.g.
+    `{"defaults": {"project_settings": {...}}, "groups": {"npd/backend": {...}}, "projects": {"npd/backend/sso": {...}}}`
+    :path   Path to the desired-state file.
+    :return Map of `defaults`, `groups` and `projects` entries.
+    """
+    config = read_config_file(path, "desired-state")
+    config = {"defaults": config.get("defaults") or {},
+              "groups": {str(key): value or {} for key, value in (config.get("groups") or {}).items()},
+              "projects": {str(key): value or {} for key, value in (config.get("projects") or {}).items()}}
+
+    for overrides in [config["defaults"], *config["groups"].values(), *config["projects"].values()]:
+        unknown_sections = overrides.keys() - set(SECTIONS)
+        if unknown_sections:
+            raise Exception(f'Unknown sections {sorted(unknown_sections)} in desired-state file `{path}`, '
+                            f'expected some of {list(SECTIONS)}')
+
+    return config
+
+
+def read_config_file(path, kind):
+    """Reads configuration file in YAML (`.yml`, `.yaml`) or TOML (`.toml`) format.
+    :path   Path to the file.
+    :kind   Kind of the file used in error messages, e.g. `desired-state`.
+    :return Map read from the file.
+    """
+    if path.endswith(".toml"):
+        import tomllib
+        with open(path, mode="rb") as file:
+            return tomllib.load(file)
+    elif path.endswith((".yml", ".yaml")):
+        try:
+            import yaml
+        except ImportError:
+            raise Exception(f'YAML {kind} file requires `PyYAML` package, install it with `pip install pyyaml`')
+        with open(path) as file:
+            return yaml.safe_load(file) or {}
+    else:
+        raise Exception(f'Unsupported format of {kind} file `{path}`, expected `.yaml`, `.yml` or `.toml`')
+
+
+def merge_section(section, base, override):
+    """Applies {:override} of the section onto its {:base} value.
+    Settings are merged key by key, protected branches are merged by branch name.
+    :section  Name of the section.
+    :base     Desired JSON-object of the section.
+    :override JSON-object overriding the section.
+    :return   New JSON-object of the section.
+    """
+    if section == "protected_branches":
+        branches = {branch["name"]: branch for branch in base}
+        branches.update((branch["name"], branch) for branch in override)
+        return list(branches.values())
+
+    return {**base, **override}
+
+
+class PlanCompiler:
+    """Compiles desired configuration of every project once, from CL-arguments overridden by desired-state file.
+    Projects with the same effective configuration share a single plan.
+
+    Attributes:
+        config: Map of `defaults`, `groups` and `projects` entries loaded from desired-state file.
+        select_path: Function returning full path of the project by its id.
+        requires_path (bool): Whether overrides are specified by full paths, so that `select_path` has to be called.
+        defaults (dict): Desired sections, same for every project.
+        plans_by_digest (dict): Shared plans by their digests.
+        default_plan: ProjectPlan object of projects without overrides.
+        plans (dict): Plans by project ids.
+        lock: Guards `plans_by_digest` and `plans` attributes, since plans are compiled by concurrent workers.
+    """
+
+    def __init__(self, args, select_path):
+        self.config = args["desired_state"] or {"defaults": {}, "groups": {}, "projects": {}}
+        self.select_path = select_path
+        defaults = {"approval_settings": args["approval_settings"],
+                    "approval_rules": args["approval_rules"],
+                    "project_settings": args["project_settings"],
+                    "protected_branches": args["protected_branches"],
+                    "push_rule": {"branch_name_regex": args["push_rule_regex"]}}
+        self.defaults = {section: merge_section(section, defaults[section], self.config["defaults"][section])
+                         if section in self.config["defaults"] else defaults[section] for section in SECTIONS}
+        self.requires_path = bool(self.config["groups"]) or \
+            any(not key.isdigit() for key in self.config["projects"].keys())
+        self.plans_by_digest = {}
+        self.plans = {}
+        self.lock = threading.Lock()
+        self.default_plan = self.__share(self.defaults)
+
+    def plan(self, project_id):
+        """Selects plan of the project, compiling it on first use.
+        :project_id id of the project.
+        :return     ProjectPlan object.
+        """
+        project_id = str(project_id)
+        with self.lock:
+            plan = self.plans.get(project_id)
+        if plan is not None:
+            return plan
+
+        sections = self.__compile(project_id)
+        plan = self.default_plan if sections is self.defaults else self.__share(sections)
+        with self.lock:
+            self.plans[project_id] = plan
+
+        return plan
+
+    def group_sections(self, group_path):
+        """Applies overrides of the group and its parent groups (outermost first) onto defaults, like projects' plans.
+        :group_path Full path of the group, e.g. `npd/backend`.
+        :return     Map of section names to desired JSON-objects.
+        """
+        namespaces = group_path.split("/")
+        sections = dict(self.defaults)
+        for depth in range(1, len(namespaces) + 1):
+            for section, value in self.config["groups"].get("/".join(namespaces[:depth]), {}).items():
+                sections[section] = merge_section(section, sections[section], value)
+
+        return sections
+
+    def has_overrides_within(self, group_path, section, keys):
+        """Checks whether subgroups or projects of the group override any of {:keys} of the section. Projects
+        overridden by their ids are not known to belong to the group, so that their overrides count as well.
+        :group_path Full path of the group, e.g. `npd/backend`.
+        :section    Name of the section.
+        :keys       Keys of the section.
+        :return     Boolean denoting, whether any of the keys is overridden within the group.
+        """
+        prefix = f'{group_path}/'
+        overrides = [override for path, override in self.config["groups"].items() if path.startswith(prefix)]
+        overrides += [override for key, override in self.config["projects"].items()
+                      if key.isdigit() or key.startswith(prefix)]
+
+        return any(set(override.get(section) or {}) & set(keys) for override in overrides)
+
+    def __compile(self, project_id):
+        """Applies overrides of parent groups (outermost first) and of the project itself onto defaults.
+        :project_id id of the project.
+        :return     Map of section names to desired JSON-objects, `defaults` attribute itself if nothing is overridden.
+        """
+        overrides = []
+        if self.requires_path:
+            path = self.select_path(project_id)
+            namespaces = path.split("/")[:-1]
+            for depth in range(1, len(namespaces) + 1):
+                overrides.append(self.config["groups"].get("/".join(namespaces[:depth]), {}))
+            overrides.append(self.config["projects"].get(path, {}))
+        overrides.append(self.config["projects"].get(project_id, {}))
+        if not any(overrides):
+            return self.defaults
+
+        sections = dict(self.defaults)
+        for override in overrides:
+            for section, value in override.items():
+                sections[section] = merge_section(section, sections[section], value)
+
+        return sections
+
+    def __share(self, sections):
+        """Returns plan with the same digest if it was already compiled for another project.
+        :sections Map of section names to desired JSON-objects.
+        :return   ProjectPlan object.
+        """
+        digest = hashlib.sha256(json.dumps(sections, sort_keys=True).encode()).hexdigest()[:16]
+        with self.lock:
+            plan = self.plans_by_digest.get(digest)
+            if plan is None:
+                plan = ProjectPlan(digest, MappingProxyType(sections),
+                                   MappingProxyType({section: json.dumps(value) for section, value in sections.items()}))
+                self.plans_by_digest[digest] = plan
+
+        return plan
@@ -0,0 +1,185 @@
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from desired_state import read_config_file
+from gitlab_config import GitlabConfig
+from instrumentation import Metrics
+from printer_utils import Printer
+from urllib.parse import urlparse
+
+import global_utils
+import os
+import re
+
+SELECTORS = ("namespace_paths", "project_ids", "project_slugs")
+
+Shard = namedtuple("Shard", ["label", "base_url", "token", "selector", "index", "count"])
+Shard.__doc__ = """Part of the target's projects configured by a single worker process with a single token.
+    Projects are assigned to shards by their ids, so that every token has its own share of GitLab rate limits.
+
+    Attributes:
+        label (str): Name of the target, prefixing project ids in the merged report.
+        base_url (str): URL of GitLab API, e.g `https://github.kz/api/v4`.
+        token (str): Personal Access Token of the shard.
+        selector (dict): Values of `namespace_paths`, `project_ids` and `project_slugs` arguments of the target.
+        index (int): Index of the shard within the target.
+        count (int): Number of shards (tokens) of the target.
+    """
+
+
+def load_targets(path, base_url, token):
+    """Loads targets file in YAML or TOML format and splits every target into shards, one per token, e.g.
+    `{"targets": [{"name": "main", "base_url": "https://github.kz", "tokens": ["$TOKEN_1", "$TOKEN_2"],
+    "namespace_paths": ["npd"]}]}`. Tokens starting with `$` are read from environment variables.
+    :path     Path to the targets file.
+    :base_url URL of GitLab from CL-arguments, used by targets without `base_url`.
+    :token    Token from CL-arguments, used by targets without `tokens`.
+    :return   List of Shard objects.
+    """
+    shards = []
+    labels = set()
+    for target in read_config_file(path, "targets").get("targets") or []:
+        target_url = target.get("base_url", base_url)
+        label = str(target.get("name") or urlparse(target_url).netloc or target_url)
+        if label in labels:
+            raise Exception(f'Target `{label}` is specified twice in targets file `{path}`, names have to be unique')
+        labels.add(label)
+
+        tokens = [resolve_token(label, entry) for entry in target.get("tokens") or [target.get("token", token)]]
+        selector = {name: select_values(target.get(name)) for name in SELECTORS}
+        validate_selector(label, selector)
+
+        shards += [Shard(label, target_url + "/api/v4", entry, selector, index, len(tokens))
+                   for index, entry in enumerate(tokens)]
+
+    if not shards:
+        raise Exception(f'Targets file `{path}` contains no targets')
+
+    return shards
+
+
+def select_values(value):
+    """Normalizes selector value of the target, a list or comma-separated string like the CL-argument.
+    :value  Value from targets file, `None` if not specified.
+    :return List of strings.
+    """
+    if isinstance(value, str):
+        return list(filter(None, value.split(",")))
+    return [str(entry) for entry in value or []]
+
+
+def validate_selector(label, selector):
+    """Validates projects selector of the target like `args_parser` validates selection arguments of a single run.
+    :label    Name of the target.
+    :selector Map of `namespace_paths`, `project_ids` and `project_slugs` to lists of values.
+    """
+    if not any(selector.values()):
+        raise Exception(f'Target `{label}` should specify one of {", ".join(SELECTORS)}')
+    if selector["namespace_paths"] and selector["project_ids"]:
+        raise Exception(f'Target `{label}` cannot specify both `namespace_paths` and `project_ids`')
+    if selector["project_slugs"] and not selector["namespace_paths"]:
+        raise Exception(f'Target `{label}` should specify `project_slugs` with `namespace_paths`')
+
+
+def resolve_token(label, token):
+    if not token.startswith("$"):
+        return token
+    if token[1:] not in os.environ:
+        raise Exception(f'Environment variable `{token[1:]}` with token of target `{label}` is not set')
+    return os.environ[token[1:]]
+
+
+def shard_args(args, shard):
+    """Builds arguments of the worker process configuring {:shard}.
+    Journal and change feed checkpoint of every shard are kept in their own files, since project ids of different
+    instances overlap.
+    :args   Arguments object of the whole run.
+    :shard  Shard object.
+    :return Arguments object of the shard.
+    """
+    return dict(args, base_url=shard.base_url, headers=dict(args["headers"], **{"PRIVATE-TOKEN": shard.token}),
+                **shard.selector, shard_index=shard.index, shard_count=shard.count, targets=[],
+                journal=shard_path(args["journal"], shard), incremental=shard_path(args["incremental"], shard))
+
+
+def shard_path(path, shard):
+    """Derives path of the shard's own file from {:path}, e.g. `journal.main.0.jsonl` from `journal.jsonl`.
+    :path   Path specified by CL-argument, empty if the file is not used.
+    :shard  Shard object.
+    :return Path of the shard's file, empty if {:path} is empty.
+    """
+    if not path:
+        return path
+
+    root, extension = os.path.splitext(path)
+    label = re.sub(r"[^\w.-]", "_", shard.label)
+    return f'{root}.{label}.{shard.index}{extension}'
+
+
+def run_shard(args):
+    """Configures projects of a single shard, runs in worker process.
+    :args   Arguments object of the shard, see `shard_args`.
+    :return Map with results of the shard's printer, recorded metrics and error stopped the shard (if any).
+    """
+    gconf = GitlabConfig(args)
+    error = None
+    try:
+        gconf.update_selected_settings()
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+
+    return {"results": gconf.printer.results(), "calls": gconf.metrics.calls, "sections": gconf.metrics.sections,
+            "error": error}
+
+
+class FanOutRunner:
+    """Configures projects of several GitLab instances (targets) with several tokens in parallel worker processes.
+    Every shard is configured as a separate run with its own rate limits, then results of all shards are merged
+    into a single report. Interface follows GitlabConfig, so that `main` drives both the same way.
+
+    Attributes:
+        args: Arguments object.
+        shards (list): Shard objects loaded from `targets` CL-argument.
+        printer: Printer object gathering merged results.
+        metrics: Metrics object gathering merged calls and sections.
+    """
+
+    def __init__(self, args):
+        self.args = args
+        self.shards = args["targets"]
+        self.printer = Printer(None)
+        self.metrics = Metrics()
+
+    def update_selected_settings(self):
+        """Configures all shards in at most `fan_out_workers` processes, one process per shard by default.
+        Failed shard does not stop others, its error is raised once all shards are finished.
+        """
+        errors = []
+        max_workers = self.args["fan_out_workers"] or len(self.shards)
+        with ProcessPoolExecutor(max_workers=min(max_workers, len(self.shards))) as executor:
+            futures = {executor.submit(run_shard, shard_args(self.args, shard)): shard for shard in self.shards}
+            for future in as_completed(futures):
+                shard = futures[future]
+                try:
+                    outcome = future.result()
+                except Exception as e:
+                    outcome = {"results": None, "error": f'{type(e).__name__}: {e}'}
+
+                if outcome["results"] is not None:
+                    self.printer.merge(outcome["results"], shard.label)
+                    self.metrics.merge(outcome["calls"], outcome["sections"], shard.label)
+                if outcome["error"]:
+                    errors.append(f'Target `{shard.label}` (token {shard.index + 1} of {shard.count}) failed. '
+                                  f'Reason: \n{outcome["error"]}')
+
+        if errors:
+            raise global_utils.GitlabError("\n".join(errors))
+
+    def print_response(self):
+        self.printer.print_response()
+
+    def write_metrics(self):
+        """Writes merged summary of GitLab API calls and configuration sections of all shards."""
+        if self.args["metrics_json"]:
+            self.metrics.write_json(self.args["metrics_json"])
+        if self.args["metrics_prom"]:
+            self.metrics.write_prometheus(self.args["metrics_prom"])
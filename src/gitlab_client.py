@@ -0,0 +1,258 @@
+from email.utils import parsedate_to_datetime
+from rate_limiter import RateLimiter
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from response_cache import ResponseCache
+
+import global_utils
+import json
+import random
+import requests
+import time
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+MAX_BACKOFF_SECONDS = 60
+UNCACHED_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection", "set-cookie"}
+
+
+def is_retriable(method, response, idempotent=None):
+    """Checks whether call should be retried after {:response}.
+    Non-idempotent calls are retried only on throttling, since GitLab has not processed them.
+    :method     HTTP method name in upper case.
+    :response   Response object of the failed attempt.
+    :idempotent Whether the call is idempotent regardless of {:method}, e.g. read-only GraphQL query sent by POST.
+    :return     Boolean determining whether to retry the call.
+    """
+    if idempotent is None:
+        idempotent = method in IDEMPOTENT_METHODS
+    return response.status_code == 429 or (idempotent and response.status_code in RETRY_STATUSES)
+
+
+def retry_delay(response, attempt, backoff_factor):
+    """Determines delay before next attempt, preferring `Retry-After` header sent by GitLab.
+    :response       Response object of the failed attempt.
+    :attempt        Number of the failed attempt, starting from 0.
+    :backoff_factor Base delay (in seconds) of exponential backoff.
+    :return Delay in seconds.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            return min(float(retry_after), MAX_BACKOFF_SECONDS)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+                return min(max(delay, 0), MAX_BACKOFF_SECONDS)
+            except (TypeError, ValueError):
+                pass
+
+    return backoff(attempt, backoff_factor)
+
+
+def backoff(attempt, backoff_factor):
+    """Exponential backoff with full jitter.
+    :attempt        Number of the failed attempt, starting from 0.
+    :backoff_factor Base delay (in seconds) of exponential backoff.
+    :return Delay in seconds.
+    """
+    return random.uniform(0, min(backoff_factor * 2 ** attempt, MAX_BACKOFF_SECONDS))
+
+
+def conditional_headers(entry, headers=None):
+    """Adds `If-None-Match`/`If-Modified-Since` headers revalidating cached {:entry}.
+    :entry   Cached entry, `None` if response is not cached.
+    :headers Additional request headers.
+    :return  Map of request headers.
+    """
+    headers = dict(headers or {})
+    if entry is not None:
+        cached_headers = CaseInsensitiveDict(entry["headers"])
+        if "ETag" in cached_headers:
+            headers["If-None-Match"] = cached_headers["ETag"]
+        if "Last-Modified" in cached_headers:
+            headers["If-Modified-Since"] = cached_headers["Last-Modified"]
+    return headers
+
+
+def cacheable_headers(response):
+    """Selects headers of {:response} worth caching.
+    :response Response object from requests.
+    :return   Map of headers, `None` if response cannot be revalidated and thus is not cached.
+    """
+    if response.status_code != 200 or ("ETag" not in response.headers and "Last-Modified" not in response.headers):
+        return None
+    return {name: value for name, value in response.headers.items() if name.lower() not in UNCACHED_HEADERS}
+
+
+def build_response(url, status, headers, body):
+    """Builds response object from requests out of response parts, e.g. of cached entry or other HTTP library.
+    :url     Absolute url of the request.
+    :status  Status code of the response.
+    :headers Map of response headers.
+    :body    Body of the response in bytes.
+    :return  Response object from requests.
+    """
+    response = requests.Response()
+    response.status_code = status
+    response.headers = CaseInsensitiveDict(headers)
+    response._content = body
+    response.encoding = "utf-8"
+    response.url = url
+    return response
+
+
+class GitlabClient:
+    """Pooled HTTP client shared by all modules accessing GitLab API.
+    Keeps connections alive between calls and retries throttled or failed calls with exponential backoff.
+
+    Attributes:
+        base_url (str): URL of GitLab API, e.g `https://github.kz/api/v4`.
+        graphql_url (str): URL of GitLab GraphQL API, e.g `https://github.kz/api/graphql`.
+        max_retries (int): Number of retries for a single call before giving up.
+        backoff_factor (float): Base delay (in seconds) of exponential backoff.
+        timeout (tuple): Connect and read timeouts (in seconds), so that stalled connection does not block a worker.
+        session: Session object from requests, holding pool of keep-alive connections.
+        cache: ResponseCache object for GET-requests, `None` if caching is disabled.
+        limiter: RateLimiter object shared by all requests.
+        metrics: Metrics object from instrumentation, recording every call.
+    """
+
+    def __init__(self, args, metrics):
+        self.base_url = args["base_url"]
+        self.metrics = metrics
+        self.graphql_url = self.base_url.rsplit("/v4", 1)[0] + "/graphql"
+        self.max_retries = args["max_retries"]
+        self.backoff_factor = args["backoff_factor"]
+        self.timeout = (args["connect_timeout"], args["read_timeout"])
+
+        self.session = requests.Session()
+        self.session.headers.update(args["headers"])
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=args["pool_size"], pool_block=True)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self.limiter = RateLimiter(args["rate_limit"], args["rate_burst"], args["pool_size"])
+
+        self.cache = None
+        if args["cache_dir"] and not args["no_cache"]:
+            self.cache = ResponseCache(args["cache_dir"], args["cache_ttl"], args["cache_max_size"] * 1024 * 1024)
+            # responses visible to one token may be hidden from another one
+            self.cache_namespace = args["headers"]["PRIVATE-TOKEN"]
+
+    def url(self, path):
+        """Completes {:path} with GitLab API url, unless {:path} is already an absolute url.
+        :path Subdirectory (section) with which to complete url.
+        :return Absolute url.
+        """
+        if path.startswith(("http://", "https://")):
+            return path
+        return f'{self.base_url}/{path}'
+
+    def request(self, method, path, **kwargs):
+        """Sends http-request, retrying it on throttling (429), server-side (5xx) errors and timeouts.
+        Non-idempotent requests are retried only on throttling, since GitLab has not processed them.
+        :method HTTP method name, e.g. `GET`.
+        :path Subdirectory (section) or absolute url to send request to.
+        :return Response object from requests.
+        """
+        method = method.upper()
+        url = self.url(path)
+
+        if method == "GET" and self.cache is not None:
+            return self.__cached_get(url, **kwargs)
+
+        return self.__send(method, url, **kwargs)
+
+    def __send(self, method, url, idempotent=None, **kwargs):
+        """Sends http-request with retries, see `request` method.
+        :method HTTP method name in upper case.
+        :url Absolute url to send request to.
+        :idempotent Whether request is retried like idempotent one regardless of {:method}.
+        :return Response object from requests.
+        """
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        started_at = time.monotonic()
+        response = None
+        attempt = 0
+
+        try:
+            for attempt in range(self.max_retries + 1):
+                response = None
+                self.limiter.acquire()
+                try:
+                    response = self.session.request(method, url, timeout=self.timeout, **kwargs)
+                except (requests.ConnectionError, requests.Timeout):
+                    if not idempotent or attempt == self.max_retries:
+                        raise
+                finally:
+                    self.limiter.release(response)
+
+                if response is None:
+                    time.sleep(backoff(attempt, self.backoff_factor))
+                    continue
+
+                if not is_retriable(method, response, idempotent) or attempt == self.max_retries:
+                    return response
+
+                time.sleep(retry_delay(response, attempt, self.backoff_factor))
+        finally:
+            self.metrics.record_call(method, url, response.status_code if response is not None else 0,
+                                     time.monotonic() - started_at,
+                                     len(response.content) if response is not None else 0, attempt)
+
+    def __cached_get(self, url, params=None, headers=None, **kwargs):
+        """Sends conditional GET-request, answering it from `cache` if GitLab responds with `304 Not Modified`.
+        :url Absolute url to send request to.
+        :params Query parameters.
+        :headers Additional request headers.
+        :return Response object from requests.
+        """
+        url = requests.Request("GET", url, params=params).prepare().url
+        key = f'{self.cache_namespace}\n{url}'
+        entry = self.cache.get(key)
+
+        response = self.__send("GET", url, headers=conditional_headers(entry, headers), **kwargs)
+
+        if response.status_code == 304 and entry is not None:
+            self.cache.touch(key)
+            return build_response(url, entry["status"], entry["headers"], entry["body"].encode("utf-8"))
+
+        cached_headers = cacheable_headers(response)
+        if cached_headers is not None:
+            self.cache.put(key, response.status_code, cached_headers, response.text)
+
+        return response
+
+    def graphql(self, query, variables=None):
+        """Sends read-only query to GitLab GraphQL API, retried on failures like GET-requests.
+        :query GraphQL query.
+        :variables Map of query variables.
+        :return `data` object of the response.
+        """
+        response = self.__send("POST", self.graphql_url, idempotent=True,
+                               data=json.dumps({"query": query, "variables": variables or {}}))
+        if not response.ok:
+            raise global_utils.GitlabError(f'Undesired ({response.status_code}) response from `{self.graphql_url}`',
+                                           response.status_code)
+
+        body = response.json()
+        if body.get("errors"):
+            raise global_utils.GitlabError(f'GraphQL query failed. Reason: \n{body["errors"]}', response.status_code)
+
+        return body["data"]
+
+    def get(self, path, **kwargs):
+        return self.request("GET", path, **kwargs)
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def put(self, path, **kwargs):
+        return self.request("PUT", path, **kwargs)
+
+    def patch(self, path, **kwargs):
+        return self.request("PATCH", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
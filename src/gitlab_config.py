@@ -1,11 +1,35 @@
+from async_gitlab_client import AsyncGitlabClient
+from audit_table import AuditTable
+from change_feed import ChangeFeed
+from collections import defaultdict
+from commit_harvester import CommitHarvester
 from datetime import datetime, timedelta, timezone
+from desired_state import PlanCompiler
+from gitlab_client import GitlabClient
+from graphql_reader import GraphqlReader
+from group_settings import GroupSettings
+from instrumentation import Metrics
 from printer_utils import Printer
 from project_settings import ProjectSettings
-from urllib.parse import quote_plus
+from project_state import ProjectStateStore
+from run_journal import RunJournal
+from state_records import Branch
+from urllib.parse import quote, quote_plus
 
+import asyncio
+import audit_table
+import call_steps
 import const
+import global_utils
+import hashlib
+import json
 import re
 import requests
+import threading
+import time
+
+# arguments selecting projects, audit snapshot is reused only for the same selection
+AUDIT_SELECTION_ARGS = ("base_url", "namespace_paths", "project_ids", "project_slugs", "shard_index", "shard_count")
 
 
 class GitlabConfig:
@@ -14,47 +38,174 @@ class GitlabConfig:
     Attributes: 
         args: Arguments object.
         default_branch (str): Desired default branch (if exists) for every GitLab project. 
+        metrics: Metrics object recording GitLab API calls and configuration sections.
+        client: GitlabClient object shared by all modules accessing GitLab API.
         printer: Printer object from printer_utils.
+        state: ProjectStateStore object holding preloaded state of projects.
+        project_paths (dict): Full paths of projects by their ids, gathered while selecting projects by namespaces.
+        plans: PlanCompiler object providing desired configuration of every project.
         ps: ProjectSettings object.
+        gs: GroupSettings object.
+        harvester: CommitHarvester object.
+        journal: RunJournal object recording outcome of every configured section.
+        change_feed: ChangeFeed object selecting only projects changed since previous run.
+        failures (int): Number of projects failed to update.
+        failed_groups (set): Full paths of groups failed to update, reported among failed projects.
+        lock: Guards `failures` attribute, since projects are updated by concurrent workers.
     """
 
-    def __init__(self, args, default_branch="dev"):
+    def __init__(self, args, default_branch="dev", shared=None):
         self.args = args
         self.default_branch = default_branch
-        self.printer = Printer()
-        self.ps = ProjectSettings(self.args, self.printer)
+        # run within `serve` mode reuses connections, metrics, resolved project paths and compiled plans of the server
+        self.metrics = shared.metrics if shared else Metrics()
+        self.client = shared.client if shared else GitlabClient(self.args, self.metrics)
+        self.printer = Printer(self.client)
+        self.state = ProjectStateStore()
+        self.project_paths = shared.project_paths if shared else {}
+        self.plans = shared.plans if shared else PlanCompiler(self.args, self.__select_project_path)
+        self.ps = ProjectSettings(self.args, self.printer, self.client, self.state, self.plans)
+        self.gs = GroupSettings(self.args, self.printer, self.client, self.plans)
+        self.harvester = CommitHarvester(self.args, self.printer)
+        self.journal = RunJournal(self.args["journal"], self.args["mode"], self.args["resume"])
+        self.change_feed = ChangeFeed(self.args, self.printer)
+        self.failures = 0
+        self.failed_groups = set()
+        self.lock = threading.Lock()
 
     def select_project_ids(self):
         """Selects GitLab Ids of projects belonging to GitLab Groups specified in `namespace_paths` CL-argument.  
         :return List of GitLab Ids of projects belonging to specified GitLab Groups or Project ids.
         """
-        result = []
+        return list(self.iter_project_ids())
 
-        if len(self.args["project_slugs"]) > 0:
-            for project_slug in self.args["project_slugs"]:
-                entry = self.printer.response_json(self.args, "projects/" + quote_plus(
-                    f'{self.args["namespace_paths"][0]}/{project_slug}'))
-                result.append(entry["id"])
+    def iter_project_ids(self):
+        """Lazily selects GitLab Ids of projects, so that work on them can start while next pages are downloaded.
+        Only projects of the shard set by `shard_index` and `shard_count` arguments are selected, see `fan_out`.
+        :return Generator of GitLab Ids of projects belonging to specified GitLab Groups or Project ids.
+        """
+        return (project_id for project_id in self.__iter_selected_project_ids() if self.__is_in_shard(project_id))
+
+    def __iter_selected_project_ids(self):
+        if self.change_feed.is_incremental():
+            yield from self.__remember_paths(call_steps.run(self.change_feed.changed_projects_steps(), self.client))
+        elif len(self.args["project_slugs"]) > 0:
+            yield from global_utils.bounded_map(self.__select_project_id_by_slug, self.args["project_slugs"],
+                                                self.args["concurrency"])
         elif len(self.args["namespace_paths"]) > 0:
-            result = [entry["id"] for entry in self.printer.response_json(self.args, "projects")
-                      if entry["path_with_namespace"].split("/")[0] in self.args["namespace_paths"]]
+            selected_pids = set()
+            for project_id in global_utils.concurrent_chain(self.__iter_namespace_project_ids,
+                                                            self.args["namespace_paths"], self.args["concurrency"]):
+                # nested namespaces may be specified along with their parents
+                if project_id not in selected_pids:
+                    selected_pids.add(project_id)
+                    yield project_id
         elif len(self.args["project_ids"]) > 0:
-            result = self.args["project_ids"]
+            yield from self.args["project_ids"]
 
-        return result
+    async def iter_project_ids_async(self, client):
+        """Lazily selects GitLab Ids of projects through asynchronous client, see `iter_project_ids`.
+        :client AsyncGitlabClient object.
+        :return Asynchronous generator of GitLab Ids of projects.
+        """
+        async for project_id in self.__aiter_selected_project_ids(client):
+            if self.__is_in_shard(project_id):
+                yield project_id
+
+    async def __aiter_selected_project_ids(self, client):
+        if self.change_feed.is_incremental():
+            for project_id in self.__remember_paths(await call_steps.run_async(
+                    self.change_feed.changed_projects_steps(), client)):
+                yield project_id
+        elif len(self.args["project_slugs"]) > 0:
+            for project_slug in self.args["project_slugs"]:
+                steps = self.printer.collection_steps(self.__project_slug_path(project_slug))
+                yield (await call_steps.run_async(steps, client))["id"]
+        elif len(self.args["namespace_paths"]) > 0:
+            selected_pids = set()
+            for namespace_path in self.args["namespace_paths"]:
+                async for entry in self.printer.aiter_json(client, *self.__namespace_projects_request(namespace_path)):
+                    self.project_paths[str(entry["id"])] = entry["path_with_namespace"]
+                    # nested namespaces may be specified along with their parents
+                    if entry["id"] not in selected_pids:
+                        selected_pids.add(entry["id"])
+                        yield entry["id"]
+        else:
+            for project_id in self.args["project_ids"]:
+                yield project_id
+
+    def __remember_paths(self, projects):
+        """Remembers full paths of projects selected by change feed, so that plans do not select them again.
+        :projects List of pairs of project id and its full path (`None` if unknown).
+        :return   List of project ids.
+        """
+        for project_id, path in projects:
+            if path is not None:
+                self.project_paths[str(project_id)] = path
+        return [project_id for project_id, _ in projects]
+
+    def __is_in_shard(self, project_id):
+        """Checks whether project belongs to the shard processed by this run, so that shards never overlap.
+        :project_id id of the project.
+        :return Boolean, always `True` if run is not sharded.
+        """
+        return int(project_id) % self.args["shard_count"] == self.args["shard_index"]
+
+    def __select_project_id_by_slug(self, project_slug):
+        """Selects GitLab Id of project by its {:project_slug} within first of specified `namespace_paths`.
+        :project_slug Path of the project within namespace.
+        :return GitLab Id of the project.
+        """
+        return self.printer.response_json(self.__project_slug_path(project_slug))["id"]
+
+    def __project_slug_path(self, project_slug):
+        return "projects/" + quote_plus(f'{self.args["namespace_paths"][0]}/{project_slug}')
+
+    def __iter_namespace_project_ids(self, namespace_path):
+        """Lazily selects GitLab Ids of non-archived projects within {:namespace_path} including its subgroups.
+        :namespace_path Full path of GitLab Group.
+        :return Generator of GitLab Ids of projects.
+        """
+        for entry in self.printer.iter_json(*self.__namespace_projects_request(namespace_path)):
+            self.project_paths[str(entry["id"])] = entry["path_with_namespace"]
+            yield entry["id"]
+
+    @staticmethod
+    def __namespace_projects_request(namespace_path):
+        """Builds request listing non-archived projects within {:namespace_path} including its subgroups.
+        :namespace_path Full path of GitLab Group.
+        :return Pair of path and query parameters.
+        """
+        return f'groups/{quote_plus(namespace_path)}/projects', \
+            {"include_subgroups": "true", "simple": "true", "archived": "false"}
+
+    def __select_project_path(self, project_id):
+        """Selects full path of the project, without calling GitLab API if it was gathered while selecting projects.
+        :project_id id of the project.
+        :return     Full path of the project, e.g. `npd/backend/sso-auth`.
+        """
+        if project_id in self.project_paths:
+            return self.project_paths[project_id]
+
+        return self.printer.response_json(f'projects/{project_id}')["path_with_namespace"]
 
     def select_group_ids(self):
         """Selects GitLab Ids of groups specified in `namespace_paths` CL-argument.  
         :return List of GitLab Ids of groups by their names. 
         """
-        groups = self.printer.response_json(self.args, "groups")
+        return [group["id"] for group in self.select_groups()]
 
-        return [entry["id"] for entry in groups if entry["path"] in self.args["namespace_paths"]]
+    def select_groups(self):
+        """Selects groups specified in `namespace_paths` CL-argument by their full paths, one call per group.
+        :return List of group objects.
+        """
+        return [self.printer.response_json(f'groups/{quote_plus(namespace_path)}')
+                for namespace_path in self.args["namespace_paths"]]
 
     def select_projects_without_description(self):
         """Selects projects without description. 
         """
-        projects = self.printer.response_json(self.args, "projects")
+        projects = self.printer.iter_json("projects", keyset=True)
 
         for project in projects:
             if not project["description"]:
@@ -66,31 +217,37 @@ class GitlabConfig:
         :active If set selects only non-stale branches. Set by default.
         :return List of GitLab Branch names for given Project id.
         """
-        response = {}
-        for project_id in selected_pids:
-            branch_names_url = f'projects/{project_id}/repository/branches'
-            response_json = self.printer.response_json(self.args, branch_names_url)
+        stale_before_dt = self.__stale_before_dt()
+
+        def select_project_branch_names(project_id):
+            branches = map(Branch.from_json, self.printer.iter_json(f'projects/{project_id}/repository/branches'))
 
             if active:
-                result = [entry["name"] for entry in response_json if not self.__is_stale_branch(entry)]
+                result = [branch.name for branch in branches if not self.__is_stale_branch(branch, stale_before_dt)]
             else:
-                result = [entry["name"] for entry in response_json if self.__is_stale_branch(entry)]
+                result = [branch.name for branch in branches if self.__is_stale_branch(branch, stale_before_dt)]
 
-            response[project_id] = result
+            return project_id, result
 
-        return response
+        return dict(global_utils.bounded_map(select_project_branch_names, selected_pids, self.args["concurrency"]))
 
     @staticmethod
-    def __is_stale_branch(branch_entry, previous_days=const.STALE_BRANCH_DELTA, exclude_branches="dev,main"):
-        """Checks if branch that has not had any commits in the previous {:previous_days} days.
-        :branch_entry Object containing array of commit objects.
+    def __stale_before_dt(previous_days=const.STALE_BRANCH_DELTA):
+        """Computes datetime before which last commit makes branch stale.
         :previous_days Number of days that branch should not have any new commits. 90 days by default.
+        :return Datetime {:previous_days} ago.
+        """
+        return datetime.now(timezone(timedelta(hours=6))) - timedelta(days=previous_days)
+
+    @staticmethod
+    def __is_stale_branch(branch, stale_before_dt, exclude_branches=("dev", "main")):
+        """Checks if branch that has not had any commits since {:stale_before_dt}.
+        :branch Branch object from state_records.
+        :stale_before_dt Datetime before which last commit makes branch stale.
         :exclude_branches Branch names to exclude from checking. Dev and main branches not checked by default.
-        :return Boolean determining whether branch's last commit not older than specified number of days.
+        :return Boolean determining whether branch's last commit is older than {:stale_before_dt}.
         """
-        last_commit_dt = datetime.fromisoformat(branch_entry["commit"]["created_at"])
-        previous_days_ago_dt = datetime.now(timezone(timedelta(hours=6))) - timedelta(days=previous_days)
-        return previous_days_ago_dt > last_commit_dt and branch_entry["name"] not in exclude_branches.split(",")
+        return stale_before_dt > branch.committed_at and branch.name not in exclude_branches
 
     def duplicate_branches_with_new_names(self, selected_pids, branch_names, regex, replacement_str):
         """Creates new branches from {:selected_pids} and {:branch_names} using {:regex} and {:replacement_str}.
@@ -101,69 +258,378 @@ class GitlabConfig:
         """
         for project_id in selected_pids:
             for branch_name in branch_names:
-                create_branch_url = f'{self.args["base_url"]}/projects/{project_id}/repository/branches'
+                create_branch_url = f'projects/{project_id}/repository/branches'
                 match = re.compile(regex).search(branch_name)
                 if match:
                     new_branch_name = re.sub(regex, replacement_str, branch_name)
                     create_branch_url += f'?branch={new_branch_name}&ref={branch_name}'
-                    response = requests.post(create_branch_url, headers=self.args["headers"])
+                    response = self.client.post(create_branch_url)
                     self.printer.dump_response(response, project_id, "Duplicated branches", desired_states={201})
 
-    def select_commits_by_branch(self, selected_pids, branch_name):
+    def select_commits_by_branch(self, selected_pids, branch_name, since=None, until=None):
         """Selects all commits within given {:selected_pids} and {:branch_name}
         :selected_pids List of Project Ids to operate on.
         :branch_name Name of a branch with commits.
-        :return Array of commit objects, containing id, message, creation datetime 
+        :since Timezone-aware datetime of the oldest commit to select, all commits are selected if not set.
+        :until Timezone-aware datetime of the newest commit to select, current datetime if not set.
+        :return Map of Project Ids to arrays of commit objects, containing id, message, creation datetime 
         """
-        for project_id in selected_pids:
-            select_commits_url = f'{self.args["base_url"]}/projects/{project_id}/repository/commits?ref_name={branch_name}'
-            response = requests.get(select_commits_url, headers=self.args["headers"])
-            return [{"id": entry["id"], "message": entry["message"], "created_at": entry["created_at"]} for entry in
-                    response.json()]
+        commits = self.harvester.harvest({project_id: [branch_name] for project_id in selected_pids}, since, until)
+
+        return {project_id: branches[branch_name] for project_id, branches in commits.items()}
 
-    def select_branch_names_with_commits(self, selected_pids, active=False):
+    def select_branch_names_with_commits(self, selected_pids, active=False, since=None, until=None, window=None):
         """Selects Branch names for given {:selected_pids} including their commit objects.
         :selected_pids List of Project Ids to operate on.
         :active If set selects only non-stale branches. Unset by default.
-        :return List of GitLab Branch names for given Project id and all commit objects within them.
+        :since Timezone-aware datetime of the oldest commit to select, all commits are selected if not set.
+        :until Timezone-aware datetime of the newest commit to select, current datetime if not set.
+        :window Timedelta splitting [{:since}, {:until}] period into windows fetched concurrently.
+        :return Map of Project Ids to maps of their Branch names to all commit objects within them.
         """
         branch_names = self.select_branch_names(selected_pids, active)
-        branches_n_their_commits = {}
-        for branch_name in branch_names:
-            branches_n_their_commits[branch_name] = self.select_commits_by_branch(selected_pids, branch_name)
 
-        return branches_n_their_commits
+        return self.harvester.harvest(branch_names, since, until, window)
+
+    def update_selected_settings(self):
+        """Updates all configuration sections for projects selected by CL-arguments, asynchronously if `async`
+        CL-argument is set. Group-level sections are updated first if `group_first` CL-argument is set."""
+        if self.args["group_first"]:
+            self.update_group_settings()
+
+        if self.args["async_mode"]:
+            asyncio.run(self.update_settings_async())
+        else:
+            self.update_settings(self.iter_project_ids())
+
+    def update_group_settings(self):
+        """Updates group-level sections of groups specified in `namespace_paths` CL-argument, see GroupSettings.
+        Failed group only costs writes to its projects, so that it is reported without stopping the run. Sharded run
+        (see `fan_out`) updates groups in its first shard only.
+        """
+        if self.args["shard_index"] != 0:
+            return
+
+        for group in self.select_groups():
+            try:
+                self.gs.update_group(group["id"], group["full_path"])
+            except (global_utils.GitlabError, requests.RequestException) as e:
+                self.failed_groups.add(group["full_path"])
+                self.printer.dump_failure(group["full_path"], "Group settings", str(e))
 
     def update_settings(self, selected_pids):
-        self.ps.update_approval_settings(selected_pids)
-        self.ps.update_approval_rules(selected_pids)
-        self.ps.update_project_settings(selected_pids)
-        self.ps.update_protected_branches(selected_pids)
-        self.ps.update_push_rules(selected_pids)
+        """Updates all configuration sections for {:selected_pids} using pool of `concurrency` workers.
+        Sections of a single project are updated in fixed order, projects themselves are updated concurrently.
+        :selected_pids List (or generator) of Project Ids to operate on.
+        """
+        try:
+            selected_pids = self.prefetch_state(selected_pids)
+            if self.args["pipeline_depth"]:
+                selected_pids = self.__pipeline(selected_pids)
+            # consume results, so that exception raised within worker is propagated to the caller
+            for _ in global_utils.bounded_map(self.update_project, selected_pids, self.args["concurrency"]):
+                pass
+            self.change_feed.save(self.printer.failed.keys() - self.failed_groups)
+        finally:
+            self.journal.close()
+
+    def __pipeline(self, selected_pids):
+        """Runs read and plan stages ahead of updates, if `pipeline_depth` CL-argument is set.
+        Every stage works on its own `concurrency` workers and passes projects to the next one through a buffer of
+        `pipeline_depth` projects, so that reads of upcoming projects overlap with writes of current ones, while full
+        buffer pauses the stage and keeps memory bounded.
+        :selected_pids List (or generator) of Project Ids to operate on.
+        :return Generator of Project Ids, each yielded once its sections are read and its plan is compiled.
+        """
+        depth = self.args["pipeline_depth"]
+        read = global_utils.bounded_map(self.__read_project, selected_pids, self.args["concurrency"])
+        planned = global_utils.bounded_map(self.__plan_project, global_utils.buffered(read, depth),
+                                           self.args["concurrency"])
+        return global_utils.buffered(planned, depth)
+
+    def __read_project(self, project_id):
+        """Read stage of the pipeline, see `ProjectSettings.prefetch_steps`.
+        :project_id id of the project to read.
+        :return     id of the project, failed reads are repeated and reported by its update.
+        """
+        try:
+            call_steps.run(self.ps.prefetch_steps(project_id), self.client)
+        except (global_utils.GitlabError, requests.RequestException):
+            pass
+        return project_id
+
+    def __plan_project(self, project_id):
+        """Plan stage of the pipeline, compiling plan of the project before its update.
+        :project_id id of the project to plan.
+        :return     id of the project, failed plan is compiled again and reported by its update.
+        """
+        try:
+            self.plans.plan(project_id)
+        except (global_utils.GitlabError, requests.RequestException):
+            # update fails the project before reading its state, so that the state is released here
+            self.state.discard(project_id)
+        return project_id
+
+    async def update_settings_async(self):
+        """Updates all configuration sections for selected projects on a single thread, if `async` CL-argument is set.
+        Up to `concurrency` projects are updated at the same time, each of them costs a task instead of a thread.
+        """
+        try:
+            async with AsyncGitlabClient(self.args, self.metrics) as client:
+                async for _ in global_utils.bounded_map_async(lambda project_id: self.update_project_async(
+                        client, project_id), self.iter_project_ids_async(client), self.args["concurrency"]):
+                    pass
+            self.change_feed.save(self.printer.failed.keys() - self.failed_groups)
+        finally:
+            await asyncio.to_thread(self.journal.close)
+
+    def update_project(self, project_id):
+        """Updates all configuration sections for a single project in fixed order, see `project_steps`.
+        :project_id id of the project to update.
+        """
+        call_steps.run(self.project_steps(project_id), self.client)
+
+    async def update_project_async(self, client, project_id):
+        """Updates all configuration sections for a single project through asynchronous client, see `project_steps`.
+        :client     AsyncGitlabClient object.
+        :project_id id of the project to update.
+        """
+        await call_steps.run_async(self.project_steps(project_id), client)
+
+    def project_steps(self, project_id):
+        """Steps updating all configuration sections for a single project in fixed order, see `call_steps`.
+        Sections completed by previous run are skipped if `resume` CL-argument is set. Failed section skips
+        the rest of the project, then `on_failure` CL-argument decides whether to stop the run.
+        :project_id id of the project to update.
+        """
+        sections = (("Approval settings", self.ps.approval_settings_steps),
+                    ("Approval rules", self.ps.approval_rules_steps),
+                    ("Project settings", self.ps.project_settings_steps),
+                    ("Protected branches", self.ps.protected_branches_steps),
+                    ("Push rules", self.ps.push_rules_steps))
+
+        try:
+            yield from self.project_path_steps(project_id)
+            digest = self.plans.plan(project_id).digest
+        except (global_utils.GitlabError, requests.RequestException) as e:
+            self.state.discard(project_id)
+            self.__fail_project(project_id, "Plan", None, e)
+            return
+
+        if self.journal.is_plan_changed(project_id, digest):
+            self.printer.dump_replanned(project_id)
+
+        for section_name, section_steps in sections:
+            if self.journal.is_completed(project_id, section_name, digest):
+                continue
+
+            try:
+                with self.metrics.section(project_id, section_name):
+                    yield from section_steps(project_id)
+            except (global_utils.GitlabError, requests.RequestException) as e:
+                self.__fail_project(project_id, section_name, digest, e)
+                break
+
+            self.journal.record(project_id, section_name, "done", digest)
+
+        self.state.discard(project_id)
+
+    def project_path_steps(self, project_id):
+        """Steps selecting full path of the project ahead of compiling its plan, if plans depend on paths. Path is
+        selected through the client driving the steps, so that plan compilation does not call GitLab API by itself,
+        which would block the event loop in `async` mode.
+        :project_id id of the project.
+        """
+        if self.plans.requires_path and str(project_id) not in self.project_paths:
+            project = yield from self.printer.collection_steps(f'projects/{project_id}')
+            self.project_paths[str(project_id)] = project["path_with_namespace"]
+
+    def __fail_project(self, project_id, section_name, digest, error):
+        """Records failed section and applies failure policy from `on_failure` CL-argument.
+        :project_id   id of the project failed to update.
+        :section_name Name of the failed section.
+        :digest       Digest of the project's plan.
+        :error        Exception raised by the section.
+        """
+        self.journal.record(project_id, section_name, "failed", digest, str(error))
+        self.printer.dump_failure(project_id, section_name, str(error))
+
+        with self.lock:
+            self.failures += 1
+            failures = self.failures
+
+        if self.args["on_failure"] == "abort" or \
+                (self.args["on_failure"] == "threshold" and failures >= self.args["max_failures"]):
+            raise error
+
+    def prefetch_state(self, selected_pids):
+        """Preloads state of {:selected_pids} through GraphQL API in batches, if `graphql` CL-argument is set.
+        :selected_pids List (or generator) of Project Ids to operate on.
+        :return Generator of Project Ids, each yielded after its batch is preloaded.
+        """
+        if not self.args["graphql"]:
+            yield from selected_pids
+            return
+
+        reader = GraphqlReader(self.client, self.state, self.args["graphql_batch_size"])
+        for batch in global_utils.chunked(selected_pids, self.args["graphql_batch_size"]):
+            try:
+                reader.load(batch)
+            except (global_utils.GitlabError, requests.RequestException):
+                # projects of failed batch are read through REST API by their updates, which apply failure policy
+                pass
+            yield from batch
+
+    def audit_settings(self):
+        """Gathers projects matching filters from `audit` CL-argument and their differences from desired configuration.
+        Current state of all selected projects is loaded at once (see `load_audit_table`), then filters and comparison
+        run in memory. Projects sharing a plan are compared with its desired configuration together.
+        """
+        table = self.load_audit_table()
+        started_at = time.perf_counter()
+        rows = table.select(self.args["audit"])
+        for project_id, path in zip(table.project_ids, table.paths):
+            self.project_paths.setdefault(str(project_id), path)
+
+        plans = {}
+        rows_by_digest = defaultdict(list)
+        for row in rows:
+            plan = self.plans.plan(table.project_ids[row])
+            plans[plan.digest] = plan
+            rows_by_digest[plan.digest].append(row)
+
+        for digest, plan_rows in rows_by_digest.items():
+            desired = audit_table.flatten_sections(plans[digest].sections)
+            for row, sections in table.differences(plan_rows, desired).items():
+                for config_name, changes in sections.items():
+                    self.printer.dump_plan(table.project_ids[row], config_name, changes)
+
+        self.printer.dump_audit([table.paths[row] for row in rows], len(table), time.perf_counter() - started_at)
+
+    def load_audit_table(self):
+        """Loads current state of all selected projects into AuditTable, unless `audit_snapshot` CL-argument points
+        to a recent snapshot of the same selection. Projects are loaded concurrently, asynchronously if `async`
+        CL-argument is set.
+        :return AuditTable object.
+        """
+        key = hashlib.sha256(json.dumps({name: self.args[name] for name in AUDIT_SELECTION_ARGS},
+                                        sort_keys=True).encode()).hexdigest()
+        if self.args["audit_snapshot"]:
+            table = AuditTable.load(self.args["audit_snapshot"], key, self.args["audit_max_age"])
+            if table is not None:
+                return table
+
+        if self.args["async_mode"]:
+            projects = asyncio.run(self.__select_current_states_async())
+        else:
+            projects = list(global_utils.bounded_map(
+                lambda project_id: call_steps.run(self.__current_state_steps(project_id), self.client),
+                self.prefetch_state(self.iter_project_ids()), self.args["concurrency"]))
+
+        table = AuditTable.from_rows([project for project in projects if project is not None])
+        if self.args["audit_snapshot"]:
+            table.save(self.args["audit_snapshot"], key)
+        return table
+
+    async def __select_current_states_async(self):
+        async with AsyncGitlabClient(self.args, self.metrics) as client:
+            return [project async for project in global_utils.bounded_map_async(
+                lambda project_id: call_steps.run_async(self.__current_state_steps(project_id), client),
+                self.iter_project_ids_async(client), self.args["concurrency"])]
+
+    def __current_state_steps(self, project_id):
+        """Steps selecting current state of a single project for audit, failed project is reported and skipped.
+        :project_id id of the project.
+        :return     Triple of project id, its full path and its flattened sections (see `audit_table.flatten_sections`),
+                    `None` if project failed.
+        """
+        try:
+            yield from self.project_path_steps(project_id)
+            path, sections = yield from self.ps.current_state_steps(project_id)
+        except (global_utils.GitlabError, requests.RequestException) as e:
+            self.printer.dump_failure(project_id, "Audit", str(e))
+            return None
+
+        return project_id, path, audit_table.flatten_sections(sections)
 
     def delete_branches_by_regex(self, selected_pids, branch_names, regex):
         """Delete all branches with {:branch_names} within {:selected_pids} using {:regex}.
+        Only branches actually existing in a project are deleted from it.
         :selected_pids List of Project Ids to operate on.
         :branch_names Names of the branches within {:selected_pids}. 
         :regex Regular expression which matches branch name to determine whether to delete given branch.
         """
-        for project_id in selected_pids:
-            for branch_name in branch_names:
-                match = re.compile(regex).search(branch_name)
-                if match:
-                    delete_branch_url = f'{self.args["base_url"]}/projects/{project_id}/repository/branches/{quote_plus(branch_name)}'
-                    response = requests.delete(delete_branch_url, headers=self.args["headers"])
-                    print(response)
+        pattern = re.compile(regex)
+        matching_names = {branch_name for branch_name in branch_names if pattern.search(branch_name)}
+
+        self.cleanup_branches(selected_pids, lambda branch: branch.name in matching_names)
+
+    def delete_stale_branches(self, selected_pids, regex=None):
+        """Delete branches without commits in the last `STALE_BRANCH_DELTA` days within {:selected_pids}.
+        :selected_pids List of Project Ids to operate on.
+        :regex Regular expression which additionally has to match branch name, if specified.
+        """
+        stale_before_dt = self.__stale_before_dt()
+        pattern = re.compile(regex) if regex else None
+
+        self.cleanup_branches(selected_pids, lambda branch: self.__is_stale_branch(branch, stale_before_dt)
+                              and (pattern is None or pattern.search(branch.name)))
+
+    def cleanup_branches(self, selected_pids, branch_filter):
+        """Deletes branches satisfying {:branch_filter} within {:selected_pids}, except protected and default ones.
+        Projects are scanned concurrently and deletions start as soon as first candidates are found,
+        both scanning and deleting are bounded by `concurrency` CL-argument. Scanning is paused while candidates wait
+        for deletion, so that candidates of large projects are not all held in memory.
+        :selected_pids List of Project Ids to operate on.
+        :branch_filter Function accepting Branch object (see `state_records`) and returning whether to delete it.
+        """
+        def select_candidates(project_id):
+            for branch in map(Branch.from_json, self.printer.iter_json(f'projects/{project_id}/repository/branches')):
+                if not branch.protected and not branch.default and branch_filter(branch):
+                    yield project_id, branch.name
+
+        candidates = global_utils.concurrent_chain(select_candidates, selected_pids, self.args["concurrency"],
+                                                   2 * self.args["concurrency"])
+        for _ in global_utils.bounded_map(self.__delete_branch, candidates, self.args["concurrency"]):
+            pass
+
+    def __delete_branch(self, candidate):
+        """Deletes single branch.
+        :candidate Pair of Project Id and name of the branch to delete.
+        """
+        project_id, branch_name = candidate
+        response = self.client.delete(f'projects/{project_id}/repository/branches/{quote(branch_name, safe="")}')
+        # branch deleted meanwhile is not an error
+        self.printer.dump_response(response, project_id, "Deleted branches", {204, 404}, text=branch_name)
+
+    def delete_merged_branches(self, selected_pids):
+        """Deletes all branches merged into default branch within {:selected_pids} with a single call per project.
+        GitLab deletes them asynchronously, except protected ones.
+        :selected_pids List of Project Ids to operate on.
+        """
+        def delete_project_merged_branches(project_id):
+            response = self.client.delete(f'projects/{project_id}/repository/merged_branches')
+            self.printer.dump_response(response, project_id, "Deleted merged branches", {202})
+
+        for _ in global_utils.bounded_map(delete_project_merged_branches, selected_pids, self.args["concurrency"]):
+            pass
 
     def print_response(self):
         self.printer.print_response()
 
+    def write_metrics(self):
+        """Writes summary of GitLab API calls and configuration sections to files specified by CL-arguments."""
+        if self.args["metrics_json"]:
+            self.metrics.write_json(self.args["metrics_json"])
+        if self.args["metrics_prom"]:
+            self.metrics.write_prometheus(self.args["metrics_prom"])
+
     def select_project_by_id(self, project_id):
         """Selects project's details by its {:project_id}.
         :project_id id of the project to select.
         :return Project's details.
         """
-        select_project_url = f'{self.args["base_url"]}/projects/{project_id}'
-        response = requests.get(select_project_url, headers=self.args["headers"])
+        select_project_url = f'projects/{project_id}'
+        response = self.client.get(select_project_url)
 
         return response.json()
@@ -1,5 +1,25 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import asyncio
+import queue
+import threading
+
+
+class GitlabError(Exception):
+    """Erroneous response from GitLab API, fails only the project being configured unless failure policy aborts.
+
+    Attributes:
+        status_code (int): Status code of the erroneous response, `None` if error is not caused by a response.
+    """
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
 def fail(project_id, response):
-    raise Exception(f'Project {project_id} failed to update. Reason: \n{response.status_code} - {response.text}')
+    raise GitlabError(f'Project {project_id} failed to update. Reason: \n{response.status_code} - {response.text}',
+                      response.status_code)
 
 
 def get_json_value(data, key):
@@ -18,3 +38,172 @@ def get_json_value(data, key):
     elif isinstance(data, list):
         for item in data:
             yield from get_json_value(item, key)
+
+
+def chunked(items, size):
+    """Lazily splits {:items} into lists of {:size} entries.
+    :items  Iterable (possibly generator) of entries.
+    :size   Maximum number of entries in a chunk.
+    :return Generator of lists of entries.
+    """
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+
+    if chunk:
+        yield chunk
+
+
+def bounded_map(fn, items, max_workers):
+    """Applies {:fn} to every entry of {:items} concurrently, consuming {:items} lazily.
+    At most twice {:max_workers} entries are in flight, so memory stays flat for arbitrarily long iterables.
+    :fn          Function to apply to every entry.
+    :items       Iterable (possibly generator) of entries.
+    :max_workers Number of worker threads.
+    :return      Generator of {:fn} results in completion order.
+    """
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    pending = set()
+    try:
+        for item in items:
+            pending.add(executor.submit(fn, item))
+            if len(pending) >= 2 * max_workers:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def bounded_map_async(fn, items, max_tasks):
+    """Awaits {:fn} for every entry of {:items} concurrently on the running event loop, see `bounded_map`.
+    At most {:max_tasks} entries are in flight, every one of them costs a task instead of a thread.
+    :fn        Coroutine function to await for every entry.
+    :items     Asynchronous iterable (possibly generator) of entries.
+    :max_tasks Maximum number of concurrent tasks.
+    :return    Asynchronous generator of {:fn} results in completion order.
+    """
+    pending = set()
+    try:
+        async for item in items:
+            pending.add(asyncio.ensure_future(fn(item)))
+            if len(pending) >= max_tasks:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    yield task.result()
+
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+def concurrent_chain(fn, items, max_workers, buffer_size=0):
+    """Chains generators returned by {:fn} for every entry of {:items}, draining them concurrently.
+    :fn          Function returning generator (or list) for every entry.
+    :items       Iterable of entries.
+    :max_workers Number of worker threads.
+    :buffer_size Maximum number of produced values waiting for consumer, unbounded if 0.
+                 Generators are paused while buffer is full.
+    :return      Generator of values produced by any of the generators, as soon as they are produced.
+    """
+    items = list(items)
+    produced = queue.Queue(maxsize=buffer_size)
+    stopped = threading.Event()
+
+    def put(entry):
+        # consumer may stop early, then nobody frees buffer
+        while not stopped.is_set():
+            try:
+                produced.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def drain(item):
+        try:
+            for value in fn(item):
+                if not put((True, value)):
+                    return
+            put((False, None))
+        except Exception as e:
+            put((False, e))
+
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        for item in items:
+            executor.submit(drain, item)
+
+        finished = 0
+        while finished < len(items):
+            is_value, value = produced.get()
+            if is_value:
+                yield value
+            elif value is not None:
+                raise value
+            else:
+                finished += 1
+    finally:
+        stopped.set()
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+def buffered(items, buffer_size):
+    """Iterates {:items} on a background thread up to {:buffer_size} entries ahead of the consumer, so that a stage of
+    pipeline keeps working while the next stage processes its previous entries. Full buffer pauses the stage.
+    :items       Iterable (possibly generator) of entries, closed on the background thread when consumer stops.
+    :buffer_size Maximum number of entries waiting for consumer.
+    :return      Generator of entries in the same order, exception raised by {:items} is re-raised.
+    """
+    produced = queue.Queue(maxsize=buffer_size)
+    stopped = threading.Event()
+
+    def put(entry):
+        # consumer may stop early, then nobody frees buffer
+        while not stopped.is_set():
+            try:
+                produced.put(entry, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def produce():
+        try:
+            for item in items:
+                if not put((True, item)):
+                    return
+            put((False, None))
+        except Exception as e:
+            put((False, e))
+        finally:
+            if hasattr(items, "close"):
+                items.close()
+
+    producer = threading.Thread(target=produce, daemon=True)
+    producer.start()
+    try:
+        while True:
+            is_value, value = produced.get()
+            if is_value:
+                yield value
+            elif value is not None:
+                raise value
+            else:
+                return
+    finally:
+        stopped.set()
+        producer.join()
@@ -0,0 +1,124 @@
+PROJECTS_QUERY = """
+query($ids: [ID!], $after: String, $first: Int) {
+  projects(ids: $ids, after: $after, first: $first) {
+    pageInfo { hasNextPage endCursor }
+    nodes {
+      id
+      path
+      fullPath
+      description
+      allowMergeOnSkippedPipeline
+      onlyAllowMergeIfPipelineSucceeds
+      onlyAllowMergeIfAllDiscussionsAreResolved
+      removeSourceBranchAfterMerge
+      mergeRequestsFfOnlyEnabled
+      branchRules(first: 100) {
+        pageInfo { hasNextPage }
+        nodes {
+          name
+          branchProtection {
+            allowForcePush
+            codeOwnerApprovalRequired
+            pushAccessLevels { nodes { accessLevel accessLevelDescription user { id } group { id } } }
+            mergeAccessLevels { nodes { accessLevel accessLevelDescription user { id } group { id } } }
+          }
+        }
+      }
+    }
+  }
+}
+"""
+
+PROJECT_FIELDS = {"path": "path",
+                  "fullPath": "path_with_namespace",
+                  "description": "description",
+                  "allowMergeOnSkippedPipeline": "allow_merge_on_skipped_pipeline",
+                  "onlyAllowMergeIfPipelineSucceeds": "only_allow_merge_if_pipeline_succeeds",
+                  "onlyAllowMergeIfAllDiscussionsAreResolved": "only_allow_merge_if_all_discussions_are_resolved",
+                  "removeSourceBranchAfterMerge": "remove_source_branch_after_merge"}
+
+
+class GraphqlReader:
+    """Reads state of many projects at once through GitLab GraphQL API and fills ProjectStateStore with it.
+    Only fields having exact REST counterparts are filled, update passes read the rest through REST API. GraphQL has
+    no `squash_option` and reveals `merge_method` only for fast-forward merges, so project section preloaded for
+    desired settings including them is read again through REST API, see `ProjectSettings`.
+
+    Attributes:
+        client: GitlabClient object from gitlab_client.
+        state: ProjectStateStore object from project_state.
+        batch_size (int): Number of projects requested by a single query.
+    """
+
+    def __init__(self, client, state, batch_size):
+        self.client = client
+        self.state = state
+        self.batch_size = batch_size
+
+    def load(self, project_ids):
+        """Loads `project` and `protected_branches` sections of {:project_ids} into state.
+        :project_ids List of GitLab Ids of projects, at most `batch_size` entries.
+        """
+        variables = {"ids": [f'gid://gitlab/Project/{project_id}' for project_id in project_ids],
+                     "first": self.batch_size,
+                     "after": None}
+
+        while True:
+            projects = self.client.graphql(PROJECTS_QUERY, variables)["projects"]
+            for node in projects["nodes"]:
+                self.__store_project(node)
+
+            if not projects["pageInfo"]["hasNextPage"]:
+                break
+            variables["after"] = projects["pageInfo"]["endCursor"]
+
+    def __store_project(self, node):
+        """Converts GraphQL project node into REST-shaped sections and stores them.
+        :node JSON-object of the project node.
+        """
+        project_id = int(node["id"].split("/")[-1])
+
+        project = {"id": project_id}
+        for graphql_field, rest_field in PROJECT_FIELDS.items():
+            if node.get(graphql_field) is not None:
+                project[rest_field] = node[graphql_field]
+        # `merge_method` is known only for fast-forward merges, since GraphQL does not distinguish the others
+        if node.get("mergeRequestsFfOnlyEnabled"):
+            project["merge_method"] = "ff"
+        self.state.put(project_id, "project", project)
+
+        branch_rules = node.get("branchRules") or {}
+        # rules exceeding single page are left for REST API
+        if branch_rules and not branch_rules["pageInfo"]["hasNextPage"]:
+            protected_branches = [self.__protected_branch(rule) for rule in branch_rules["nodes"]
+                                  if rule.get("branchProtection")]
+            self.state.put(project_id, "protected_branches", protected_branches)
+
+    def __protected_branch(self, rule):
+        """Converts GraphQL branch rule into REST protected branch object. Access levels have no REST ids.
+        :rule JSON-object of the branch rule node.
+        :return Protected branch object.
+        """
+        protection = rule["branchProtection"]
+        return {"name": rule["name"],
+                "allow_force_push": protection.get("allowForcePush"),
+                "code_owner_approval_required": protection.get("codeOwnerApprovalRequired"),
+                "push_access_levels": self.__access_levels(protection.get("pushAccessLevels")),
+                "merge_access_levels": self.__access_levels(protection.get("mergeAccessLevels"))}
+
+    @staticmethod
+    def __access_levels(levels):
+        """Converts GraphQL access level connection into list of REST access level objects.
+        :levels JSON-object of access levels connection.
+        :return List of access level objects.
+        """
+        result = []
+        for node in (levels or {}).get("nodes", []):
+            level = {"access_level": node["accessLevel"], "access_level_description": node["accessLevelDescription"]}
+            if node.get("user"):
+                level["user_id"] = int(node["user"]["id"].split("/")[-1])
+            if node.get("group"):
+                level["group_id"] = int(node["group"]["id"].split("/")[-1])
+            result.append(level)
+
+        return result
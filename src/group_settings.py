@@ -0,0 +1,138 @@
+import call_steps
+import global_utils
+import json
+import state_diff
+
+# project approval settings enforced by group merge request approval setting, with `True` if meaning is inverted
+GROUP_APPROVAL_SETTINGS = {"merge_requests_author_approval": ("allow_author_approval", False),
+                           "merge_requests_disable_committers_approval": ("allow_committer_approval", True),
+                           "disable_overriding_approvers_per_merge_request":
+                               ("allow_overrides_to_approver_list_during_merge_request", True),
+                           "reset_approvals_on_push": ("retain_approvals_on_push", True),
+                           "require_password_to_approve": ("require_password_to_approve", False)}
+
+
+def group_approval_setting(approval_settings):
+    """Translates desired project approval settings into group merge request approval setting.
+    Settings without group counterpart (e.g. `selective_code_owner_removals`) are left to projects.
+    :approval_settings JSON-object of desired project approval settings.
+    :return            JSON-object of desired group merge request approval setting.
+    """
+    setting = {}
+    for key, value in approval_settings.items():
+        if key in GROUP_APPROVAL_SETTINGS:
+            group_key, inverted = GROUP_APPROVAL_SETTINGS[key]
+            setting[group_key] = not value if inverted else value
+
+    return setting
+
+
+class GroupSettings:
+    """Accesses GitLab API to write settings once per group, if `group_first` CL-argument is set. Push rule and merge
+    request approval setting are written to groups before projects are configured. GitLab copies group push rule only
+    to projects created after it is set, so that push rules of existing projects are still written to them. Group
+    approval setting is enforced on all projects of the group, so that project sections already matching through it
+    are verified by reading and not written again.
+    Every section is updated by steps, see `call_steps`.
+
+    Attributes:
+        args: Arguments object.
+        printer: Printer object from printer_utils.
+        client: GitlabClient object from gitlab_client.
+        plans: PlanCompiler object from desired_state, providing desired configuration of every group.
+    """
+
+    def __init__(self, args, printer, client, plans):
+        self.args = args
+        self.printer = printer
+        self.client = client
+        self.plans = plans
+
+    def update_group(self, group_id, group_path):
+        """Updates all group-level sections of a single group.
+        :group_id   id of the group to update.
+        :group_path Full path of the group, selecting its overrides in desired-state file.
+        """
+        call_steps.run(self.group_steps(group_id, group_path), self.client)
+
+    def group_steps(self, group_id, group_path):
+        """Steps updating push rule and merge request approval setting of a single group.
+        :group_id   id of the group to update.
+        :group_path Full path of the group, selecting its overrides in desired-state file.
+        """
+        sections = self.plans.group_sections(group_path)
+        yield from self.push_rule_steps(group_id, group_path, sections["push_rule"])
+        yield from self.approval_setting_steps(group_id, group_path, sections["approval_settings"])
+
+    def push_rule_steps(self, group_id, group_path, push_rule):
+        """Steps updating push rule of a single group, which GitLab copies to projects created afterwards.
+        :group_id   id of the group to update.
+        :group_path Full path of the group.
+        :push_rule  JSON-object of desired push rule.
+        """
+        push_rule_url = f'groups/{group_id}/push_rule'
+        current = yield from self.__select_current(group_path, push_rule_url)
+        changes = state_diff.diff_settings(current, push_rule)
+        if not self.__is_write_required(group_path, 'Group push rules', changes):
+            return
+
+        # push rule has to be created, unless group already has one
+        method = "PUT" if current else "POST"
+        response = yield call_steps.call(method, push_rule_url, data=json.dumps(push_rule))
+        self.printer.dump_response(response, group_path, 'Group push rules', {200, 201}, keys=push_rule.keys())
+
+    def approval_setting_steps(self, group_id, group_path, approval_settings):
+        """Steps updating merge request approval setting of a single group, which projects cannot relax. Setting is
+        left to projects, if subgroups or projects of the group override it in desired-state file, since group setting
+        would prevent their overrides from being applied.
+        :group_id          id of the group to update.
+        :group_path        Full path of the group.
+        :approval_settings JSON-object of desired project approval settings.
+        """
+        approval_setting_url = f'groups/{group_id}/merge_request_approval_setting'
+        desired = group_approval_setting(approval_settings)
+        if self.plans.has_overrides_within(group_path, "approval_settings", GROUP_APPROVAL_SETTINGS.keys()):
+            self.printer.dump_unchanged(group_path, 'Group approval settings (left to overriding projects)')
+            return
+
+        current = yield from self.__select_current(group_path, approval_setting_url)
+        # setting is returned as `{"allow_author_approval": {"value": false, "locked": false, ...}, ...}`
+        current = {key: value["value"] if isinstance(value, dict) else value for key, value in (current or {}).items()}
+        changes = state_diff.diff_settings(current, desired)
+        if not desired or not self.__is_write_required(group_path, 'Group approval settings', changes):
+            return
+
+        response = yield call_steps.call("PUT", approval_setting_url, data=json.dumps(desired))
+        self.printer.dump_response(response, group_path, 'Group approval settings', {200}, keys=desired.keys())
+
+    def __select_current(self, group_path, url):
+        """Selects current state of group-level section through REST API.
+        :group_path Full path of the group whose section to select.
+        :url        Url of the section, relative to GitLab API url.
+        :return     JSON-object of the section. `None` if section does not exist yet.
+        """
+        response = yield call_steps.call("GET", url)
+        if response.status_code == 404:
+            return None
+        if response.status_code != 200:
+            global_utils.fail(group_path, response)
+
+        return response.json()
+
+    def __is_write_required(self, group_path, config_name, changes):
+        """Decides whether group-level section has to be written according to `mode` CL-argument.
+        In `plan` mode {:changes} are recorded without writing.
+        :group_path  Full path of the group being configured.
+        :config_name Name of the section being configured for the group.
+        :changes     Map of differing keys to pairs of their current and desired values.
+        :return      Boolean denoting, whether section has to be written.
+        """
+        if not changes:
+            self.printer.dump_unchanged(group_path, config_name)
+            return False
+
+        if self.args["mode"] == "plan":
+            self.printer.dump_plan(group_path, config_name, changes)
+            return False
+
+        return True
@@ -0,0 +1,198 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import json
+import math
+import os
+import re
+import threading
+import time
+
+ID_SEGMENTS = {"projects": ":id", "groups": ":id", "approval_rules": ":rule_id", "members": ":user_id",
+               "pending_members": ":user_id", "all": ":user_id", "commits": ":sha"}
+# projects and groups are addressed by ids or by url-encoded paths, other resources by numeric ids or commit shas, so
+# that literal segments following them (e.g. `members/all`) are kept
+PATH_ID_SEGMENTS = {"projects", "groups"}
+ID_PATTERN = re.compile(r"\d+|[0-9a-f]{7,40}")
+NAME_SEGMENTS = {"branches", "protected_branches"}
+QUANTILES = (0.5, 0.95, 0.99)
+SLOWEST_PROJECTS_COUNT = 10
+
+
+def endpoint_template(method, url):
+    """Converts url of GitLab API call into endpoint template, e.g. `GET projects/:id/protected_branches/:name`.
+    :method HTTP method name.
+    :url    Absolute url of the call.
+    :return Endpoint template.
+    """
+    path = urlparse(url).path
+    path = path.split("/api/v4/", 1)[-1] if "/api/v4/" in path else path.rsplit("/", 1)[-1]
+    segments = path.split("/")
+
+    for i in range(1, len(segments)):
+        is_id = segments[i - 1] in PATH_ID_SEGMENTS or ID_PATTERN.fullmatch(segments[i])
+        if segments[i - 1] in ID_SEGMENTS and is_id:
+            segments[i] = ID_SEGMENTS[segments[i - 1]]
+        elif segments[i - 1] in NAME_SEGMENTS:
+            segments[i] = ":name"
+
+    return f'{method} {"/".join(segments)}'
+
+
+def quantile(values, q):
+    """Nearest-rank quantile of sorted {:values}.
+    :values Sorted list of numbers.
+    :q      Quantile, e.g. 0.95.
+    :return Value of the quantile, 0 for empty list.
+    """
+    if not values:
+        return 0.0
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+class Metrics:
+    """Records every GitLab API call and duration of every configuration section, then summarizes them.
+
+    Attributes:
+        calls: Object stores (status, latency, bytes, retries) tuples by endpoint template.
+        sections: Object stores durations of configuration sections by project id and section name.
+        started_at (float): Time when recording started.
+        lock: Guards `calls` and `sections` attributes, since they are recorded by concurrent workers.
+    """
+
+    def __init__(self):
+        self.calls = defaultdict(list)
+        self.sections = defaultdict(dict)
+        self.started_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def record_call(self, method, url, status, latency, size, retries):
+        """Records a single GitLab API call.
+        :method  HTTP method name.
+        :url     Absolute url of the call.
+        :status  Status code of the final response, 0 if call failed without response.
+        :latency Duration of the call in seconds, including retries.
+        :size    Size of the response body in bytes.
+        :retries Number of retries before the final response.
+        """
+        endpoint = endpoint_template(method, url)
+        with self.lock:
+            self.calls[endpoint].append((status, latency, size, retries))
+
+    @contextmanager
+    def section(self, project_id, section_name):
+        """Measures duration of configuration section for the project.
+        :project_id   id of the project being configured.
+        :section_name Name of the section being configured.
+        """
+        started_at = time.monotonic()
+        try:
+            yield
+        finally:
+            with self.lock:
+                self.sections[project_id][section_name] = time.monotonic() - started_at
+
+    def merge(self, calls, sections, label):
+        """Gathers calls and sections recorded by another Metrics object, e.g. in worker process.
+        :calls    `calls` attribute of the other object.
+        :sections `sections` attribute of the other object.
+        :label    Name of the GitLab instance, prefixing project ids since project ids of instances overlap.
+        """
+        with self.lock:
+            for endpoint, entries in calls.items():
+                self.calls[endpoint].extend(entries)
+            for project_id, durations in sections.items():
+                self.sections[f'{label}/{project_id}'].update(durations)
+
+    def summary(self):
+        """Summarizes recorded calls and sections.
+        :return Map with per-endpoint statistics, per-section statistics and slowest projects.
+        """
+        with self.lock:
+            calls = {endpoint: list(entries) for endpoint, entries in self.calls.items()}
+            sections = {project_id: dict(durations) for project_id, durations in self.sections.items()}
+
+        endpoints = {}
+        for endpoint, entries in sorted(calls.items()):
+            latencies = sorted(entry[1] for entry in entries)
+            endpoints[endpoint] = {"count": len(entries),
+                                   "errors": sum(1 for entry in entries if not 200 <= entry[0] < 400),
+                                   "retries": sum(entry[3] for entry in entries),
+                                   "bytes": sum(entry[2] for entry in entries),
+                                   "seconds": sum(latencies),
+                                   **{f'p{round(q * 100)}': quantile(latencies, q) for q in QUANTILES}}
+
+        section_durations = defaultdict(list)
+        for durations in sections.values():
+            for section_name, duration in durations.items():
+                section_durations[section_name].append(duration)
+
+        section_stats = {}
+        for section_name, durations in sorted(section_durations.items()):
+            durations.sort()
+            section_stats[section_name] = {"count": len(durations),
+                                           "seconds": sum(durations),
+                                           **{f'p{round(q * 100)}': quantile(durations, q) for q in QUANTILES}}
+
+        slowest_projects = sorted(sections.items(), key=lambda entry: sum(entry[1].values()), reverse=True)
+        return {"wall_time": time.monotonic() - self.started_at,
+                "requests": sum(stats["count"] for stats in endpoints.values()),
+                "endpoints": endpoints,
+                "sections": section_stats,
+                "slowest_projects": [{"project_id": project_id, "seconds": sum(durations.values()),
+                                      "sections": durations}
+                                     for project_id, durations in slowest_projects[:SLOWEST_PROJECTS_COUNT]]}
+
+    def write_json(self, path):
+        """Writes summary as JSON.
+        :path Path to the output file.
+        """
+        self.__write_atomically(path, json.dumps(self.summary(), indent=2, default=str))
+
+    def write_prometheus(self, path):
+        """Writes summary in Prometheus text format, suitable for node_exporter textfile collector.
+        :path Path to the output file.
+        """
+        summary = self.summary()
+        lines = ["# HELP gitlab_config_api_call_duration_seconds Duration of GitLab API calls including retries.",
+                 "# TYPE gitlab_config_api_call_duration_seconds summary"]
+        for endpoint, stats in summary["endpoints"].items():
+            for q in QUANTILES:
+                lines.append(f'gitlab_config_api_call_duration_seconds{{endpoint="{endpoint}",quantile="{q}"}} '
+                             f'{stats[f"p{round(q * 100)}"]}')
+            lines.append(f'gitlab_config_api_call_duration_seconds_sum{{endpoint="{endpoint}"}} {stats["seconds"]}')
+            lines.append(f'gitlab_config_api_call_duration_seconds_count{{endpoint="{endpoint}"}} {stats["count"]}')
+
+        for metric, key, help_text in (("gitlab_config_api_errors_total", "errors", "Failed GitLab API calls."),
+                                       ("gitlab_config_api_retries_total", "retries", "Retried GitLab API calls."),
+                                       ("gitlab_config_api_response_bytes_total", "bytes", "Received bytes.")):
+            lines += [f'# HELP {metric} {help_text}', f'# TYPE {metric} counter']
+            lines += [f'{metric}{{endpoint="{endpoint}"}} {stats[key]}'
+                      for endpoint, stats in summary["endpoints"].items()]
+
+        lines += ["# HELP gitlab_config_section_duration_seconds Duration of configuration sections per project.",
+                  "# TYPE gitlab_config_section_duration_seconds summary"]
+        for section_name, stats in summary["sections"].items():
+            for q in QUANTILES:
+                lines.append(f'gitlab_config_section_duration_seconds{{section="{section_name}",quantile="{q}"}} '
+                             f'{stats[f"p{round(q * 100)}"]}')
+            lines.append(f'gitlab_config_section_duration_seconds_sum{{section="{section_name}"}} {stats["seconds"]}')
+            lines.append(f'gitlab_config_section_duration_seconds_count{{section="{section_name}"}} {stats["count"]}')
+
+        lines += ["# HELP gitlab_config_run_duration_seconds Wall time of the run.",
+                  "# TYPE gitlab_config_run_duration_seconds gauge",
+                  f'gitlab_config_run_duration_seconds {summary["wall_time"]}']
+
+        self.__write_atomically(path, "\n".join(lines) + "\n")
+
+    @staticmethod
+    def __write_atomically(path, text):
+        """Writes {:text} through temporary file, so that readers never observe partially written file.
+        :path Path to the output file.
+        :text Content of the file.
+        """
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, mode="w") as file:
+            file.write(text)
+        os.replace(tmp_path, path)
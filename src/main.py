@@ -1,22 +1,37 @@
 from args_parser import parse_args
-from gitlab_config import GitlabConfig
 
 
 def debug_mode(gconf, selected_pids):
-    print(gconf.ps.select_project_by_setting(selected_pids, {"merge_method": "merge"}))
+    print(gconf.ps.select_project_by_setting(gconf.prefetch_state(selected_pids), {"merge_method": "merge"}))
 
 
 def main():
     args = parse_args()
-    gconf = GitlabConfig(args)
-
-    selected_pids = gconf.select_project_ids()
-
-    if args["debug"]:
-        debug_mode(gconf, selected_pids)
+    # modules accessing GitLab API (e.g. `requests`) are imported after arguments are validated, so that `--help` and
+    # invalid arguments do not pay for their import
+    if args["serve"]:
+        from config_server import ConfigServer
+        ConfigServer(args).serve_forever()
+        return
+
+    if args["targets"]:
+        from fan_out import FanOutRunner
+        gconf = FanOutRunner(args)
     else:
-        gconf.update_settings(selected_pids)
+        from gitlab_config import GitlabConfig
+        gconf = GitlabConfig(args)
+
+    try:
+        if args["debug"]:
+            debug_mode(gconf, gconf.select_project_ids())
+        elif args["audit"] is not None:
+            gconf.audit_settings()
+        else:
+            gconf.update_selected_settings()
+    finally:
+        # projects updated before failure are reported as well
         gconf.print_response()
+        gconf.write_metrics()
 
 
 if __name__ == "__main__":
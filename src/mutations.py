@@ -0,0 +1,120 @@
+from functools import lru_cache
+
+import json
+import state_diff
+import threading
+
+# access levels of protected branch objects and their parameters in protected branch mutations
+ACCESS_LEVEL_PARAMS = (("push_access_levels", "allowed_to_push"), ("merge_access_levels", "allowed_to_merge"),
+                       ("unprotect_access_levels", "allowed_to_unprotect"))
+ACCESS_LEVEL_PARAM_NAMES = frozenset(param for _, param in ACCESS_LEVEL_PARAMS)
+PROTECTED_BRANCH_FLAGS = ("allow_force_push", "code_owner_approval_required")
+
+
+def protected_branch_mutation(current, desired):
+    """Computes minimal update of protected branch: access levels missing from {:desired} (or repeated) are destroyed
+    by their ids, only desired access levels missing from {:current} are added and only differing flags are set.
+    Unprotect access levels are left intact, unless {:desired} specifies them, see `state_diff.managed_access_levels`.
+    :current JSON-object of protected branch obtained from GitLab, with ids of access levels.
+    :desired JSON-object of desired protected branch.
+    :return  Hashable mutation, tuple of (parameter, value) pairs, see `serialize`. Empty if branches match.
+    """
+    mutation = []
+    managed = state_diff.managed_access_levels(desired)
+    for levels_key, param in ACCESS_LEVEL_PARAMS:
+        if levels_key not in managed:
+            continue
+        desired_levels = state_diff.access_levels(desired.get(levels_key))
+        kept = set()
+        destroyed = []
+        for level in current.get(levels_key) or []:
+            level_key = state_diff.access_level(level)
+            if level_key in desired_levels and level_key not in kept:
+                kept.add(level_key)
+            else:
+                destroyed.append(level["id"])
+        added = sorted(desired_levels - kept, key=str)
+        if destroyed or added:
+            mutation.append((param, (tuple(destroyed), tuple(added))))
+
+    for key in PROTECTED_BRANCH_FLAGS:
+        if bool(current.get(key)) != bool(desired.get(key)):
+            mutation.append((key, bool(desired.get(key))))
+
+    return tuple(mutation)
+
+
+def protected_branch_creation(desired):
+    """Computes creation of protected branch, same for every project with the same {:desired} branch.
+    :desired JSON-object of desired protected branch.
+    :return  Hashable mutation, tuple of (parameter, value) pairs, see `serialize`.
+    """
+    mutation = [("name", desired["name"])]
+    for levels_key, param in (("push_access_levels", "push_access_level"),
+                              ("merge_access_levels", "merge_access_level"),
+                              ("unprotect_access_levels", "unprotect_access_level")):
+        # creation accepts a single access level of every kind
+        if desired.get(levels_key):
+            mutation.append((param, desired[levels_key][0]["access_level"]))
+    for key in PROTECTED_BRANCH_FLAGS:
+        mutation.append((key, bool(desired.get(key))))
+
+    return tuple(mutation)
+
+
+@lru_cache(maxsize=4096)
+def serialize(mutation):
+    """Serializes mutation into request body once, identical mutations of other projects reuse the same body.
+    :mutation Tuple of (parameter, value) pairs, values of access level parameters are pairs of destroyed ids and added
+              (access_level, user_id, group_id) tuples.
+    :return   JSON string.
+    """
+    payload = {}
+    for param, value in mutation:
+        if param in ACCESS_LEVEL_PARAM_NAMES:
+            destroyed, added = value
+            payload[param] = [{"id": level_id, "_destroy": True} for level_id in destroyed] + \
+                             [{key: field for key, field in zip(("access_level", "user_id", "group_id"), level)
+                               if field is not None} for level in added]
+        else:
+            payload[param] = value
+
+    return json.dumps(payload)
+
+
+class MutationLog:
+    """Records writes accepted by GitLab during a run, so that identical writes (e.g. of a project selected twice or of
+    a branch listed twice) are sent once. Failed writes are not recorded, so that identical writes are sent again.
+    Writes are identical if their method, url (built from project id and quoted branch name) and body are equal.
+    Log is kept in memory of a single process for a single run: shards of `--targets` keep separate logs, and writes
+    of previous runs are skipped only by `--resume`, which skips sections completed by them.
+
+    Attributes:
+        sent (set): (method, url, body) triples of writes accepted by GitLab.
+        lock: Guards `sent` attribute, since projects are configured by concurrent workers.
+    """
+
+    def __init__(self):
+        self.sent = set()
+        self.lock = threading.Lock()
+
+    def is_sent(self, method, url, body):
+        """Checks whether write about to be sent was already accepted by GitLab.
+        :method HTTP method of the write.
+        :url    Url of the write, relative to GitLab API url.
+        :body   Serialized request body.
+        :return Boolean denoting, whether identical write was already accepted.
+        """
+        with self.lock:
+            return (method, url, body) in self.sent
+
+    def record(self, method, url, body, response):
+        """Records write, if GitLab accepted it.
+        :method   HTTP method of the write.
+        :url      Url of the write, relative to GitLab API url.
+        :body     Serialized request body.
+        :response Response of GitLab to the write.
+        """
+        if 200 <= response.status_code < 300:
+            with self.lock:
+                self.sent.add((method, url, body))
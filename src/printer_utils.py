@@ -1,52 +1,256 @@
 from collections import defaultdict
 from const import clr, PER_PAGE_COUNT
 
+import call_steps
 import global_utils
-import requests
+import json
+import threading
 
 
 class Printer:
     """Utility functions for printing http-responses.
 
     Attributes:
+        client: GitlabClient object from gitlab_client.
         updated: Object stores updated records. 
+        planned: Object stores differences between current and desired settings, which are not written yet.
+        unchanged: Object stores names of sections already matching desired settings.
+        failed: Object stores reasons of failed sections.
+        replanned: Object stores ids of projects whose desired configuration changed since previous run.
+        audited: Object stores paths of projects matching audit filters, `None` unless audit was run.
+        lock: Guards `updated`, `planned`, `unchanged`, `failed` and `replanned` attributes, since they are dumped by concurrent workers.
     """
 
-    def __init__(self):
+    def __init__(self, client):
+        self.client = client
         self.updated = defaultdict(dict)
+        self.planned = defaultdict(dict)
+        self.unchanged = defaultdict(list)
+        self.failed = defaultdict(dict)
+        self.replanned = []
+        self.audited = None
+        self.lock = threading.Lock()
 
-    @staticmethod
-    def response_json(args, path):
-        """Gets response as json by specified url.  
-        :args Command Line arguments, includes defaults of optional arguments. 
+    def response_json(self, path):
+        """Gets response as json by specified url. Collections are gathered from all the pages.  
         :path Subdirectory (section) with which to complete url. 
         :return response as json from specified url. 
         """
-        final_url = f'{args["base_url"]}/{path}?&per_page={PER_PAGE_COUNT}&page=1'
-        response = requests.get(final_url, headers=args["headers"])
+        return call_steps.run(self.collection_steps(path), self.client)
+
+    def collection_steps(self, path, params=None, stop=None):
+        """Steps gathering response as json by specified url, see `call_steps`.
+        Collections are gathered from all the pages.
+        :path   Subdirectory (section) with which to complete url.
+        :params Additional query parameters.
+        :stop   Function accepting entry and returning whether to stop gathering before it, e.g. for sorted collection.
+        :return Collection entries from all the pages, or response as json if it is not a collection.
+        """
+        url, params = self.client.url(path), dict(params or {}, per_page=PER_PAGE_COUNT)
+        entries = []
+        while url:
+            response = yield call_steps.call("GET", url, params=params)
+            page = self.__page_json(response)
+            if not isinstance(page, list):
+                return page
+            for entry in page:
+                if stop is not None and stop(entry):
+                    return entries
+                entries.append(entry)
+            url, params = self.__next_page(response, url, params)
+
+        return entries
+
+    async def aiter_json(self, client, path, params=None):
+        """Lazily yields entries of paginated collection by specified url through asynchronous client, see `iter_json`.
+        :client AsyncGitlabClient object.
+        :path   Subdirectory (section) with which to complete url.
+        :params Additional query parameters.
+        :return Asynchronous generator of collection entries.
+        """
+        url, params = client.url(path), dict(params or {}, per_page=PER_PAGE_COUNT)
+        while url:
+            response = await client.get(url, params=params)
+            for entry in self.__page_json(response):
+                yield entry
+            url, params = self.__next_page(response, url, params)
+
+    def iter_json(self, path, params=None, keyset=False):
+        """Lazily yields entries of paginated collection by specified url.
+        :path   Subdirectory (section) with which to complete url.
+        :params Additional query parameters.
+        :keyset If set uses keyset pagination, supported by GitLab for some collections (e.g. `projects`).
+        :return Generator of collection entries, next page is requested only when previous one is consumed.
+        """
+        for page in self.iter_pages(path, params, keyset):
+            yield from page
+
+    def iter_pages(self, path, params=None, keyset=False):
+        """Lazily yields pages of response by specified url, following `Link` and `X-Next-Page` headers.
+        :path   Subdirectory (section) with which to complete url.
+        :params Additional query parameters.
+        :keyset If set uses keyset pagination ordered by id.
+        :return Generator of response pages as json.
+        """
+        url = self.client.url(path)
+        params = dict(params or {}, per_page=PER_PAGE_COUNT)
+        if keyset:
+            params.update(pagination="keyset", order_by="id", sort="asc")
+
+        while url:
+            response = self.client.get(url, params=params)
+            yield self.__page_json(response)
+            url, params = self.__next_page(response, url, params)
+
+    @staticmethod
+    def __page_json(response):
+        """Parses page of paginated response.
+        :response Response of the page.
+        :return   Page as json.
+        """
         if not response.ok:
-            raise Exception(f'Undesired ({response.status_code}) response from `{final_url}`')
+            raise global_utils.GitlabError(f'Undesired ({response.status_code}) response from `{response.url}`',
+                                           response.status_code)
         return response.json()
 
-    def dump_response(self, response, project_id, config_name, desired_states={200, 201, 204}):
+    @staticmethod
+    def __next_page(response, url, params):
+        """Computes request of the next page, following `Link` and `X-Next-Page` headers.
+        :response Response of the current page.
+        :url      Url of the current page.
+        :params   Query parameters of the current page.
+        :return   Pair of url and query parameters of the next page, url is `None` after the last page.
+        """
+        if "next" in response.links:
+            # `Link` header contains complete url of the next page, including all query parameters
+            return response.links["next"]["url"], None
+        if response.headers.get("X-Next-Page"):
+            return url, dict(params or {}, page=response.headers["X-Next-Page"])
+        return None, params
+
+    def dump_response(self, response, project_id, config_name, desired_states={200, 201, 204}, text=None, keys=None):
         """Gathers successful response into `updated` attribute, otherwise throws erroneous response from GitLab.
         :response       - Response obtained from last GitLab API call.
         :project_id     - GitLab id of the project being configured.
         :config_name    - Name of the section being configured for the project.
         :desired_states - List of response status codes for which to accept dumps, otherwise erroneous response.
+        :text           - Text to gather instead of response text, e.g. for responses without body.
+        :keys           - Keys of JSON-object of the response to gather instead of whole response text, e.g. written
+                          settings, so that memory does not grow with size of GitLab objects.
         """
         if response.status_code in desired_states:
-            text = response.text
-            if config_name in self.updated[project_id].keys():
-                text += f'\n{self.updated[project_id][config_name]}'
-            self.updated[project_id][config_name] = text
+            if text is None:
+                text = response.text if keys is None else self.__select_keys(response, keys)
+            with self.lock:
+                if config_name in self.updated[project_id].keys():
+                    text += f'\n{self.updated[project_id][config_name]}'
+                self.updated[project_id][config_name] = text
         else:
             global_utils.fail(project_id, response)
 
+    @staticmethod
+    def __select_keys(response, keys):
+        body = response.json() if response.content else None
+        if not isinstance(body, dict):
+            return response.text
+        return json.dumps({key: body[key] for key in keys if key in body})
+
+    def dump_plan(self, project_id, config_name, changes):
+        """Gathers differences between current and desired settings into `planned` attribute.
+        :project_id     - GitLab id of the project being configured.
+        :config_name    - Name of the section being configured for the project.
+        :changes        - Map of differing keys to pairs of their current and desired values.
+        """
+        with self.lock:
+            self.planned[project_id][config_name] = changes
+
+    def dump_unchanged(self, project_id, config_name):
+        """Gathers name of the section already matching desired settings into `unchanged` attribute.
+        :project_id     - GitLab id of the project being configured.
+        :config_name    - Name of the section being configured for the project.
+        """
+        with self.lock:
+            self.unchanged[project_id].append(config_name)
+
+    def dump_failure(self, project_id, config_name, reason):
+        """Gathers reason of the failed section into `failed` attribute.
+        :project_id     - GitLab id of the project being configured.
+        :config_name    - Name of the section being configured for the project.
+        :reason         - Text describing the failure.
+        """
+        with self.lock:
+            self.failed[project_id][config_name] = reason
+
+    def dump_replanned(self, project_id):
+        """Gathers id of the project whose desired configuration changed since previous run into `replanned` attribute.
+        :project_id     - GitLab id of the project being configured.
+        """
+        with self.lock:
+            self.replanned.append(project_id)
+
+    def dump_audit(self, paths, total, elapsed):
+        """Gathers outcome of the audit into `audited` attribute.
+        :paths          - Full paths of projects matching audit filters.
+        :total          - Number of audited projects.
+        :elapsed        - Number of seconds taken by filters and comparison with desired configuration.
+        """
+        with self.lock:
+            self.audited = {"paths": paths, "total": total, "elapsed": elapsed}
+
+    def results(self):
+        """Exports gathered results as plain objects, e.g. to send them from worker process, see `merge`.
+        :return Map of `updated`, `planned`, `unchanged`, `failed` and `replanned` attributes.
+        """
+        with self.lock:
+            return {"updated": {project_id: dict(sections) for project_id, sections in self.updated.items()},
+                    "planned": {project_id: dict(sections) for project_id, sections in self.planned.items()},
+                    "unchanged": {project_id: list(sections) for project_id, sections in self.unchanged.items()},
+                    "failed": {project_id: dict(sections) for project_id, sections in self.failed.items()},
+                    "replanned": list(self.replanned)}
+
+    def merge(self, results, label):
+        """Gathers {:results} exported by another printer, prefixing project ids with {:label}.
+        :results Map exported by `results` method.
+        :label   Name of the GitLab instance the results belong to, since project ids of instances overlap.
+        """
+        with self.lock:
+            for attribute in ("updated", "planned", "failed"):
+                for project_id, sections in results[attribute].items():
+                    getattr(self, attribute)[f'{label}/{project_id}'].update(sections)
+            for project_id, sections in results["unchanged"].items():
+                self.unchanged[f'{label}/{project_id}'].extend(sections)
+            self.replanned.extend(f'{label}/{project_id}' for project_id in results["replanned"])
+
     def print_response(self):
-        """Prints all responses from `updated` attribute."""
+        """Prints all responses from `updated` attribute, planned changes, number of unchanged sections, failures and
+        projects whose desired configuration changed since previous run."""
         for project_id in self.updated.keys():
             print(
                 f'{clr.HDRC}Project {project_id} successfully updated.{clr.DMPC} \nNew configuration parameters are: {clr.RSTC}')
             for config_name in self.updated[project_id].keys():
                 print(f'{clr.SUBC}{config_name}: \n{clr.DMPC}{self.updated[project_id][config_name]}{clr.RSTC}')
+
+        for project_id in self.planned.keys():
+            print(f'{clr.HDRC}Project {project_id} differs from desired configuration.{clr.RSTC}')
+            for config_name, changes in self.planned[project_id].items():
+                print(f'{clr.SUBC}{config_name}: {clr.RSTC}')
+                for key, (current, desired) in changes.items():
+                    print(f'  {key}: {current} -> {desired}')
+
+        if self.unchanged:
+            unchanged_count = sum(len(config_names) for config_names in self.unchanged.values())
+            print(f'{clr.HDRC}{unchanged_count} sections in {len(self.unchanged)} projects already match desired configuration.{clr.RSTC}')
+
+        for project_id in self.failed.keys():
+            print(f'{clr.HDRC}Project {project_id} failed to update.{clr.RSTC}')
+            for config_name, reason in self.failed[project_id].items():
+                print(f'{clr.SUBC}{config_name}: \n{clr.DMPC}{reason}{clr.RSTC}')
+
+        if self.replanned:
+            print(f'{clr.HDRC}Desired configuration changed since previous run for {len(self.replanned)} projects: '
+                  f'{clr.RSTC}{", ".join(str(project_id) for project_id in self.replanned)}')
+
+        if self.audited is not None:
+            print(f'{clr.HDRC}{len(self.audited["paths"])} of {self.audited["total"]} projects match audit filters, '
+                  f'{len(self.planned)} of them differ from desired configuration '
+                  f'(queried in {self.audited["elapsed"] * 1000:.1f} ms): {clr.RSTC}{", ".join(self.audited["paths"])}')
@@ -1,178 +1,312 @@
+import call_steps
 import global_utils
-import json
-import requests
+import mutations
+import state_diff
+import state_records
 
-from string import Template
+from project_state import MISSING
+from urllib.parse import quote
+
+# sections read by updates, as names within `state`, urls relative to project url and whether they are collections
+STATE_SECTIONS = (("project", "", False), ("approvals", "/approvals", False),
+                  ("approval_rules", "/approval_rules", True), ("protected_branches", "/protected_branches", True),
+                  ("push_rule", "/push_rule", False))
+# sections read in `force` mode as well, since the write depends on what exists (rule id, branch, existing push rule)
+FORCE_MODE_SECTIONS = ("approval_rules", "protected_branches", "push_rule")
 
 
 class ProjectSettings:
     """Accesses GitLab API to manipulate project settings. 
+    Every section is updated by steps (generators yielding GitLab API calls, see `call_steps`), so that the same
+    logic is driven by synchronous client through `update_*` methods and by asynchronous client in `--async` mode.
 
     Attributes: 
         args: Arguments object.
         printer: Printer object from printer_utils.
+        client: GitlabClient object from gitlab_client.
+        state: ProjectStateStore object from project_state, preloaded sections are read from it instead of REST API.
+        plans: PlanCompiler object from desired_state, providing desired configuration of every project.
+        mutations: MutationLog object from mutations, so that identical writes are sent once per run and process.
     """
 
-    def __init__(self, args, printer):
+    def __init__(self, args, printer, client, state, plans):
         self.args = args
         self.printer = printer
+        self.client = client
+        self.state = state
+        self.plans = plans
+        self.mutations = mutations.MutationLog()
 
     def update_project_settings(self, selected_pids):
         """Updates overall Project Settings for specified GitLab Ids. 
         :selected_pids List of GitLab Ids of projects belonging to specified GitLab Groups. 
         """
-
         for project_id in selected_pids:
-            """ TODO: fix bug when defaulted branch does not exist
-            default_branch_url = project_settings_base_url.format(str(project_id)+"/repository/branches/"+self.default_branch)
-            response = requests.get(default_branch_url, headers=args["headers"])
-            if response.status_code == 200:
-                if response.json()["name"] == self.default_branch: 
-                    args["project_settings"]["default_branch"] = self.default_branch
-            """
+            call_steps.run(self.project_settings_steps(project_id), self.client)
+
+    def project_settings_steps(self, project_id):
+        """Steps updating overall Project Settings of a single project.
+        :project_id id of the project to update.
+        """
+        """ TODO: fix bug when defaulted branch does not exist
+        default_branch_url = project_settings_base_url.format(str(project_id)+"/repository/branches/"+self.default_branch)
+        response = requests.get(default_branch_url, headers=args["headers"])
+        if response.status_code == 200:
+            if response.json()["name"] == self.default_branch: 
+                args["project_settings"]["default_branch"] = self.default_branch
+        """
+
+        plan = self.plans.plan(project_id)
+        project_settings_url = f'projects/{project_id}'
+        current = yield from self.__select_current(project_id, project_settings_url, "project",
+                                                   plan.sections["project_settings"].keys())
+        changes = state_diff.diff_settings(current, plan.sections["project_settings"])
+        if not self.__is_write_required(project_id, 'Project settings', changes):
+            return
+
+        if self.__is_sent(project_id, 'Project settings', "PUT", project_settings_url,
+                          plan.payloads["project_settings"]):
+            return
 
-            project_settings_url = f'{self.args["base_url"]}/projects/{project_id}'
-            response = requests.put(project_settings_url, headers=self.args["headers"],
-                                    data=json.dumps(self.args["project_settings"]))
+        response = yield call_steps.call("PUT", project_settings_url, data=plan.payloads["project_settings"])
+        self.mutations.record("PUT", project_settings_url, plan.payloads["project_settings"], response)
+        self.state.discard(project_id, "project")
 
-            self.printer.dump_response(response, project_id, 'Project settings', {200})
+        self.printer.dump_response(response, project_id, 'Project settings', {200},
+                                   keys=plan.sections["project_settings"].keys())
 
     def update_approval_settings(self, selected_pids):
         """Updates Approval Settings subsection (in General section) for specified GitLab Ids. 
         :selected_pids List of GitLab Ids of projects belonging to specified GitLab Groups. 
         """
-
         for project_id in selected_pids:
-            approvals_url = f'{self.args["base_url"]}/projects/{project_id}/approvals'
-            response = requests.post(approvals_url, headers=self.args["headers"],
-                                     data=json.dumps(self.args["approval_settings"]))
-            self.printer.dump_response(response, project_id, 'Approval settings', {201})
+            call_steps.run(self.approval_settings_steps(project_id), self.client)
+
+    def approval_settings_steps(self, project_id):
+        """Steps updating Approval Settings subsection of a single project.
+        :project_id id of the project to update.
+        """
+        plan = self.plans.plan(project_id)
+        approvals_url = f'projects/{project_id}/approvals'
+        current = yield from self.__select_current(project_id, approvals_url, "approvals")
+        changes = state_diff.diff_settings(current, plan.sections["approval_settings"])
+        if not self.__is_write_required(project_id, 'Approval settings', changes):
+            return
+
+        if self.__is_sent(project_id, 'Approval settings', "POST", approvals_url, plan.payloads["approval_settings"]):
+            return
+
+        response = yield call_steps.call("POST", approvals_url, data=plan.payloads["approval_settings"])
+        self.mutations.record("POST", approvals_url, plan.payloads["approval_settings"], response)
+        self.state.discard(project_id, "approvals")
+        self.printer.dump_response(response, project_id, 'Approval settings', {201},
+                                   keys=plan.sections["approval_settings"].keys())
 
     def update_approval_rules(self, selected_pids):
         """Updates Approval Rules subsection (in General section) for specified GitLab Ids. 
         :selected_pids List of GitLab Ids of projects belonging to specified GitLab Groups. 
         """
-
         for project_id in selected_pids:
-            approval_rules_url = f'{self.args["base_url"]}/projects/{project_id}/approval_rules'
-
-            response = requests.get(approval_rules_url, headers=self.args["headers"])
-            default_rule = [entry for entry in response.json() if entry["rule_type"] == "any_approver"]
-            if len(default_rule) == 1:
-                self.args["approval_rules"]["id"] = default_rule[0]["id"]
-                response = requests.put(f'{approval_rules_url}/{self.args["approval_rules"]["id"]}',
-                                        headers=self.args["headers"], data=json.dumps(self.args["approval_rules"]))
-            elif len(default_rule) == 0:
-                response = requests.post(approval_rules_url, headers=self.args["headers"],
-                                         data=json.dumps(self.args["approval_rules"]))
-            else:
-                raise Exception(f'Project {project_id} cannot contain more than 1 default approval rule')
+            call_steps.run(self.approval_rules_steps(project_id), self.client)
 
-            self.printer.dump_response(response, project_id, 'Approval rules', {200, 201})
+    def approval_rules_steps(self, project_id):
+        """Steps updating Approval Rules subsection of a single project.
+        :project_id id of the project to update.
+        """
+        plan = self.plans.plan(project_id)
+        approval_rules_url = f'projects/{project_id}/approval_rules'
+
+        approval_rules = yield from self.__select_state(project_id, approval_rules_url, "approval_rules",
+                                                        collection=True)
+        default_rule = [entry for entry in approval_rules if entry["rule_type"] == "any_approver"]
+        current = default_rule[0] if len(default_rule) == 1 else None
+        changes = state_diff.diff_settings(current, plan.sections["approval_rules"])
+        if len(default_rule) <= 1 and not self.__is_write_required(project_id, 'Approval rules', changes):
+            return
+
+        if len(default_rule) == 1:
+            # rule is selected by url, so the payload serialized once by plan is reused
+            method, url = "PUT", f'{approval_rules_url}/{default_rule[0]["id"]}'
+        elif len(default_rule) == 0:
+            method, url = "POST", approval_rules_url
+        else:
+            raise global_utils.GitlabError(f'Project {project_id} cannot contain more than 1 default approval rule')
+        if self.__is_sent(project_id, 'Approval rules', method, url, plan.payloads["approval_rules"]):
+            return
+
+        response = yield call_steps.call(method, url, data=plan.payloads["approval_rules"])
+        self.mutations.record(method, url, plan.payloads["approval_rules"], response)
+
+        self.state.discard(project_id, "approval_rules")
+        self.printer.dump_response(response, project_id, 'Approval rules', {200, 201},
+                                   keys=plan.sections["approval_rules"].keys())
 
     def update_protected_branches(self, selected_pids):
         """Updates Protected Branches subsection (in General section) for specified GitLab Ids. 
         :selected_pids List of GitLab Ids of projects belonging to specified GitLab Groups. 
         """
-
         for project_id in selected_pids:
-            branches_url = f'{self.args["base_url"]}/projects/{project_id}/repository/branches'
-            branches = requests.get(branches_url, headers=self.args["headers"]).json()
+            call_steps.run(self.protected_branches_steps(project_id), self.client)
 
-            protected_branches_url = f'{self.args["base_url"]}/projects/{project_id}/protected_branches'
-            protected_branches = requests.get(protected_branches_url, headers=self.args["headers"]).json()
-
-            for candidate in self.args["protected_branches"]:
-                # if candidate branch exists, and it's not protected, then add it to protected branches
-                if len([branch for branch in branches if branch["name"] == candidate["name"]]) == 1 \
-                        and len([branch for branch in protected_branches if branch["name"] == candidate["name"]]) == 0:
-                    self.__add_branch_to_protected(project_id, candidate)
-
-                # if candidate branch exists, and it's protected, then update its settings
-                if len([branch for branch in branches if branch["name"] == candidate["name"]]) == 1 \
-                        and len([branch for branch in protected_branches if branch["name"] == candidate["name"]]) == 1:
-                    self.__clear_all_access_levels(project_id, candidate["name"], protected_branches)
-                    self.__update_protected_branch(project_id, candidate)
-
-    def __add_branch_to_protected(self, project_id, candidate_branch):
-        """Adds given branch to protected branches as well setting its protection settings.
-        :project_id         id of the project whose branch to update for.
-        :candidate_branch   Object of the branch to remove all access levels.
-        """
-        protected_branch_url = f'{self.args["base_url"]}/projects/{project_id}/protected_branches\
-                        ?name={candidate_branch["name"]}\
-                        &push_access_level={candidate_branch["push_access_levels"][0]["access_level"]}\
-                        &merge_access_level={candidate_branch["merge_access_levels"][0]["access_level"]}\
-                        &allow_force_push={candidate_branch["allow_force_push"]}\
-                        &code_owner_approval_required={candidate_branch["code_owner_approval_required"]}'.replace(' ',
-                                                                                                                  '')
-        print(protected_branch_url)
-        response = requests.post(protected_branch_url, headers=self.args["headers"])
-        self.printer.dump_response(response, project_id, "Protected branches", {201})
-
-    def __clear_all_access_levels(self, project_id, branch_name, protected_branches):
-        """Removes all access_level records for a given protected branch.
-        :project_id         id of the project whose branch to update for.
-        :branch_name        Name of the branch to remove all access levels.
-        :protected_branches List of protected branch objects. 
+    def protected_branches_steps(self, project_id):
+        """Steps updating Protected Branches subsection of a single project.
+        :project_id id of the project to update.
         """
-        protected_branch_url = f'{self.args["base_url"]}/projects/{project_id}/protected_branches/{branch_name}'
-        candidate_branch = [branch for branch in protected_branches if branch["name"] == branch_name][0]
-
-        data = '{'
-
-        if candidate_branch["push_access_levels"]:
-            allowed_to_push_removals = '['
-            for level in candidate_branch["push_access_levels"]:
-                allowed_to_push_removals += '{{"id": {level_id}, "_destroy": true}},'.format(level_id=level["id"])
-            allowed_to_push_removals = allowed_to_push_removals[:-1] + ']'
-            data += '"allowed_to_push": ' + allowed_to_push_removals + ','
+        protected_branches_url = f'projects/{project_id}/protected_branches'
+        protected_branches = yield from self.__select_state(project_id, protected_branches_url, "protected_branches",
+                                                            collection=True)
+        # branches preloaded through GraphQL lack unprotect access levels, compared only if desired branches set them
+        if any("unprotect_access_levels" in candidate for candidate in
+               self.plans.plan(project_id).sections["protected_branches"]) and \
+                any("unprotect_access_levels" not in branch for branch in protected_branches):
+            self.state.discard(project_id, "protected_branches")
+            protected_branches = yield from self.__select_state(project_id, protected_branches_url,
+                                                                "protected_branches", collection=True)
+        protected_branches = {branch["name"]: branch for branch in protected_branches}
+
+        actions = yield from self.__plan_protected_branches(project_id, protected_branches)
+
+        # if candidate branch exists, and it's not protected, then add it to protected branches
+        for candidate, _ in actions["add"]:
+            yield from self.__add_branch_to_protected(project_id, candidate)
+
+        # if candidate branch exists, and it's protected, then update its settings
+        for candidate, current in actions["update"]:
+            yield from self.__update_protected_branch(project_id, candidate, current)
+
+        self.state.discard(project_id, "protected_branches")
+
+    def __plan_protected_branches(self, project_id, protected_branches):
+        """Computes actions reconciling protected branches of the project with its plan.
+        Existence of candidate branch is checked only if its protection has to be written.
+        :project_id         id of the project whose branches to reconcile.
+        :protected_branches Map of protected branch names to protected branch objects.
+        :return             Map of `add`, `update` and `untouched` actions to lists of (candidate, current) pairs.
+        """
+        actions = {"add": [], "update": [], "untouched": []}
 
-        if candidate_branch["merge_access_levels"]:
-            allowed_to_merge_removals = '['
-            for level in candidate_branch["merge_access_levels"]:
-                allowed_to_merge_removals += '{{"id": {level_id}, "_destroy": true}},'.format(level_id=level["id"])
-            allowed_to_merge_removals = allowed_to_merge_removals[:-1] + ']'
-            data += '"allowed_to_merge": ' + allowed_to_merge_removals + ','
+        for candidate in self.plans.plan(project_id).sections["protected_branches"]:
+            current = protected_branches.get(candidate["name"])
+            if current is None:
+                changes = {"name": (None, candidate["name"])}
+            else:
+                changes = state_diff.diff_protected_branch(current, candidate)
 
-        if candidate_branch["unprotect_access_levels"]:
-            allowed_to_merge_removals = '['
-            for level in candidate_branch["unprotect_access_levels"]:
-                allowed_to_merge_removals += '{{"id": {level_id}, "_destroy": true}},'.format(level_id=level["id"])
-            allowed_to_merge_removals = allowed_to_merge_removals[:-1] + ']'
-            data += '"allowed_to_unprotect": ' + allowed_to_merge_removals + ','
+            if (changes or self.args["mode"] == "force") and \
+                    not (yield from self.__branch_exists(project_id, candidate["name"])):
+                action = "untouched"
+            elif self.__is_write_required(project_id, f'Protected branches ({candidate["name"]})', changes):
+                action = "add" if current is None else "update"
+            else:
+                action = "untouched"
 
-        data = data[:-1] + '}'
+            actions[action].append((candidate, current))
 
-        response = requests.patch(protected_branch_url, headers=self.args["headers"], data=data)
+        return actions
 
+    def __branch_exists(self, project_id, branch_name):
+        """Checks existence of a single branch without listing all branches of the project.
+        :project_id  id of the project.
+        :branch_name Name of the branch.
+        :return      Boolean denoting, whether branch exists.
+        """
+        response = yield call_steps.call("GET",
+                                         f'projects/{project_id}/repository/branches/{quote(branch_name, safe="")}')
+        if response.status_code == 404:
+            return False
         if response.status_code != 200:
             global_utils.fail(project_id, response)
 
-        return response
+        return True
 
-    def __update_protected_branch(self, project_id, candidate_branch):
-        """Updates protection settings for a given branch.
+    def __add_branch_to_protected(self, project_id, candidate_branch):
+        """Adds given branch to protected branches as well setting its protection settings.
         :project_id         id of the project whose branch to update for.
-        :candidate_branch   Object of the branch to remove all access levels.
+        :candidate_branch   Object of the desired protected branch.
         """
-        protected_branch_url = f'{self.args["base_url"]}/projects/{project_id}/protected_branches/{candidate_branch["name"]}'
-
-        data = '{'
-
-        if candidate_branch["push_access_levels"]:
-            data += '"allowed_to_push": ' + json.dumps(candidate_branch["push_access_levels"]) + ','
-
-        if candidate_branch["merge_access_levels"]:
-            data += '"allowed_to_merge": ' + json.dumps(candidate_branch["merge_access_levels"]) + ','
-
-        data += '"allow_force_push": false,'
-        data += '"code_owner_approval_required": false,'
-
-        data = data[:-1] + '}'
-
-        response = requests.patch(protected_branch_url, headers=self.args["headers"], data=data)
-        self.printer.dump_response(response, project_id, "Protected branches", {200})
+        protected_branch_url = f'projects/{project_id}/protected_branches'
+        data = mutations.serialize(mutations.protected_branch_creation(candidate_branch))
+        if self.__is_sent(project_id, f'Protected branches ({candidate_branch["name"]})', "POST", protected_branch_url,
+                          data):
+            return
+
+        response = yield call_steps.call("POST", protected_branch_url, data=data)
+        self.mutations.record("POST", protected_branch_url, data, response)
+        self.printer.dump_response(response, project_id, "Protected branches", {201},
+                                   keys=state_records.PROTECTED_BRANCH_FIELDS)
+
+    def __update_protected_branch(self, project_id, candidate_branch, current_branch):
+        """Updates protection settings for a given branch by a single request, which destroys only access levels
+        missing from {:candidate_branch} and adds only missing ones, see `mutations.protected_branch_mutation`.
+        :project_id         id of the project whose branch to update for.
+        :candidate_branch   Object of the desired protected branch.
+        :current_branch     Protected branch object, whose access levels to replace.
+        """
+        protected_branch_url = f'projects/{project_id}/protected_branches/{quote(candidate_branch["name"], safe="")}'
+        # branches preloaded through GraphQL lack ids of access levels, which are required to remove them
+        if "unprotect_access_levels" not in current_branch:
+            response = yield call_steps.call("GET", protected_branch_url)
+            if response.status_code != 200:
+                global_utils.fail(project_id, response)
+            current_branch = response.json()
+
+        mutation = mutations.protected_branch_mutation(current_branch, candidate_branch)
+        if not mutation:
+            self.printer.dump_unchanged(project_id, f'Protected branches ({candidate_branch["name"]})')
+            return
+
+        data = mutations.serialize(mutation)
+        if self.__is_sent(project_id, f'Protected branches ({candidate_branch["name"]})', "PATCH", protected_branch_url,
+                          data):
+            return
+
+        response = yield call_steps.call("PATCH", protected_branch_url, data=data)
+        self.mutations.record("PATCH", protected_branch_url, data, response)
+        self.printer.dump_response(response, project_id, "Protected branches", {200},
+                                   keys=state_records.PROTECTED_BRANCH_FIELDS)
+
+    def prefetch_steps(self, project_id):
+        """Steps reading sections of a single project into `state` ahead of its update, so that update only writes.
+        Preloaded sections are skipped, in `force` mode only sections read regardless of mode are read.
+        :project_id id of the project to read.
+        """
+        keys = self.plans.plan(project_id).sections["project_settings"].keys()
+        for section, path, collection in STATE_SECTIONS:
+            if (self.args["mode"] == "force" and section not in FORCE_MODE_SECTIONS) or \
+                    self.state.get(project_id, section) is not MISSING:
+                continue
+
+            current = yield from self.__select_state(project_id, f'projects/{project_id}{path}', section,
+                                                     keys if section == "project" else None, collection)
+            # missing project is reported by its update
+            if current is not None or section != "project":
+                self.state.put(project_id, section, current)
+
+    def current_state_steps(self, project_id):
+        """Steps selecting current state of all configuration sections of a single project, e.g. for audit.
+        :project_id id of the project to select.
+        :return     Pair of the project's full path and map of section names (see `desired_state.SECTIONS`) to
+                    JSON-objects of sections, `None` for sections which do not exist.
+        """
+        keys = self.plans.plan(project_id).sections["project_settings"].keys() | {"path_with_namespace"}
+        project = yield from self.__select_state(project_id, f'projects/{project_id}', "project", keys)
+        if project is None:
+            raise global_utils.GitlabError(f'Project {project_id} does not exist', 404)
+
+        sections = {"project_settings": project}
+        sections["approval_settings"] = yield from self.__select_state(project_id, f'projects/{project_id}/approvals',
+                                                                       "approvals")
+        sections["approval_rules"] = yield from self.__select_state(project_id,
+                                                                    f'projects/{project_id}/approval_rules',
+                                                                    "approval_rules", collection=True)
+        sections["protected_branches"] = yield from self.__select_state(project_id,
+                                                                        f'projects/{project_id}/protected_branches',
+                                                                        "protected_branches", collection=True)
+        sections["push_rule"] = yield from self.__select_state(project_id, f'projects/{project_id}/push_rule',
+                                                               "push_rule")
+        self.state.discard(project_id)
+
+        return project["path_with_namespace"], sections
 
     def select_project_by_setting(self, selected_pids, settings_filter):
         """Selects Project  id satisfying {:settings_filter} from list of {:selected_pids}
@@ -182,8 +316,9 @@ class ProjectSettings:
         """
         appropriate_projects = []
         for project_id in selected_pids:
-            select_project_url = f'{self.args["base_url"]}/projects/{project_id}'
-            project = requests.get(select_project_url, headers=self.args["headers"]).json()
+            select_project_url = f'projects/{project_id}'
+            project = call_steps.run(self.__select_state(project_id, select_project_url, "project",
+                                                         {"id", "path"} | settings_filter.keys()), self.client)
 
             if self.__is_appropriate_project(project, settings_filter):
                 appropriate_projects.append((project["id"], project["path"]))
@@ -207,10 +342,107 @@ class ProjectSettings:
         """Updates Push rules (in Repository Settings) for specified GitLab Ids. 
         :selected_pids List of GitLab Ids of projects belonging to specified GitLab Groups. 
         """
-        template = Template("""{"branch_name_regex": "$regex"}""")
-        push_rules = template.substitute(regex=self.args["push_rule_regex"])
-
         for project_id in selected_pids:
-            approvals_url = f'{self.args["base_url"]}/projects/{project_id}/push_rule'
-            response = requests.put(approvals_url, headers=self.args["headers"], data=push_rules)
-            self.printer.dump_response(response, project_id, 'Push rules', {200})
+            call_steps.run(self.push_rules_steps(project_id), self.client)
+
+    def push_rules_steps(self, project_id):
+        """Steps updating Push rules of a single project.
+        :project_id id of the project to update.
+        """
+        plan = self.plans.plan(project_id)
+        push_rule_url = f'projects/{project_id}/push_rule'
+        # read in `force` mode as well, since existing push rule can only be updated, not created again
+        current = yield from self.__select_state(project_id, push_rule_url, "push_rule")
+        changes = state_diff.diff_settings(current, plan.sections["push_rule"])
+        if not self.__is_write_required(project_id, 'Push rules', changes):
+            return
+
+        # push rule has to be created, unless project already has one
+        method = "PUT" if current else "POST"
+        if self.__is_sent(project_id, 'Push rules', method, push_rule_url, plan.payloads["push_rule"]):
+            return
+
+        response = yield call_steps.call(method, push_rule_url, data=plan.payloads["push_rule"])
+        self.mutations.record(method, push_rule_url, plan.payloads["push_rule"], response)
+        self.state.discard(project_id, "push_rule")
+        self.printer.dump_response(response, project_id, 'Push rules', {200, 201},
+                                   keys=plan.sections["push_rule"].keys())
+
+    def __select_current(self, project_id, url, section, keys=None):
+        """Selects current state of configuration section, unless `mode` CL-argument forces writes without reading.
+        :project_id id of the project whose section to select.
+        :url        Url of the section, relative to GitLab API url.
+        :section    Name of the section within `state`.
+        :keys       Keys required to be present in preloaded section, otherwise section is read through REST API.
+        :return     JSON-object of the section. `None` if section does not exist yet or reading is not required.
+        """
+        if self.args["mode"] == "force":
+            return None
+
+        return (yield from self.__select_state(project_id, url, section, keys))
+
+    def __select_state(self, project_id, url, section, keys=None, collection=False):
+        """Selects state of configuration section from `state` if it is preloaded, otherwise through REST API.
+        :project_id id of the project whose section to select.
+        :url        Url of the section, relative to GitLab API url.
+        :section    Name of the section within `state`.
+        :keys       Keys required to be present in preloaded section, otherwise section is read through REST API.
+        :collection If set the section is a paginated collection.
+        :return     JSON-object of the section. `None` if section does not exist.
+        """
+        current = self.state.get(project_id, section)
+        if current is not MISSING and (keys is None or set(keys) <= current.keys()):
+            return current
+
+        if collection:
+            current = yield from self.printer.collection_steps(url)
+        else:
+            response = yield call_steps.call("GET", url)
+            if response.status_code == 404:
+                return None
+            if response.status_code != 200:
+                global_utils.fail(project_id, response)
+            current = response.json()
+
+        # whole objects are dropped right after parsing, only fields used by updates are kept
+        if section == "project":
+            return state_records.compact_project(current, keys or ())
+        if section == "protected_branches":
+            return [state_records.compact_protected_branch(branch) for branch in current]
+        return current
+
+    def __is_sent(self, project_id, config_name, method, url, body):
+        """Checks whether identical write was already accepted during the run, then section is reported unchanged.
+        :project_id     id of the project being configured.
+        :config_name    Name of the section being configured for the project.
+        :method         HTTP method of the write.
+        :url            Url of the write, relative to GitLab API url.
+        :body           Serialized request body.
+        :return         Boolean denoting, whether write has to be skipped.
+        """
+        if not self.mutations.is_sent(method, url, body):
+            return False
+
+        self.printer.dump_unchanged(project_id, config_name)
+        return True
+
+    def __is_write_required(self, project_id, config_name, changes):
+        """Decides whether configuration section has to be written according to `mode` CL-argument.
+        In `plan` mode {:changes} are recorded without writing, in `force` mode every section is written.
+        :project_id     id of the project being configured.
+        :config_name    Name of the section being configured for the project.
+        :changes        Map of differing keys to pairs of their current and desired values.
+        :return         Boolean denoting, whether section has to be written.
+        """
+        if self.args["mode"] == "force":
+            return True
+
+        if not changes:
+            self.printer.dump_unchanged(project_id, config_name)
+            return False
+
+        if self.args["mode"] == "plan":
+            self.printer.dump_plan(project_id, config_name, changes)
+            return False
+
+        return True
@@ -0,0 +1,49 @@
+from collections import defaultdict
+
+import threading
+
+MISSING = object()
+
+
+class ProjectStateStore:
+    """In-memory state of GitLab projects, shared by selection and update passes.
+    Sections are stored in the same shape as returned by GitLab REST API, e.g. `protected_branches` is a list of
+    protected branch objects, so that update passes work the same way whether state was preloaded or not.
+
+    Attributes:
+        projects: Object stores JSON-objects of sections by project id and section name.
+        lock: Guards `projects` attribute, since state is accessed by concurrent workers.
+    """
+
+    def __init__(self):
+        self.projects = defaultdict(dict)
+        self.lock = threading.Lock()
+
+    def get(self, project_id, section):
+        """Gets stored state of the project's section.
+        :project_id id of the project.
+        :section    Name of the section, e.g. `project` or `protected_branches`.
+        :return     JSON-object of the section, `MISSING` if section is not loaded.
+        """
+        with self.lock:
+            return self.projects.get(str(project_id), {}).get(section, MISSING)
+
+    def put(self, project_id, section, value):
+        """Stores state of the project's section.
+        :project_id id of the project.
+        :section    Name of the section.
+        :value      JSON-object of the section.
+        """
+        with self.lock:
+            self.projects[str(project_id)][section] = value
+
+    def discard(self, project_id, section=None):
+        """Drops stored state of the project's section, e.g. after it was written.
+        :project_id id of the project.
+        :section    Name of the section. All sections of the project are dropped if not set.
+        """
+        with self.lock:
+            if section is None:
+                self.projects.pop(str(project_id), None)
+            elif str(project_id) in self.projects:
+                self.projects[str(project_id)].pop(section, None)
@@ -0,0 +1,126 @@
+import asyncio
+import threading
+import time
+
+RATE_SAFETY_FACTOR = 0.9
+LOW_REMAINING_RATIO = 0.1
+
+
+class RateLimiter:
+    """Token bucket limiting rate and number of in-flight GitLab API calls of the whole run.
+    Rate follows `RateLimit-Remaining`/`RateLimit-Reset` headers sent by GitLab, so that remaining quota is spread
+    until reset. In-flight limit grows additively while quota is plentiful and halves on throttling (429).
+
+    Attributes:
+        max_rate (float): Configured maximum number of calls per second, 0 if only GitLab headers limit the rate.
+        rate (float): Current number of calls per second, 0 if rate is not limited.
+        burst (int): Maximum number of calls sent at once after idle period.
+        tokens (float): Number of calls allowed to be sent immediately.
+        max_in_flight (int): Upper bound of `in_flight_limit`.
+        in_flight_limit (float): Current maximum number of concurrent calls.
+        in_flight (int): Number of calls sent but not responded yet.
+        async_waiters (list): Futures of asynchronous calls waiting for in-flight limit.
+        condition: Guards all attributes above, since limiter is shared by concurrent workers.
+    """
+
+    def __init__(self, max_rate, burst, max_in_flight):
+        self.max_rate = max_rate
+        self.rate = max_rate
+        self.burst = burst
+        self.tokens = burst
+        self.refilled_at = time.monotonic()
+        self.max_in_flight = max_in_flight
+        self.in_flight_limit = max_in_flight
+        self.in_flight = 0
+        self.async_waiters = []
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """Blocks until call is allowed both by in-flight limit and by token bucket."""
+        with self.condition:
+            while self.in_flight >= int(self.in_flight_limit):
+                self.condition.wait()
+            self.in_flight += 1
+            delay = self.__reserve_token()
+
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self):
+        """Waits without blocking event loop until call is allowed, see `acquire`."""
+        while True:
+            with self.condition:
+                if self.in_flight < int(self.in_flight_limit):
+                    self.in_flight += 1
+                    delay = self.__reserve_token()
+                    break
+                waiter = asyncio.get_running_loop().create_future()
+                self.async_waiters.append(waiter)
+            await waiter
+
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def release(self, response=None):
+        """Marks call as responded and adapts limits to the {:response}.
+        :response Response object from requests, `None` if call failed without response.
+        """
+        with self.condition:
+            self.in_flight -= 1
+            if response is not None:
+                self.__adapt(response)
+            self.condition.notify_all()
+            for waiter in self.async_waiters:
+                waiter.get_loop().call_soon_threadsafe(self.__wake, waiter)
+            self.async_waiters = []
+
+    @staticmethod
+    def __wake(waiter):
+        # waiting call may be cancelled meanwhile
+        if not waiter.done():
+            waiter.set_result(None)
+
+    def __reserve_token(self):
+        """Takes token from the bucket, possibly in advance.
+        :return Number of seconds to wait until reserved token is refilled.
+        """
+        if not self.rate:
+            return 0
+
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+        self.tokens -= 1
+
+        return -self.tokens / self.rate if self.tokens < 0 else 0
+
+    def __adapt(self, response):
+        """Adapts rate and in-flight limit to the throttling status and `RateLimit-*` headers of {:response}.
+        :response Response object from requests.
+        """
+        if response.status_code == 429:
+            self.in_flight_limit = max(1.0, self.in_flight_limit / 2)
+            if self.rate:
+                self.rate /= 2
+            return
+
+        try:
+            remaining = int(response.headers["RateLimit-Remaining"])
+            reset = int(response.headers["RateLimit-Reset"])
+            limit = int(response.headers.get("RateLimit-Limit", remaining))
+        except (KeyError, ValueError):
+            self.__increase_in_flight_limit()
+            return
+
+        header_rate = RATE_SAFETY_FACTOR * remaining / max(reset - time.time(), 1.0)
+        self.rate = min(self.max_rate, header_rate) if self.max_rate else header_rate
+        # bucket must allow at least one call, otherwise rate would stay 0 until reset
+        self.rate = max(self.rate, 0.1)
+
+        if remaining > LOW_REMAINING_RATIO * limit:
+            self.__increase_in_flight_limit()
+        else:
+            self.in_flight_limit = max(1.0, self.in_flight_limit - 1)
+
+    def __increase_in_flight_limit(self):
+        self.in_flight_limit = min(self.max_in_flight, self.in_flight_limit + 1 / self.in_flight_limit)
@@ -0,0 +1,125 @@
+from collections import OrderedDict
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+import time
+
+
+class ResponseCache:
+    """Persistent cache of GitLab API responses, stored as directory of compressed JSON files.
+    Entries are revalidated through `If-None-Match`/`If-Modified-Since` headers, so that unchanged responses
+    are answered by GitLab with `304 Not Modified` without body.
+
+    Attributes:
+        cache_dir (str): Directory with cached entries.
+        ttl (int): Number of seconds after which entry, not revalidated since, is evicted.
+        max_size (int): Maximum size of the cache in bytes, oldest entries are evicted when exceeded.
+        size (int): Current size of the cache in bytes.
+        entries: Object stores (size, mtime) pairs of entries by their paths, from least to most recently written or
+                 revalidated. Loaded from the directory once, so that eviction does not scan it again.
+        lock: Guards `size` and `entries` attributes, since cache is accessed by concurrent workers.
+    """
+
+    def __init__(self, cache_dir, ttl, max_size):
+        self.cache_dir = os.path.expanduser(cache_dir)
+        self.ttl = ttl
+        self.max_size = max_size
+        self.lock = threading.Lock()
+
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.entries = OrderedDict()
+        for entry in sorted(self.__scan(), key=lambda entry: entry.stat().st_mtime):
+            self.entries[entry.path] = (entry.stat().st_size, entry.stat().st_mtime)
+        self.size = sum(size for size, _ in self.entries.values())
+
+    def get(self, key):
+        """Gets cached entry by {:key}, evicting it if it is expired.
+        :key    Key of the entry, e.g. url of the request.
+        :return Map with `status`, `headers` and `body` of the cached response. `None` if entry is not cached.
+        """
+        path = self.__path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                with self.lock:
+                    self.__discard(path)
+                    self.__remove(path)
+                return None
+            with gzip.open(path, "rt", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, status, headers, body):
+        """Caches response by {:key}.
+        :key     Key of the entry, e.g. url of the request.
+        :status  Status code of the response.
+        :headers Map of response headers.
+        :body    Text of the response.
+        """
+        path = self.__path(key)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with gzip.open(tmp_path, "wt", encoding="utf-8") as file:
+            json.dump({"status": status, "headers": headers, "body": body}, file)
+
+        with self.lock:
+            self.__discard(path)
+            os.replace(tmp_path, path)
+            self.entries[path] = (self.__file_size(path), time.time())
+            self.size += self.entries[path][0]
+            if self.size > self.max_size:
+                self.__evict()
+
+    def touch(self, key):
+        """Marks entry by {:key} as revalidated, postponing its expiration.
+        :key Key of the entry.
+        """
+        path = self.__path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            return
+        with self.lock:
+            if path in self.entries:
+                self.entries[path] = (self.entries[path][0], time.time())
+                self.entries.move_to_end(path)
+
+    def __evict(self):
+        """Removes expired entries, then oldest ones until cache fits into `max_size`."""
+        now = time.time()
+        while self.entries:
+            path, (_, mtime) = next(iter(self.entries.items()))
+            if self.size <= self.max_size and now - mtime <= self.ttl:
+                break
+            self.__discard(path)
+            self.__remove(path)
+
+    def __discard(self, path):
+        """Removes entry from `entries`, keeping `size` in sync. Entries written by other processes sharing the
+        directory are not indexed, their size is counted from the next start.
+        :path Path of the entry.
+        """
+        size, _ = self.entries.pop(path, (0, None))
+        self.size -= size
+
+    def __scan(self):
+        return [entry for entry in os.scandir(self.cache_dir) if entry.name.endswith(".json.gz")]
+
+    def __path(self, key):
+        return os.path.join(self.cache_dir, hashlib.sha256(key.encode()).hexdigest() + ".json.gz")
+
+    @staticmethod
+    def __file_size(path):
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+
+    @staticmethod
+    def __remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
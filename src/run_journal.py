@@ -0,0 +1,115 @@
+from datetime import datetime, timezone
+
+import json
+import os
+import queue
+import threading
+
+
+class RunJournal:
+    """Append-only JSON Lines journal recording outcome of every configured (project, section) pair.
+    Records are written by a single writer thread, which flushes all records queued meanwhile to disk at once, so that
+    sections (and the event loop in `async` mode) do not wait for disk. Record lost by interruption before its flush
+    only makes resumed run configure the section again.
+
+    Attributes:
+        path (str): Path to the journal file, journal is disabled if empty.
+        mode (str): Value of `mode` CL-argument, sections completed in other mode are not skipped on resume.
+        completed (dict): Plan digests by (project_id, section_name) pairs completed by previous runs.
+        digests (dict): Plan digests by project ids, which projects were last configured with by previous runs.
+        lines: Queue of records waiting for the writer thread, `None` stops it.
+        writer: Thread writing the records, started by the first record.
+        lock: Guards `writer` attribute, since sections are recorded by concurrent workers.
+    """
+
+    def __init__(self, path, mode, resume=False):
+        self.path = path
+        self.mode = mode
+        self.completed = {}
+        self.digests = {}
+        self.lines = queue.Queue()
+        self.writer = None
+        self.lock = threading.Lock()
+
+        if self.path and os.path.exists(self.path):
+            self.__load(resume)
+
+    def __load(self, resume):
+        """Reads records of previous runs, ignoring record truncated by interruption.
+        :resume If set sections completed by previous runs are loaded as well.
+        """
+        with open(self.path) as file:
+            for line in file:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    continue
+                project_id = str(record["project_id"])
+                # digests written in `plan` mode were never applied
+                if record["mode"] != "plan" and record["outcome"] == "done":
+                    self.digests[project_id] = record["digest"]
+                if not resume or record["mode"] != self.mode:
+                    continue
+                if record["outcome"] == "done":
+                    self.completed[(project_id, record["section"])] = record["digest"]
+                else:
+                    self.completed.pop((project_id, record["section"]), None)
+
+    def is_completed(self, project_id, section_name, digest):
+        """Checks whether section of the project was completed by previous run with the same plan.
+        :project_id   id of the project being configured.
+        :section_name Name of the section being configured.
+        :digest       Digest of the project's plan.
+        :return Boolean determining whether section can be skipped.
+        """
+        return self.completed.get((str(project_id), section_name)) == digest
+
+    def is_plan_changed(self, project_id, digest):
+        """Checks whether project was configured by previous run with another plan, so that it has to be re-applied.
+        :project_id id of the project being configured.
+        :digest     Digest of the project's plan.
+        :return Boolean, `False` for projects never configured before.
+        """
+        previous_digest = self.digests.get(str(project_id))
+        return previous_digest is not None and previous_digest != digest
+
+    def record(self, project_id, section_name, outcome, digest, error=None):
+        """Appends outcome of the section to the journal.
+        :project_id   id of the project being configured.
+        :section_name Name of the section being configured.
+        :outcome      `done` or `failed`.
+        :digest       Digest of the project's plan.
+        :error        Reason of the failure.
+        """
+        if not self.path:
+            return
+
+        line = json.dumps({"project_id": project_id, "section": section_name, "outcome": outcome,
+                           "error": error, "mode": self.mode, "digest": digest,
+                           "at": datetime.now(timezone.utc).isoformat()})
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.__write, daemon=True)
+                self.writer.start()
+            self.lines.put(line)
+
+    def __write(self):
+        """Writes queued records until `None` is queued, every batch of records is flushed by a single fsync."""
+        with open(self.path, mode="a") as file:
+            stopped = False
+            while not stopped:
+                lines = [self.lines.get()]
+                while not self.lines.empty():
+                    lines.append(self.lines.get())
+                stopped = None in lines
+                file.writelines(line + "\n" for line in lines if line is not None)
+                file.flush()
+                os.fsync(file.fileno())
+
+    def close(self):
+        """Waits until all records are written to disk."""
+        with self.lock:
+            if self.writer is not None:
+                self.lines.put(None)
+                self.writer.join()
+                self.writer = None
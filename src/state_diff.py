@@ -0,0 +1,58 @@
+# access levels of protected branch objects, unprotect access levels are managed only if desired branch specifies them
+ACCESS_LEVEL_KEYS = ("push_access_levels", "merge_access_levels", "unprotect_access_levels")
+OPTIONAL_ACCESS_LEVEL_KEYS = frozenset({"unprotect_access_levels"})
+
+
+def diff_settings(current, desired):
+    """Compares flat {:desired} settings with {:current} ones.
+    :current    JSON-object with current settings obtained from GitLab, `None` if settings do not exist yet.
+    :desired    JSON-object with desired settings.
+    :return     Map of differing keys to pairs of their current and desired values. Empty if settings match.
+    """
+    current = current or {}
+    return {key: (current.get(key), value) for key, value in desired.items() if current.get(key) != value}
+
+
+def diff_protected_branch(current, desired):
+    """Compares protection settings of {:current} protected branch with {:desired} ones.
+    :current    JSON-object of protected branch obtained from GitLab.
+    :desired    JSON-object of desired protected branch (entry of `protected_branches` argument).
+    :return     Map of differing keys to pairs of their current and desired values. Empty if settings match.
+    """
+    changes = {}
+
+    for key in managed_access_levels(desired):
+        current_levels = access_levels(current.get(key))
+        desired_levels = access_levels(desired.get(key))
+        if current_levels != desired_levels:
+            changes[key] = (sorted(current_levels, key=str), sorted(desired_levels, key=str))
+
+    for key in ("allow_force_push", "code_owner_approval_required"):
+        if bool(current.get(key)) != bool(desired.get(key)):
+            changes[key] = (current.get(key), desired.get(key))
+
+    return changes
+
+
+def managed_access_levels(desired):
+    """Selects access levels of protected branch to be compared and written, see `ACCESS_LEVEL_KEYS`.
+    :desired    JSON-object of desired protected branch.
+    :return     List of keys of access levels.
+    """
+    return [key for key in ACCESS_LEVEL_KEYS if key not in OPTIONAL_ACCESS_LEVEL_KEYS or key in desired]
+
+
+def access_levels(levels):
+    """Normalizes list of access level objects for comparison, ignoring ids and descriptions.
+    :levels     List of access level objects, e.g. `[{"access_level": 40, "access_level_description": "Maintainers"}]`.
+    :return     Set of (access_level, user_id, group_id) tuples.
+    """
+    return {access_level(level) for level in levels or []}
+
+
+def access_level(level):
+    """Normalizes access level object for comparison, see `access_levels`.
+    :level  Access level object.
+    :return Tuple of (access_level, user_id, group_id).
+    """
+    return level.get("access_level"), level.get("user_id"), level.get("group_id")
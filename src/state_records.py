@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import sys
+
+# fields of project objects kept in memory besides desired project settings
+PROJECT_FIELDS = ("id", "path_with_namespace", "default_branch", "visibility", "archived", "last_activity_at")
+# fields of protected branch objects used by updates, access levels keep only `ACCESS_LEVEL_FIELDS`
+PROTECTED_BRANCH_FIELDS = ("name", "push_access_levels", "merge_access_levels", "unprotect_access_levels",
+                           "allow_force_push", "code_owner_approval_required")
+ACCESS_LEVEL_FIELDS = ("id", "access_level", "user_id", "group_id")
+
+
+def intern_value(value):
+    """Interns strings, so that names repeated across projects (branches, namespaces, settings values) are stored once.
+    :value  JSON value.
+    :return The same value, interned if it is a string.
+    """
+    return sys.intern(value) if isinstance(value, str) else value
+
+
+def compact_project(project, keys):
+    """Keeps only fields of the project object used by this tool.
+    :project JSON-object of the project from GitLab.
+    :keys    Names of desired project settings, kept besides `PROJECT_FIELDS`.
+    :return  JSON-object with kept fields, string values interned.
+    """
+    return {intern_value(key): intern_value(project[key]) for key in (*PROJECT_FIELDS, *keys) if key in project}
+
+
+def compact_protected_branch(branch):
+    """Keeps only fields of the protected branch object used by updates.
+    :branch JSON-object of the protected branch from GitLab.
+    :return JSON-object with kept fields, name interned.
+    """
+    compact = {"name": sys.intern(branch["name"])}
+    for key in PROTECTED_BRANCH_FIELDS[1:]:
+        if key not in branch:
+            # e.g. branches preloaded through GraphQL lack `unprotect_access_levels`
+            continue
+        if key.endswith("_access_levels"):
+            compact[key] = [{field: level[field] for field in ACCESS_LEVEL_FIELDS if level.get(field) is not None}
+                            for level in branch[key] or []]
+        else:
+            compact[key] = branch[key]
+    if "id" in branch:
+        compact["id"] = branch["id"]
+
+    return compact
+
+
+class Branch:
+    """Repository branch, keeping only fields used by branch selection and cleanup instead of the whole JSON-object
+    with embedded commit object.
+
+    Attributes:
+        name (str): Interned name of the branch.
+        protected (bool): Whether the branch is protected.
+        default (bool): Whether the branch is default branch of the project.
+        committed_at: Timezone-aware datetime of the last commit.
+    """
+
+    __slots__ = ("name", "protected", "default", "committed_at")
+
+    def __init__(self, name, protected, default, committed_at):
+        self.name = name
+        self.protected = protected
+        self.default = default
+        self.committed_at = committed_at
+
+    @classmethod
+    def from_json(cls, entry):
+        """Parses branch object of GitLab REST API.
+        :entry  JSON-object of the branch.
+        :return Branch object.
+        """
+        return cls(sys.intern(entry["name"]), bool(entry.get("protected")), bool(entry.get("default")),
+                   datetime.fromisoformat(entry["commit"]["created_at"]))
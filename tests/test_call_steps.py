@@ -0,0 +1,62 @@
+import asyncio
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import call_steps
+
+
+class FakeClient:
+    """Answers every call with its path, raising ConnectionError for paths starting with `fail`."""
+
+    def __init__(self):
+        self.calls = []
+
+    def request(self, method, path, **kwargs):
+        self.calls.append((method, path, kwargs))
+        if path.startswith("fail"):
+            raise ConnectionError(path)
+        return f'{method} {path}'
+
+
+class FakeAsyncClient(FakeClient):
+
+    async def request(self, method, path, **kwargs):
+        return super().request(method, path, **kwargs)
+
+
+def steps():
+    first = yield call_steps.call("GET", "projects/1")
+    try:
+        yield call_steps.call("PUT", "fail/projects/1", data="{}")
+    except ConnectionError as e:
+        recovered = str(e)
+    return first, recovered
+
+
+class CallStepsTest(unittest.TestCase):
+
+    def test_run(self):
+        client = FakeClient()
+        self.assertEqual(call_steps.run(steps(), client), ("GET projects/1", "fail/projects/1"))
+        self.assertEqual(client.calls, [("GET", "projects/1", {}), ("PUT", "fail/projects/1", {"data": "{}"})])
+
+    def test_run_async(self):
+        client = FakeAsyncClient()
+        self.assertEqual(asyncio.run(call_steps.run_async(steps(), client)), ("GET projects/1", "fail/projects/1"))
+        self.assertEqual(len(client.calls), 2)
+
+    def test_unhandled_error_is_raised(self):
+        def failing_steps():
+            yield call_steps.call("GET", "fail/projects/1")
+
+        with self.assertRaises(ConnectionError):
+            call_steps.run(failing_steps(), FakeClient())
+        with self.assertRaises(ConnectionError):
+            asyncio.run(call_steps.run_async(failing_steps(), FakeAsyncClient()))
+
+
+if __name__ == "__main__":
+    unittest.main()
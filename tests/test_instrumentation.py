@@ -0,0 +1,42 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from instrumentation import endpoint_template
+
+API_URL = "https://gitlab.example.com/api/v4"
+
+
+class EndpointTemplateTest(unittest.TestCase):
+
+    def assertTemplate(self, method, path, template):
+        self.assertEqual(endpoint_template(method, f'{API_URL}/{path}'), template)
+
+    def test_ids_and_paths_of_projects_and_groups(self):
+        self.assertTemplate("GET", "projects/42", "GET projects/:id")
+        self.assertTemplate("GET", "projects/npd%2Fsso-auth", "GET projects/:id")
+        self.assertTemplate("GET", "groups/npd-gov/projects?page=2", "GET groups/:id/projects")
+        self.assertTemplate("PUT", "groups/7/push_rule", "PUT groups/:id/push_rule")
+
+    def test_ids_of_other_resources(self):
+        self.assertTemplate("PUT", "projects/42/approval_rules/9", "PUT projects/:id/approval_rules/:rule_id")
+        self.assertTemplate("DELETE", "groups/7/members/1001", "DELETE groups/:id/members/:user_id")
+        self.assertTemplate("GET", "projects/42/repository/commits/0a1b2c3d4e5f",
+                            "GET projects/:id/repository/commits/:sha")
+
+    def test_literal_segments_are_kept(self):
+        self.assertTemplate("GET", "groups/7/members/all", "GET groups/:id/members/all")
+        self.assertTemplate("GET", "projects/42/members/all/1001", "GET projects/:id/members/all/:user_id")
+        self.assertTemplate("GET", "projects/42/approval_rules", "GET projects/:id/approval_rules")
+        self.assertTemplate("GET", "projects/42/repository/commits", "GET projects/:id/repository/commits")
+
+    def test_branch_names(self):
+        self.assertTemplate("PATCH", "projects/42/protected_branches/feature%2Fx",
+                            "PATCH projects/:id/protected_branches/:name")
+        self.assertTemplate("GET", "projects/42/repository/branches/main", "GET projects/:id/repository/branches/:name")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import importlib.util
+import os
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT_DIR, "src"))
+sys.path.insert(0, os.path.join(ROOT_DIR, "bench"))
+
+from args_parser import parse_args
+from fake_gitlab import FakeGitlabHandler, FakeGitlabServer, FakeGitlabState
+from gitlab_config import GitlabConfig
+
+PROJECTS_COUNT = 6
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+class ModesTest(unittest.TestCase):
+    """Runs update modes end-to-end against fake GitLab server, checking requests sent and resulting state."""
+
+    def setUp(self):
+        self.state = FakeGitlabState.seed(PROJECTS_COUNT, groups=2)
+        self.server = FakeGitlabServer(self.state).start()
+        self.addCleanup(self.server.stop)
+        self.workdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.workdir.cleanup)
+
+    def run_tool(self, *tool_args):
+        """Runs single update of all projects of the seeded namespace.
+        :tool_args Optional CL-arguments.
+        :return    Pair of printer results and numbers of requests sent by the run by HTTP methods.
+        """
+        argv = ["main.py", self.server.url, "test-token", "false", "--namespace_paths", "bench", "--no-cache",
+                *tool_args]
+        with mock.patch.object(sys, "argv", argv):
+            args = parse_args()
+
+        methods_before = self.state.summary()["methods"]
+        gconf = GitlabConfig(args)
+        gconf.update_selected_settings()
+        methods = {method: count - methods_before.get(method, 0)
+                   for method, count in self.state.summary()["methods"].items()}
+
+        return gconf.printer.results(), methods
+
+    def writes(self, methods):
+        return sum(methods.get(method, 0) for method in WRITE_METHODS)
+
+    def assertConfigured(self, project):
+        self.assertEqual(project["settings"]["merge_method"], "ff")
+        self.assertEqual(project["settings"]["squash_option"], "default_on")
+        self.assertFalse(project["approvals"]["merge_requests_author_approval"])
+        self.assertEqual([rule["rule_type"] for rule in project["approval_rules"]], ["any_approver"])
+        # `master` is not protected, since it does not exist
+        self.assertEqual(sorted(project["protected_branches"]), ["dev", "main"])
+        self.assertTrue(project["push_rule"]["branch_name_regex"].endswith("|(dev|prod)"))
+
+    def test_apply_writes_differing_sections_once(self):
+        results, methods = self.run_tool("--mode", "apply")
+        self.assertEqual(len(results["updated"]), PROJECTS_COUNT)
+        self.assertGreater(self.writes(methods), 0)
+        for project in self.state.projects.values():
+            self.assertConfigured(project)
+
+        results, methods = self.run_tool("--mode", "apply")
+        self.assertEqual(self.writes(methods), 0)
+        self.assertEqual(len(results["unchanged"]), PROJECTS_COUNT)
+
+    def test_plan_only_reads(self):
+        projects_before = repr(self.state.projects)
+        results, methods = self.run_tool("--mode", "plan")
+        self.assertEqual(self.writes(methods), 0)
+        self.assertEqual(len(results["planned"]), PROJECTS_COUNT)
+        self.assertEqual(results["planned"][1]["Project settings"]["merge_method"], ("merge", "ff"))
+        self.assertEqual(repr(self.state.projects), projects_before)
+
+    def test_force_writes_without_reading_sections(self):
+        _, apply_methods = self.run_tool("--mode", "apply")
+        _, force_methods = self.run_tool("--mode", "force")
+        # protected branches and push rule are still read, since they decide how to write them
+        self.assertLess(force_methods["GET"], apply_methods["GET"])
+        self.assertGreater(self.writes(force_methods), 0)
+        for project in self.state.projects.values():
+            self.assertConfigured(project)
+
+    def test_resume_configures_only_failed_sections(self):
+        journal = os.path.join(self.workdir.name, "journal.jsonl")
+        put_project = FakeGitlabHandler.put_project
+
+        def failing_put_project(handler, project):
+            if project == "3":
+                return handler.send_json(422, {"message": "Unprocessable"})
+            return put_project(handler, project)
+
+        with mock.patch.object(FakeGitlabHandler, "put_project", failing_put_project):
+            results, _ = self.run_tool("--journal", journal, "--on_failure", "continue")
+        self.assertEqual(list(results["failed"]), [3])
+        self.assertEqual(self.state.projects[3]["protected_branches"], {})
+
+        results, methods = self.run_tool("--journal", journal, "--resume")
+        self.assertEqual(list(results["updated"]), [3])
+        self.assertEqual(methods["PUT"], 1)
+        self.assertConfigured(self.state.projects[3])
+
+        results, methods = self.run_tool("--journal", journal, "--resume")
+        self.assertEqual(self.writes(methods), 0)
+        self.assertFalse(results["updated"] or results["unchanged"])
+
+    def test_incremental_configures_only_changed_projects(self):
+        checkpoint = os.path.join(self.workdir.name, "checkpoint.json")
+        self.run_tool("--incremental", checkpoint)
+
+        results, methods = self.run_tool("--incremental", checkpoint)
+        self.assertEqual(self.writes(methods), 0)
+        self.assertFalse(results["updated"] or results["unchanged"])
+
+        drifted = self.state.drift(2)
+        results, methods = self.run_tool("--incremental", checkpoint)
+        self.assertEqual(sorted(int(project_id) for project_id in results["updated"]), sorted(drifted))
+        self.assertEqual(methods["PUT"], len(drifted))
+        for project_id in drifted:
+            self.assertEqual(self.state.projects[project_id]["settings"]["merge_method"], "ff")
+
+    @unittest.skipUnless(importlib.util.find_spec("aiohttp") or importlib.util.find_spec("httpx"),
+                         "asynchronous client requires `aiohttp` or `httpx`")
+    def test_async_matches_sync(self):
+        self.run_tool("--async")
+        for project in self.state.projects.values():
+            self.assertConfigured(project)
+
+        results, methods = self.run_tool("--async")
+        self.assertEqual(self.writes(methods), 0)
+        self.assertEqual(len(results["unchanged"]), PROJECTS_COUNT)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,75 @@
+import json
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import mutations
+
+DESIRED_BRANCH = {"name": "main", "push_access_levels": [{"access_level": 0}],
+                  "merge_access_levels": [{"access_level": 40}], "allow_force_push": False,
+                  "code_owner_approval_required": False}
+
+
+class ProtectedBranchMutationTest(unittest.TestCase):
+
+    def test_matching_branch(self):
+        current = {"name": "main", "push_access_levels": [{"id": 1, "access_level": 0}],
+                   "merge_access_levels": [{"id": 2, "access_level": 40}]}
+        self.assertEqual(mutations.protected_branch_mutation(current, DESIRED_BRANCH), ())
+
+    def test_only_differing_levels_and_flags_are_written(self):
+        current = {"name": "main", "push_access_levels": [{"id": 1, "access_level": 0}],
+                   "merge_access_levels": [{"id": 2, "access_level": 30}, {"id": 3, "access_level": 40},
+                                           {"id": 4, "access_level": 40}],
+                   "allow_force_push": True}
+        self.assertEqual(mutations.protected_branch_mutation(current, DESIRED_BRANCH),
+                         (("allowed_to_merge", ((2, 4), ())), ("allow_force_push", False)))
+
+    def test_missing_levels_are_added(self):
+        current = {"name": "main", "push_access_levels": [], "merge_access_levels": [{"id": 2, "access_level": 40}]}
+        self.assertEqual(mutations.protected_branch_mutation(current, DESIRED_BRANCH),
+                         (("allowed_to_push", ((), ((0, None, None),))),))
+
+    def test_unprotect_levels_are_kept_unless_desired(self):
+        current = {"name": "main", "push_access_levels": [{"id": 1, "access_level": 0}],
+                   "merge_access_levels": [{"id": 2, "access_level": 40}],
+                   "unprotect_access_levels": [{"id": 3, "access_level": 40}]}
+        self.assertEqual(mutations.protected_branch_mutation(current, DESIRED_BRANCH), ())
+
+        desired = dict(DESIRED_BRANCH, unprotect_access_levels=[{"access_level": 60}])
+        self.assertEqual(mutations.protected_branch_mutation(current, desired),
+                         (("allowed_to_unprotect", ((3,), ((60, None, None),))),))
+
+    def test_serialize(self):
+        mutation = (("allowed_to_merge", ((2,), ((40, None, None), (30, 5, None)))), ("allow_force_push", False))
+        self.assertEqual(json.loads(mutations.serialize(mutation)),
+                         {"allowed_to_merge": [{"id": 2, "_destroy": True}, {"access_level": 40},
+                                               {"access_level": 30, "user_id": 5}],
+                          "allow_force_push": False})
+
+    def test_creation(self):
+        self.assertEqual(json.loads(mutations.serialize(mutations.protected_branch_creation(DESIRED_BRANCH))),
+                         {"name": "main", "push_access_level": 0, "merge_access_level": 40,
+                          "allow_force_push": False, "code_owner_approval_required": False})
+
+
+class MutationLogTest(unittest.TestCase):
+
+    def test_only_accepted_writes_are_recorded(self):
+        log = mutations.MutationLog()
+        write = ("PUT", "projects/1", '{"merge_method": "ff"}')
+        self.assertFalse(log.is_sent(*write))
+
+        log.record(*write, SimpleNamespace(status_code=503))
+        self.assertFalse(log.is_sent(*write))
+
+        log.record(*write, SimpleNamespace(status_code=200))
+        self.assertTrue(log.is_sent(*write))
+        self.assertFalse(log.is_sent("PUT", "projects/2", write[2]))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,66 @@
+import os
+import sys
+import time
+import unittest
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+from rate_limiter import RateLimiter
+
+
+def response(status_code=200, **headers):
+    return SimpleNamespace(status_code=status_code, headers=headers)
+
+
+class RateLimiterAdaptTest(unittest.TestCase):
+    """Checks limits adapted to responses released by calls, see `RateLimiter.__adapt`."""
+
+    def release(self, limiter, *responses):
+        for released in responses:
+            limiter.acquire()
+            limiter.release(released)
+
+    def test_throttling_halves_limits(self):
+        limiter = RateLimiter(10.0, 5, 8)
+        self.release(limiter, response(429))
+        self.assertEqual(limiter.in_flight_limit, 4)
+        self.assertEqual(limiter.rate, 5.0)
+
+        self.release(limiter, *[response(429)] * 5)
+        self.assertEqual(limiter.in_flight_limit, 1)
+
+    def test_in_flight_limit_grows_additively_up_to_maximum(self):
+        limiter = RateLimiter(0.0, 5, 4)
+        self.release(limiter, response(429), response(429))
+        self.assertEqual(limiter.in_flight_limit, 1)
+
+        self.release(limiter, response())
+        self.assertEqual(limiter.in_flight_limit, 2)
+        self.release(limiter, *[response()] * 100)
+        self.assertEqual(limiter.in_flight_limit, 4)
+
+    def test_rate_spreads_remaining_quota_until_reset(self):
+        limiter = RateLimiter(0.0, 5, 4)
+        reset = str(int(time.time()) + 100)
+        self.release(limiter, response(**{"RateLimit-Remaining": "1000", "RateLimit-Reset": reset,
+                                          "RateLimit-Limit": "2000"}))
+        self.assertAlmostEqual(limiter.rate, 9.0, delta=0.5)
+
+    def test_rate_is_capped_by_configured_maximum(self):
+        limiter = RateLimiter(2.0, 5, 4)
+        reset = str(int(time.time()) + 10)
+        self.release(limiter, response(**{"RateLimit-Remaining": "1000", "RateLimit-Reset": reset}))
+        self.assertEqual(limiter.rate, 2.0)
+
+    def test_low_remaining_quota_shrinks_in_flight_limit(self):
+        limiter = RateLimiter(0.0, 5, 4)
+        self.release(limiter, response(**{"RateLimit-Remaining": "0", "RateLimit-Reset": str(int(time.time()) + 60),
+                                          "RateLimit-Limit": "2000"}))
+        self.assertEqual(limiter.in_flight_limit, 3)
+        # bucket allows at least one call until reset
+        self.assertEqual(limiter.rate, 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,56 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "src"))
+
+import state_diff
+
+MAINTAINERS = {"access_level": 40, "access_level_description": "Maintainers"}
+NO_ONE = {"access_level": 0, "access_level_description": "No one"}
+DESIRED_BRANCH = {"name": "main", "push_access_levels": [NO_ONE], "merge_access_levels": [MAINTAINERS],
+                  "allow_force_push": False, "code_owner_approval_required": False}
+
+
+class DiffSettingsTest(unittest.TestCase):
+
+    def test_differing_keys(self):
+        current = {"merge_method": "merge", "squash_option": "default_on", "description": "ignored"}
+        desired = {"merge_method": "ff", "squash_option": "default_on"}
+        self.assertEqual(state_diff.diff_settings(current, desired), {"merge_method": ("merge", "ff")})
+
+    def test_missing_settings(self):
+        self.assertEqual(state_diff.diff_settings(None, {"merge_method": "ff"}), {"merge_method": (None, "ff")})
+
+    def test_matching_settings(self):
+        self.assertEqual(state_diff.diff_settings({"merge_method": "ff"}, {"merge_method": "ff"}), {})
+
+
+class DiffProtectedBranchTest(unittest.TestCase):
+
+    def test_ids_and_descriptions_are_ignored(self):
+        current = dict(DESIRED_BRANCH, push_access_levels=[dict(NO_ONE, id=7, access_level_description="None")],
+                       merge_access_levels=[dict(MAINTAINERS, id=8)], allow_force_push=None)
+        self.assertEqual(state_diff.diff_protected_branch(current, DESIRED_BRANCH), {})
+
+    def test_differing_access_levels_and_flags(self):
+        current = dict(DESIRED_BRANCH, merge_access_levels=[{"access_level": 30}], allow_force_push=True)
+        self.assertEqual(state_diff.diff_protected_branch(current, DESIRED_BRANCH),
+                         {"merge_access_levels": ([(30, None, None)], [(40, None, None)]),
+                          "allow_force_push": (True, False)})
+
+    def test_user_access_levels_differ_from_role_ones(self):
+        current = dict(DESIRED_BRANCH, push_access_levels=[{"access_level": 0, "user_id": 5}])
+        self.assertIn("push_access_levels", state_diff.diff_protected_branch(current, DESIRED_BRANCH))
+
+    def test_unprotect_access_levels_only_if_desired(self):
+        current = dict(DESIRED_BRANCH, unprotect_access_levels=[MAINTAINERS])
+        self.assertEqual(state_diff.diff_protected_branch(current, DESIRED_BRANCH), {})
+
+        desired = dict(DESIRED_BRANCH, unprotect_access_levels=[{"access_level": 60}])
+        self.assertEqual(state_diff.diff_protected_branch(current, desired),
+                         {"unprotect_access_levels": ([(40, None, None)], [(60, None, None)])})
+
+
+if __name__ == "__main__":
+    unittest.main()